@@ -0,0 +1,608 @@
+#!/usr/bin/python3
+
+
+import json
+import re
+import time
+import asyncio
+from urllib.parse import urlsplit
+from urllib.error import HTTPError
+from http.client import HTTPMessage
+
+import ANTServerRESTClient
+
+
+# ==============================================================================
+class AsyncConnectionPool():
+    '''
+    Pool of persistent HTTP/1.1 (keep-alive) connections used from one asyncio event loop.
+    Like ConnectionPool, when a reused connection turns out to be closed by the
+    server, a request is sent again on a fresh connection, unless it is not
+    idempotent and may already have reached the server.
+    '''
+    def __init__(self, host, port, poolSize=4, timeout=10 * 60):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self.poolSize = poolSize
+        self._idle = []
+        self._slots = asyncio.Semaphore(poolSize)
+        self._connectionsCreated = 0
+        self._connectionsReused = 0
+
+    async def _acquire(self):
+        await self._slots.acquire()
+        if self._idle:
+            self._connectionsReused += 1
+            return self._idle.pop(), True
+        try:
+            connection = await asyncio.wait_for(asyncio.open_connection(self._host, self._port), self._timeout)
+        except:
+            self._slots.release()
+            raise
+        self._connectionsCreated += 1
+        return connection, False
+
+    def _release(self, connection, keep):
+        if keep:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    async def request(self, method, path, body=None, headers=None):
+        ''' send request on a pooled connection; return (status, reason, headers, body) '''
+        while True:
+            connection, reused = await self._acquire()
+            sent = False
+            try:
+                await asyncio.wait_for(self._send(connection, method, path, body, headers or {}), self._timeout)
+                sent = True
+                status, reason, respHeaders, data = await asyncio.wait_for(self._receive(connection, method), self._timeout)
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                self._release(connection, False)
+                if reused and ( not sent or method in ANTServerRESTClient.ConnectionPool.Idempotent ):
+                    # server closed the idle connection; retry on a fresh one
+                    continue
+                raise
+            except:
+                self._release(connection, False)
+                raise
+            keep = respHeaders.get("Connection", "").lower() != "close"
+            self._release(connection, keep)
+            return status, reason, respHeaders, data
+
+    async def _send(self, connection, method, path, body, headers):
+        reader, writer = connection
+        lines = [ "%s %s HTTP/1.1" % (method, path), "Host: %s:%d" % (self._host, self._port) ]
+        for key in headers:
+            lines.append("%s: %s" % (key, headers[key]))
+        lines.append("Content-Length: %d" % (len(body) if body is not None else 0))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        if body is not None:
+            writer.write(body)
+        await writer.drain()
+
+    async def _receive(self, connection, method):
+        reader, writer = connection
+        while True:
+            statusLine = await reader.readuntil(b"\r\n")
+            version, status, reason = (statusLine.decode('latin-1').rstrip("\r\n").split(" ", 2) + [""])[:3]
+            status = int(status)
+            respHeaders = HTTPMessage()
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                if line == b"\r\n":
+                    break
+                key, value = line.decode('latin-1').split(":", 1)
+                respHeaders[key.strip()] = value.strip()
+            # skip interim (1xx) responses; the final response follows
+            if not 100 <= status < 200:
+                break
+
+        if method == "HEAD" or status in (204, 304):
+            # no body, whatever the headers say
+            data = b""
+        elif respHeaders.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b"".join(chunks)
+        elif "Content-Length" in respHeaders:
+            data = await reader.readexactly(int(respHeaders["Content-Length"]))
+        else:
+            data = await reader.read()
+            respHeaders["Connection"] = "close"
+        return status, reason, respHeaders, data
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+    def getStats(self):
+        return { "poolsize": self.poolSize,
+                 "created": self._connectionsCreated,
+                 "reused": self._connectionsReused,
+                 "idle": len(self._idle) }
+
+
+# ==============================================================================
+class AsyncANTServerRestClient(ANTServerRESTClient.ANTServerRestClient):
+    '''
+    asyncio version of ANTServerRestClient.
+    Same methods, but every method that talks to the ANT server is a coroutine,
+    so all monitors and the mission generator can share one event loop.
+    '''
+    ConnectionPoolClass = AsyncConnectionPool
+
+    def __init__(self, ipAddress="localhost", portNumber=8081, username="admin", password="123456", debug=False, poolSize=4, sessionTimeout=300):
+        super().__init__(ipAddress, portNumber, username, password, debug, poolSize, sessionTimeout)
+        self._sessionLock = asyncio.Lock()
+
+    def close(self):
+        ''' close all idle pooled connections '''
+        self.disableStatistics()
+        self._connectionPool.close()
+
+
+    # -----------------------------------
+    # Method to call when starting a session with ANT server
+    async def getSessionToken(self):
+        if self._sessionToken != "" and not self._isSessionExpired():
+            return self._sessionToken
+        return await self.refreshSessionToken(self._sessionToken)
+
+    async def refreshSessionToken(self, staleToken=None):
+        ''' login again unless another task already replaced staleToken '''
+        async with self._sessionLock:
+            if self._sessionToken != "" and self._sessionToken != staleToken and not self._isSessionExpired():
+                return self._sessionToken
+            loginResp = await self.executeRESTRequest(self._restLoginRequestPath, "GET")
+            jsonLogin = json.loads(loginResp)
+            self._sessionToken = str(jsonLogin["payload"]["sessiontoken"])
+            self._sessionLogins += 1
+            if self._sessionTimeout:
+                self._sessionExpiry = time.monotonic() + self._sessionTimeout
+            return self._sessionToken
+
+    async def invalidateSessionToken(self):
+        ''' force a login on the next call of getSessionToken '''
+        async with self._sessionLock:
+            self._sessionToken = ""
+
+
+    async def executeRESTRequest(self, requestPath, method, data=None):
+
+        # Replace all spaces in the request by %20
+        requestPath = requestPath.replace(" ", "%20")
+
+        ''' send REST request and get response'''
+        if self._debug:
+            print(" REQ:", requestPath)
+        statistics = self._statistics
+        if statistics is not None:
+            start = time.perf_counter()
+        status, body = None, None
+        try:
+            url = urlsplit(requestPath)
+            if method is None:
+                method = "GET" if data is None else "POST"
+            headers = { "Connection": "keep-alive" }
+            if data is not None:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            path = url.path + "?" + url.query if url.query else url.path
+            status, reason, respHeaders, body = await self._connectionPool.request(method, path, data, headers)
+            staleToken = re.search("sessiontoken=([^&]*)", path)
+            if status in (401, 403) and staleToken is not None:
+                # session token rejected; login again (once for all tasks) and retry
+                freshToken = await self.refreshSessionToken(staleToken.group(1))
+                requestPath = requestPath.replace("sessiontoken=" + staleToken.group(1), "sessiontoken=" + freshToken)
+                path = path.replace("sessiontoken=" + staleToken.group(1), "sessiontoken=" + freshToken)
+                status, reason, respHeaders, body = await self._connectionPool.request(method, path, data, headers)
+            if status >= 400:
+                raise HTTPError(requestPath, status, reason, respHeaders, None)
+            response = body.decode('utf-8')
+            if self._debug:
+                print("RESP:", response)
+            return response
+
+        except Exception as e:
+            print("\tERROR: Unable to process request '%s': %s", requestPath, e)
+            raise
+
+        finally:
+            if statistics is not None:
+                statistics.record(method, url.path, time.perf_counter() - start, len(data) if data else 0, len(body) if body else 0, status is None or status >= 400)
+
+    # -----------------------------------
+    # post a command {"command": {"name": name, "args": args}}
+    async def _executeCommand(self, requestLink, name, args):
+        commandData = { "command": { "name": name, "args": args } }
+        if self._debug:
+            print (str(commandData))
+        requestData = json.JSONEncoder().encode(commandData)
+        return await self.executeRESTRequest(requestLink, "POST", requestData.encode('utf-8'))
+
+    # -----------------------------------
+    # insert a vehicle at a specified node
+    async def executeInsertVehicleRESTRequest(self, vehicleName, nodeId):
+        ''' Execute REST request to insert a vehicle at a given node'''
+        if self._debug:
+            print("Inserting vehicle : " + vehicleName + " on node : " + nodeId)
+        vehicleResp = await self._executeCommand(self._restVehicleRequestPath + "/" + vehicleName + "/command" + self._sessionTokenPath + self._sessionToken, "insert", { "nodeId": str(nodeId) })
+        jsonVehicles = json.loads(vehicleResp)
+        return jsonVehicles["payload"]["vehicle"]
+
+    # -----------------------------------
+    # extract a vehicle from traffic
+    async def executeExtractVehicleRESTRequest(self, vehicleName):
+        ''' Execute REST request to extract a vehicle'''
+        if self._debug:
+            print("Extract vehicle : " + vehicleName )
+        vehicleResp = await self._executeCommand(self._restVehicleRequestPath + "/" + vehicleName + "/command" + self._sessionTokenPath + self._sessionToken, "extract", {})
+        jsonVehicles = json.loads(vehicleResp)
+        return jsonVehicles["payload"]["vehicle"]
+
+    # -----------------------------------
+    # set value of an IO
+    async def executeSetIOValueRESTRequest(self, IOName, value):
+        ''' Execute REST request to set IO device '''
+        if self._debug:
+            print("Setting IO : " + IOName + " to value : " + str(value))
+        ioResp = await self._executeCommand(self._restDeviceRequestPath + "/" + IOName + "/command" + self._sessionTokenPath + self._sessionToken, "write", { "value": str(value) })
+        if self._debug:
+            print( "executeSetIOValueRESTRequest: ioResp %s" % ioResp )
+        return
+
+    # -----------------------------------
+    # Extract all vehicles from traffic
+    async def executeExtractAllVehicleRESTRequest(self, maxParallel=None):
+        ''' Execute REST request to extract all vehicles '''
+        print("Extracting all vehicles : ")
+        vehicleList = await self.executeGetVehicleListRESTRequest()
+        for vehicle, (result, error) in zip(vehicleList, await self.executeConcurrently(self.executeExtractVehicleRESTRequest, [ (vehicle["name"],) for vehicle in vehicleList ], maxParallel)):
+            if error is not None:
+                print("executeExtractAllVehicleRESTRequest: could not extract %s: %s" % (vehicle["name"], error))
+        return vehicleList
+
+    # -----------------------------------
+    # await coroutine(*args) for every args of argsList, at most maxParallel
+    # (default: pool size) at a time; returns [ (result, exception), ... ] in argsList order
+    async def executeConcurrently(self, coroutine, argsList, maxParallel=None):
+        slots = asyncio.Semaphore(max(1, maxParallel or self._connectionPool.poolSize))
+        async def call(args):
+            async with slots:
+                try:
+                    return (await coroutine(*args), None)
+                except Exception as e:
+                    return (None, e)
+        return await asyncio.gather(*[ call(args) for args in argsList ])
+
+    # -----------------------------------
+    # Get the list of all vehicles
+    async def executeGetVehicleListRESTRequest(self):
+        try:
+            vehicles = await self.executeRESTRequest(self._restVehicleRequestPath + self._sessionTokenPath + self._sessionToken, "GET")
+            jsonVehicles = json.loads(vehicles)
+            vehicleList = jsonVehicles["payload"]["vehicles"]
+        except:
+            print( "executeGetVehicleListRESTRequest: EXCEPT" )
+            vehicleList = []
+        return vehicleList
+
+    # -----------------------------------
+    # Get the list of all devices
+    async def executeGetDeviceListRESTRequest(self, nbrOfDevices):
+        jsonDevices = { "retcode": -1 }
+        try:
+            devices = await self.executeRESTRequest(self._restDeviceRequestPath + self._sessionTokenPath + self._sessionToken + "&datarange=%5B0%2C" + str(nbrOfDevices) + "%5D",  "GET")
+            jsonDevices = json.loads(devices)
+            if self._debug:
+                print( "jsonDevices=%s" % jsonDevices )
+            deviceList = jsonDevices["payload"]["devices"]
+        except:
+            print( "executeGetDeviceListRESTRequest: retcode = %d" % jsonDevices["retcode"] )
+            deviceList = []
+        return deviceList
+
+    # -----------------------------------
+    # Get the list of all areas
+    async def executeGetAreaListRESTRequest(self, nbrOfAreas):
+        areas = await self.executeRESTRequest(self._restAreasRequestPath + self._sessionTokenPath + self._sessionToken,  "GET")
+        jsonAreas = json.loads(areas)
+        if self._debug:
+            print( "jsonAreas=%s" % jsonAreas )
+        return jsonAreas["payload"]["areas"]
+
+    async def executeOpenAreaRESTRequest(self, areaId, open):
+        ''' Execute REST request to set area open '''
+        if self._debug:
+            print("Setting area : " + str(areaId) + " to value : " + str(open))
+        await self._executeCommand(self._restAreasRequestPath + "/" + str(areaId) + "/command" + self._sessionTokenPath + self._sessionToken, "open", { "open": "true" if open else "false" })
+        return
+
+    # -----------------------------------
+    # Create a new mission
+    async def executeCreateMissionRESTRequest(self, missionData):
+        if self._debug:
+            print("Create Mission Request : ")
+            print("request data : " + missionData)
+
+        requestLink = self._restMissionRequestPath + self._sessionTokenPath + self._sessionToken
+        missions = await self.executeRESTRequest(requestLink, "POST", missionData.encode('utf-8'))
+
+        jsonMissions = json.loads(missions)
+        if self._debug:
+            print("reponse from ANT server :")
+            print(str(jsonMissions))
+        try:
+            return jsonMissions["payload"]["acceptedmissions"] + jsonMissions["payload"]["pendingmissions"]
+        except Exception as e:
+            print("executeCreateMissionRESTRequest: could not retrieve acceptedmissions + pendingmissions; exception: %s" % e)
+            return None
+
+    # -----------------------------------
+    # Create many missions; identical missions are merged using 'cardinality',
+    # the remaining requests are posted concurrently. A failed request sets the
+    # group's "error" and does not stop the other groups.
+    async def executeCreateMissionsBulkRESTRequest(self, missions, maxParallel=None):
+        async def createGroup(group):
+            async with slots:
+                missionData = self._createGroupMissionData(group)
+                requestLink = self._restMissionRequestPath + self._sessionTokenPath + self._sessionToken
+                try:
+                    jsonMissions = json.loads(await self.executeRESTRequest(requestLink, "POST", missionData.encode('utf-8')))
+                except Exception as e:
+                    group["error"] = str(e)
+                    return group
+            try:
+                group["acceptedmissions"] = jsonMissions["payload"]["acceptedmissions"]
+                group["pendingmissions"] = jsonMissions["payload"]["pendingmissions"]
+            except Exception as e:
+                print("executeCreateMissionsBulkRESTRequest: could not retrieve acceptedmissions + pendingmissions; exception: %s" % e)
+            return group
+
+        slots = asyncio.Semaphore(maxParallel or self._connectionPool.poolSize)
+        return await asyncio.gather(*[ createGroup(group) for group in self._groupMissions(missions) ])
+
+    # -----------------------------------
+    # change the priority of a mission
+    async def executeChangeMissionPriorityRequest(self, missionid, prio ):
+        if self._debug:
+            print("Change mission priority : " + missionid + " prio : " + prio )
+        try:
+            priority = self._priority[prio.lower()]
+        except:
+            print("priority %s not defined; use medium priority", prio)
+            priority = self._priority["medium"]
+        missionResp = await self._executeCommand(self._restChangeMissionPriorityRequestPath + "/" + missionid + "/command" + self._sessionTokenPath + self._sessionToken, "setPriority", { "priority": priority })
+        jsonMission = json.loads(missionResp)
+        try:
+            mission = jsonMission["payload"]["missions"]
+        except:
+            print( "executeChangeMissionPriorityRequest: json=%s" % jsonMission )
+            mission = []
+        return mission
+
+    # -----------------------------------
+    # Get the list of all missions
+    async def executeGetMissionListRESTRequest(self, nbrOfMissions):
+        requestLink = self._restMissionRequestPath + self._sessionTokenPath + self._sessionToken
+        requestLink += "&datarange=%5B0%2C" + str(nbrOfMissions) + "%5D"
+        missions = await self.executeRESTRequest( requestLink, "GET")
+        jsonMissions = json.loads(missions)
+        return jsonMissions["payload"]["missions"]
+
+    # -----------------------------------
+    # Get the list of all active  missions
+    async def executeGetActiveMissionListRESTRequest(self, nbrOfMissions):
+        jsonMissions = { "retcode": -1 }
+        try:
+            requestLink = self._restMissionRequestPath + self._sessionTokenPath + self._sessionToken
+            requestLink += "&datarange=%5B0%2C" + str(nbrOfMissions) + "%5D"
+            requestLink += "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D"
+            requestLink += "&dataselection=%7B%22criteria%22%3A%5B%22navigationstate%3A%3Aint IN%3A 3%7C0%7C1%22%5D%2C%22composition%22%3A%22AND%22%7D"
+            missions = await self.executeRESTRequest( requestLink, "GET")
+            jsonMissions = json.loads(missions)
+            missionList = jsonMissions["payload"]["missions"]
+        except:
+            print( "executeGetActiveMissionListRESTRequest: retcode = %d" % jsonMissions["retcode"] )
+            missionList = []
+        return missionList
+
+    # -----------------------------------
+    # Walk a list resource window by window; 'parallel' windows are fetched concurrently
+    async def iterateRESTList(self, requestPath, listKey, pageSize=100, parallel=1, query="", idFunc=None):
+        pageSize = int(pageSize)
+
+        async def getWindow(start):
+            requestLink = requestPath + self._sessionTokenPath + self._sessionToken
+            requestLink += "&datarange=%5B" + str(start) + "%2C" + str(start + pageSize) + "%5D" + query
+            return json.loads(await self.executeRESTRequest(requestLink, "GET"))["payload"][listKey]
+
+        seenIds = set()
+        start = 0
+        while True:
+            windows = await asyncio.gather(*[ getWindow(start + n * pageSize) for n in range(max(1, parallel)) ])
+            for items in windows:
+                for item in items:
+                    if idFunc is not None:
+                        id = idFunc(item)
+                        if id in seenIds:
+                            continue
+                        seenIds.add(id)
+                    yield item
+                if len(items) < pageSize:
+                    return
+                start += pageSize
+
+    def iterMissions(self, pageSize=100, parallel=1):
+        query = "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D"
+        return self.iterateRESTList(self._restMissionRequestPath, "missions", pageSize, parallel, query, lambda m: m["missionid"])
+
+    def iterActiveMissions(self, pageSize=100, parallel=1):
+        query = "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D"
+        query += "&dataselection=%7B%22criteria%22%3A%5B%22navigationstate%3A%3Aint IN%3A 3%7C0%7C1%22%5D%2C%22composition%22%3A%22AND%22%7D"
+        return self.iterateRESTList(self._restMissionRequestPath, "missions", pageSize, parallel, query, lambda m: m["missionid"])
+
+    def iterDevices(self, pageSize=100, parallel=1):
+        return self.iterateRESTList(self._restDeviceRequestPath, "devices", pageSize, parallel, "", lambda d: d["meta"]["deviceid"])
+
+    def iterChangedMissions(self, since, pageSize=100, parallel=1, field="timestamp"):
+        query = "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D" + self.changedSinceQuery(field, since)
+        return self.iterateRESTList(self._restMissionRequestPath, "missions", pageSize, parallel, query, lambda m: m["missionid"])
+
+    def iterChangedDevices(self, since, pageSize=100, parallel=1, field="meta.state.timestamp"):
+        return self.iterateRESTList(self._restDeviceRequestPath, "devices", pageSize, parallel, self.changedSinceQuery(field, since), lambda d: d["meta"]["deviceid"])
+
+    # -----------------------------------
+    # Cancel a specific mission
+    async def executeCancelMissionRESTRequest(self, missionID):
+        if self._debug:
+            print("Canceling mission : " + str(missionID))
+        await self.executeRESTRequest(self._restMissionRequestPath + "/" + str(missionID) + self._sessionTokenPath + self._sessionToken, "DELETE")
+
+    # -----------------------------------
+    # Cancel all missions
+    async def executeCancelAllMissionRESTRequest(self):
+        if self._debug:
+            print("Canceling all planned missions : ")
+        await self.executeRESTRequest(self._restMissionRequestPath + self._sessionTokenPath + self._sessionToken, "DELETE")
+
+    # -----------------------------------
+    # Get infos about all vehicles
+    async def getVehiclesInfo(self):
+        ''' Execute REST request to get the informations on all vehicles '''
+        vehicleResp = await self.executeRESTRequest(self._restVehicleRequestPath + self._sessionTokenPath + self._sessionToken, "GET")
+        return json.loads(vehicleResp)
+
+    # -----------------------------------
+    # Get info about all alarms
+    async def getAlarms(self, addition):
+        ''' Execute REST request to get all alarms '''
+        alarmResp = await self.executeRESTRequest(self._restAlarmsRequestPath + self._sessionTokenPath + self._sessionToken + addition, "GET")
+        jsonAlarms = json.loads(alarmResp)
+        return jsonAlarms["payload"]["alarms"]
+
+    # -----------------------------------
+    # Get info about all missions
+    async def getMissions(self, nrOfMissions):
+        ''' Execute REST request to get all missions '''
+        request = self._restMissionRequestPath + self._sessionTokenPath + self._sessionToken
+        request += "&datarange=%5B0%2C" + str(nrOfMissions) + "%5D"
+        request += "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D"
+        missionResp = await self.executeRESTRequest( request, "GET")
+        jsonMissions = json.loads(missionResp)
+        if len(jsonMissions["payload"]["missions"]):
+            return jsonMissions["payload"]["missions"]
+        else:
+            return None
+
+    # -----------------------------------
+    # Get info about all active missions
+    async def getActiveMissions(self, nrOfMissions):
+        ''' Execute REST request to get all active missions '''
+        return await self.executeGetActiveMissionListRESTRequest(nrOfMissions)
+
+    # -----------------------------------
+    # Get info about one mission
+    async def getMission(self, id):
+        ''' Execute REST request to get one mission '''
+        request = self._restMissionRequestPath + "/"+ id + self._sessionTokenPath + self._sessionToken
+        missionResp = await self.executeRESTRequest(request, "GET")
+        jsonMissions = json.loads(missionResp)
+        if len(jsonMissions["payload"]["missions"]):
+            return jsonMissions["payload"]["missions"][0]
+        else:
+            return None
+
+    # Get infos about Application
+    async def getApplicationInfo(self):
+        appResp = await self.executeRESTRequest(self._restApplicationRequestPath + self._sessionTokenPath + self._sessionToken, "GET")
+        jsonApplication = json.loads(appResp)
+        return jsonApplication["payload"]["application"]
+
+    # -----------------------------------
+    # Get infos the server
+    async def getServerInfo(self):
+        serverResp = await self.executeRESTRequest(self._restServerRequestPath + self._sessionTokenPath + self._sessionToken, "GET")
+        jsonServer = json.loads(serverResp)
+        return jsonServer["payload"]
+
+    # Get info about all stations
+    async def getStations(self):
+        ''' Execute REST request to get all stations '''
+        stationResp = await self.executeRESTRequest( self._restStationRequestPath + self._sessionTokenPath + self._sessionToken, "GET")
+        jsonStations = json.loads(stationResp)
+        return jsonStations["payload"]["groups"]
+
+    # -----------------------------------
+    # Get info about the map
+    async def getMap(self):
+        ''' Execute REST request to get map data '''
+        mapResp = await self.executeRESTRequest( self._restMapRequestPath + self._sessionTokenPath + self._sessionToken, "GET")
+        jsonMap = json.loads(mapResp)
+        return jsonMap["payload"]["data"][0]
+
+    # -----------------------------------
+    # Delete an alarm
+    async def deleteAlarm(self, addition):
+        ''' Execute REST request to delete an alarm '''
+        alarmResp = await self.executeRESTRequest(self._restAlarmsRequestPath + "/" + addition + self._sessionTokenPath + self._sessionToken, "DELETE")
+        jsonAlarms = json.loads(alarmResp)
+        return jsonAlarms["payload"]
+
+    # -----------------------------------
+    # Change the pause mode of ant server
+    async def executePauseANTServerRESTRequest(self, pausestate ):
+        ''' Execute REST request to change the pause state of the server'''
+        if self._debug:
+            print( "pauseANTServer: %s" % pausestate )
+        Data = { "commands": [ { "name": "pauseANTServer", "args": { "pause": "true" if pausestate else "false" } } ] }
+        requestLink = self._restApplicationNavigationSettingsRequestPath + "/command" + self._sessionTokenPath + self._sessionToken
+        requestData = json.JSONEncoder().encode( Data )
+        serverResp = await self.executeRESTRequest( requestLink, "POST", requestData.encode( 'utf-8' ) )
+        jsonServer = json.loads( serverResp )
+        return jsonServer["payload"]
+
+
+# -----------------------------------------------------------------------------
+# poll coroutine(*args) every interval seconds and pass the result to handler
+async def poll(interval, coroutine, args, handler):
+    while True:
+        try:
+            handler(await coroutine(*args))
+        except Exception as e:
+            print("poll %s: exception: %s" % (coroutine.__name__, e))
+        await asyncio.sleep(interval)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='Host address of ANT-Server', default='localhost')
+    parser.add_argument('--port', help='Port of ANT-Server', default='8081')
+    parser.add_argument('--interval', help='Poll every interval seconds', default='1')
+    parser.add_argument('--max', help='Max number of missions/devices', default='200')
+    parser.add_argument('--debug', help="Show debug", action='store_true')
+    args = parser.parse_args()
+
+    async def main():
+        restClient = AsyncANTServerRestClient(ipAddress=args.host, portNumber=int(args.port), debug=args.debug)
+        await restClient.getSessionToken()
+        interval = float(args.interval)
+        # one event loop polls missions, devices and vehicles concurrently
+        await asyncio.gather(
+            poll(interval, restClient.getActiveMissions, [args.max], lambda missions: print("%d active missions" % len(missions))),
+            poll(interval, restClient.executeGetDeviceListRESTRequest, [args.max], lambda devices: print("%d devices" % len(devices))),
+            poll(interval, restClient.getVehiclesInfo, [], lambda vehicles: print("%d vehicles" % len(vehicles["payload"]["vehicles"]))),
+        )
+
+    asyncio.run(main())
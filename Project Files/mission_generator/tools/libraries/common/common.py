@@ -4,6 +4,7 @@ import logging
 import json
 import sys
 import random
+import bisect
 
 
 def initLogger(name, debug, info):
@@ -62,3 +63,44 @@ def getValueFromListInRandomOrder(l):
     ListSequences[key] = (l,seq)
     return l[seq]
 
+
+class Histogram():
+    """ histogram with logarithmic buckets (smallest * growth**i), so memory does not
+        grow with the number of values. Percentiles are the upper bound of the bucket
+        holding them; values below smallest (also negative ones) go in the first bucket.
+    """
+    def __init__(self, smallest=0.0001, growth=2.0, buckets=24):
+        self._bounds = [ smallest * growth ** i for i in range(buckets) ]
+        self._counts = [ 0 ] * (buckets + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        rank = p / 100.0 * self.count
+        cumulative = 0
+        for i, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= rank and count > 0:
+                return min(self._bounds[i], self.max) if i < len(self._bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return { "count": self.count, "mean": self.mean(), "min": self.min, "max": self.max,
+                 "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99),
+                 "buckets": { "%g" % bound: count for bound, count in zip(self._bounds + [ float("inf") ], self._counts) if count } }
@@ -8,23 +8,34 @@ import datetime
 import time
 import json
 import re
+import copy
 import threading
 import argparse
 import Missions
 import Devices
 import Stations
+import Monitor
+import EventDispatcher
+import KPI
 import logging
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--host', help='Host address of ANT-Server', default='localhost') 
-parser.add_argument('--interval', help='Monitor every interval seconds (when zero only do it once)', default='0.1')
+parser.add_argument('--interval', help='Poll the devices and the missions every interval seconds (zero: 1 second)', default='1.0')
 parser.add_argument('--max', help='Max number of missions/devices', default='200')
 parser.add_argument('--info', help="Show info", action='store_true')
 parser.add_argument('--verbose', help="Show missions verbose", action='store_true')
 parser.add_argument('--debug', help="Show  debug information", action='store_true')
 parser.add_argument('--config', help='Config file', default='ActionsConfig.json')
 parser.add_argument('--multithreading', help="Use multi threading", action='store_true')
+parser.add_argument('--incremental', help="Only fetch missions/devices changed since the previous cycle", action='store_true')
+parser.add_argument('--statistics', help='Print per endpoint REST statistics and monitor timings every n seconds', default=None)
+parser.add_argument('--jitter', help='Random delay of each monitor cycle as fraction of the interval', default='0.1')
+parser.add_argument('--workers', help='Event handler threads; events of one mission/device are handled in order (0: handle events on the monitor thread)', default='4')
+parser.add_argument('--queue', help='Max queued events per event handler thread; monitors wait when full', default='1000')
+parser.add_argument('--kpi', help='Collect mission lead time and throughput KPIs and write snapshots to this file', default=None)
+parser.add_argument('--kpi_every', help='Write a KPI snapshot every n seconds', default='60')
 args = parser.parse_args()
 
 
@@ -62,18 +73,32 @@ Missions.setLoggingLevel(level)
 # 'parameters': {}
 
 Configuration = {}
+# runs the mission and device event handlers; created in main
+Dispatcher = EventDispatcher.EventDispatcher(0)
+# mission KPIs (--kpi); created in main
+Collector = None
+
+# mission fields the feedback lights and mission buttons depend on
+LoadFields = { "fromnode", "isloaded" }
 
 def missionEventHandler(event, current_mission, prev_mission):
     if args.verbose: current_mission.show(args.verbose, "missionEventHandler:%s:" % event)
+    if Collector is not None:
+        Collector.handleEvent(event, current_mission, prev_mission)
     returnMissionMissionEventHandler(event, current_mission, prev_mission)
-    feedbackLightMissionEventHandler(event, current_mission, prev_mission)
-    missionOnButtonsMissionEventHandler(event, current_mission, prev_mission)
+    if event != "changed" or current_mission.getChangedFields() & LoadFields:
+        feedbackLightMissionEventHandler(event, current_mission, prev_mission)
+        missionOnButtonsMissionEventHandler(event, current_mission, prev_mission)
 
 
 #######################################
 # create return mission when something delivered
 ########################################
 createdReturnMissionForIds = []
+# the mission event handlers run on the dispatcher workers and the timeout check on the
+# scheduler: the return mission admin is checked and marked under this lock; the missions
+# are created after releasing it, and the mark is undone when that fails
+ReturnMissionsLock = threading.Lock()
 def stationAvailableForPickup( station, nLoads=1 ):
     try:
         stocklevel = Stations.getStation(station).stocklevel()
@@ -92,51 +117,69 @@ def stationAvailableForDropoff( station, nLoads=1 ):
         return True
     return freeplaces >= nLoads
             
+def createReturnMission(returnMission):
+    return Missions.createMission( "Transport from station to station", returnMission["description"], returnMission["from"], returnMission["to"], returnMission["payload"], returnMission["priority"], fatal=False )
+
 def returnMissionMissionEventHandler(event, current_mission, prev_mission):
-    missionData = current_mission._missionData
-    for returnMission in Configuration["returnMissions"]:
-        log.debug("returnMission %s: mission tonode=%s, config delivery=%s" % ( returnMission["description"], missionData['tonode'], returnMission["delivery"] ) )
-        if missionData['tonode'] == returnMission["delivery"]:
-            loadAtSrc = stationAvailableForPickup( returnMission["from"] )
-            roomAtDst = stationAvailableForDropoff( returnMission["to"] )
-
-            if "timetodestination" in missionData.keys():
-                log.info("returnMissionMissionEventHandler[%s]: check return for mission[%s] loadAtScr=%s, roomAtDst=%s state=%d, timetodest=%d, createdMissionIds=%s" % ( returnMission["description"], missionData['missionid'], loadAtSrc, roomAtDst, missionData['transportstate'],missionData['timetodestination'], createdReturnMissionForIds  ) )
-                # something on its way to delivery station; when less than 4 seconds. create return mission.
-                if missionData['transportstate'] == 7 and missionData['timetodestination'] <= returnMission["time_before_finished"] and loadAtSrc and roomAtDst and missionData["missionid"] not in createdReturnMissionForIds: 
-                    log.info(f"Something delivered at {returnMission['delivery']}: create return mission {returnMission['description']}" )
-                    Missions.createMission( "Transport from station to station", returnMission["description"], returnMission["from"], returnMission["to"], returnMission["payload"], returnMission["priority"] )
-                    log.debug("Mark missionid %s to have created return mission for" % missionData["missionid"] )
-                    createdReturnMissionForIds.append( missionData["missionid"] )
-
-            if event == "deleted" and missionData["missionid"] in createdReturnMissionForIds:
-                log.debug("Remove missionid %s from created return mission for admin" % missionData["missionid"] )
-                createdReturnMissionForIds.remove( missionData["missionid"] )
+    toCreate = []
+    with ReturnMissionsLock:
+        for returnMission in Configuration["returnMissions"]:
+            log.debug("returnMission %s: mission tonode=%s, config delivery=%s" % ( returnMission["description"], current_mission.tonode, returnMission["delivery"] ) )
+            if current_mission.tonode == returnMission["delivery"]:
+                loadAtSrc = stationAvailableForPickup( returnMission["from"] )
+                roomAtDst = stationAvailableForDropoff( returnMission["to"] )
+
+                if current_mission.timetodestination is not None:
+                    log.info("returnMissionMissionEventHandler[%s]: check return for mission[%s] loadAtScr=%s, roomAtDst=%s state=%d, timetodest=%d, createdMissionIds=%s" % ( returnMission["description"], current_mission.id, loadAtSrc, roomAtDst, current_mission.transportstate,current_mission.timetodestination, createdReturnMissionForIds  ) )
+                    # something on its way to delivery station; when less than 4 seconds. create return mission.
+                    if current_mission.transportstate == 7 and current_mission.timetodestination <= returnMission["time_before_finished"] and loadAtSrc and roomAtDst and current_mission.id not in createdReturnMissionForIds: 
+                        log.info(f"Something delivered at {returnMission['delivery']}: create return mission {returnMission['description']}" )
+                        log.debug("Mark missionid %s to have created return mission for" % current_mission.id )
+                        createdReturnMissionForIds.append( current_mission.id )
+                        toCreate.append( returnMission )
+
+                if event == "deleted" and current_mission.id in createdReturnMissionForIds:
+                    log.debug("Remove missionid %s from created return mission for admin" % current_mission.id )
+                    createdReturnMissionForIds.remove( current_mission.id )
+
+    for returnMission in toCreate:
+        if createReturnMission( returnMission ) is None:
+            with ReturnMissionsLock:
+                log.debug("Unmark missionid %s: return mission not created" % current_mission.id )
+                if current_mission.id in createdReturnMissionForIds:
+                    createdReturnMissionForIds.remove( current_mission.id )
 
 
 def checkForTimeoutReturnMissions(Configuration):
-    for returnMission in Configuration["returnMissions"]:
-        if "timeout" in returnMission.keys():
-            loadAtSrc = stationAvailableForPickup( returnMission["from"] )
-            roomAtDst = stationAvailableForDropoff( returnMission["to"] )
-            if args.verbose: log.info("returnMissionMissionEventHandler[%s]: check for timeout %s loadAtSrc=%s, roomAtDst=%s" % ( returnMission["description"], returnMission["timeout"], loadAtSrc, roomAtDst ) )
-            if Missions.retrieveMissionByDestination( returnMission['delivery'] ) is None and Missions.retrieveMissionByOrigin( returnMission['from'] ) is None and loadAtSrc and roomAtDst: 
-                # nothing on the way to delivery or from return from station; check for timeout
-                if not "start_time" in returnMission.keys():
-                    returnMission["start_time"] = time.time()
+    toCreate = []
+    with ReturnMissionsLock:
+        for returnMission in Configuration["returnMissions"]:
+            if "timeout" in returnMission.keys():
+                loadAtSrc = stationAvailableForPickup( returnMission["from"] )
+                roomAtDst = stationAvailableForDropoff( returnMission["to"] )
+                if args.verbose: log.info("returnMissionMissionEventHandler[%s]: check for timeout %s loadAtSrc=%s, roomAtDst=%s" % ( returnMission["description"], returnMission["timeout"], loadAtSrc, roomAtDst ) )
+                if Missions.retrieveMissionByDestination( returnMission['delivery'] ) is None and Missions.retrieveMissionByOrigin( returnMission['from'] ) is None and loadAtSrc and roomAtDst: 
+                    # nothing on the way to delivery or from return from station; check for timeout
+                    if not "start_time" in returnMission.keys():
+                        returnMission["start_time"] = time.time()
+                    else:
+                        t_elapsed = time.time() - returnMission["start_time"]
+                        t_left = returnMission["timeout"] - t_elapsed 
+                        log.info("returnMissionMissionEventHandler[%s]: check for timeout: elapsed %s timeout %s left %s loadAtSrc=%s, roomAtDest=%s" % ( returnMission["description"], t_elapsed, returnMission["timeout"], t_left, loadAtSrc, roomAtDst ) )
+                        if t_left < 0: 
+                            log.info(f"Timeout {t_elapsed} occured on returnMission['from']: create return mission {returnMission['description']}" )
+                            toCreate.append( ( returnMission, returnMission.pop("start_time") ) )
+
                 else:
-                    t_elapsed = time.time() - returnMission["start_time"]
-                    t_left = returnMission["timeout"] - t_elapsed 
-                    log.info("returnMissionMissionEventHandler[%s]: check for timeout: elapsed %s timeout %s left %s loadAtSrc=%s, roomAtDest=%s" % ( returnMission["description"], t_elapsed, returnMission["timeout"], t_left, loadAtSrc, roomAtDst ) )
-                    if t_left < 0: 
-                        log.info(f"Timeout {t_elapsed} occured on returnMission['from']: create return mission {returnMission['description']}" )
-                        Missions.createMission( "Transport from station to station", returnMission["description"], returnMission["from"], returnMission["to"], returnMission["payload"], returnMission["priority"] )
+                    # reset time
+                    if "start_time" in returnMission.keys():
                         del returnMission["start_time"]
 
-            else:
-                # reset time
-                if "start_time" in returnMission.keys():
-                    del returnMission["start_time"]
+    for returnMission, start_time in toCreate:
+        if createReturnMission( returnMission ) is None:
+            with ReturnMissionsLock:
+                # not created: the timeout still runs from the same start
+                returnMission.setdefault("start_time", start_time)
 
 
 #######################################
@@ -144,22 +187,22 @@ def checkForTimeoutReturnMissions(Configuration):
 ########################################
 FeedbackLights = []
 def feedbackLightMissionEventHandler(event, current_mission, prev_mission):
-    missionData = current_mission._missionData
     for feedbackLight in FeedbackLights:
         log.debug("feedbackLightMissionEventHandler: handle %s", feedbackLight.getId())
-        if missionData['fromnode'] == feedbackLight.getId():
-            if not missionData["isloaded"]:
-                log.debug("Check feedback light %s isLightSet(True)=%s" %(feedbackLight.getId(), feedbackLight.isLightSet(True)))
-                if not feedbackLight.isLightSet( True ):
-                    log.info("##### Time has come to switch ON feedback light %s #####" % feedbackLight.getId())
-                    feedbackLight.setLight( True )
-                    feedbackLight.setRequestor( missionData["missionid"] )
-            if ( ( event == "deleted" or missionData["isloaded"] ) and  
-                 ( not feedbackLight.isLightSet (False) and  feedbackLight.compareRequestor( missionData["missionid"] ) )
-            ):
-                log.info("##### Time has come to switch OFF feedback light %s #####" % feedbackLight.getId())
-                feedbackLight.setLight( False )
-                feedbackLight.setRequestor( "" )
+        with feedbackLight._lock:
+            if current_mission.fromnode == feedbackLight.getId():
+                if not current_mission.isloaded:
+                    log.debug("Check feedback light %s isLightSet(True)=%s" %(feedbackLight.getId(), feedbackLight.isLightSet(True)))
+                    if not feedbackLight.isLightSet( True ):
+                        log.info("##### Time has come to switch ON feedback light %s #####" % feedbackLight.getId())
+                        feedbackLight.setLight( True )
+                        feedbackLight.setRequestor( current_mission.id )
+                if ( ( event == "deleted" or current_mission.isloaded ) and  
+                     ( not feedbackLight.isLightSet (False) and  feedbackLight.compareRequestor( current_mission.id ) )
+                ):
+                    log.info("##### Time has come to switch OFF feedback light %s #####" % feedbackLight.getId())
+                    feedbackLight.setLight( False )
+                    feedbackLight.setRequestor( "" )
 
 def setUpFeedbackLights( feedbackLightsConfig ):
     for config in feedbackLightsConfig:
@@ -172,6 +215,8 @@ class FeedbackLight:
         self._id = config["id"]
         self._requestor = None
         self._on = None
+        # held by the mission event handler while it checks and sets the light
+        self._lock = threading.Lock()
 
     def getId(self):
         return self._id
@@ -204,20 +249,21 @@ def setUpMissionButtons(missionOnButtonsConfig):
 
 def missionOnButtonsMissionEventHandler(event, current_mission, prev_mission):
     # handle mission events.
-    missionData = current_mission._missionData
-    if ( event == "deleted" or missionData["isloaded"] ):
+    if ( event == "deleted" or current_mission.isloaded ):
         # check if mission is created by a button. If so clear missionid
         for create_mission_on_button in CreateMissionOnButtons:
-            if create_mission_on_button._missionid == missionData["missionid"]:
-                log.debug("Mission %s at %s picked up; ready for next: clear missionid" % ( missionData["missionid"], create_mission_on_button._config["button"] ) )
-                create_mission_on_button._missionid = None
-    if ( event == "new" and not missionData["isloaded"] ):
+            with create_mission_on_button._lock:
+                if create_mission_on_button._missionid == current_mission.id:
+                    log.debug("Mission %s at %s picked up; ready for next: clear missionid" % ( current_mission.id, create_mission_on_button._config["button"] ) )
+                    create_mission_on_button._missionid = None
+    if ( event == "new" and not current_mission.isloaded ):
         for create_mission_on_button in CreateMissionOnButtons:
             # disable button if mission for pick is already created; mark missionid
-            if "fromnode" in missionData.keys() and create_mission_on_button._missionid is None and create_mission_on_button._config["from"] == missionData["fromnode"]:
-                log.debug("Mission %s at %s picked up; already exists: set missionid" % ( missionData["missionid"], create_mission_on_button._config["button"] ) )
-                #mark missionid
-                create_mission_on_button._missionid = missionData["missionid"]
+            with create_mission_on_button._lock:
+                if current_mission.fromnode is not None and create_mission_on_button._missionid is None and create_mission_on_button._config["from"] == current_mission.fromnode:
+                    log.debug("Mission %s at %s picked up; already exists: set missionid" % ( current_mission.id, create_mission_on_button._config["button"] ) )
+                    #mark missionid
+                    create_mission_on_button._missionid = current_mission.id
 
 
 
@@ -230,16 +276,32 @@ class CreateMissionOnButtonDevice(Devices.DeviceHandler):
             sys.exit(-2)
         self._config = config
         self._missionid = None
+        # _missionid is set by the button events and the mission events, on different dispatcher
+        # workers: checked and set under this lock. While the mission is created (outside the lock)
+        # it is Creating, so a second press is ignored
+        self._lock = threading.Lock()
         self._button_device.addEventHandler( self )
         
         
     def handleEvent(self, event, device, prev_device):
-        # to be overrules.
+        # creating the mission is a blocking REST call: handle the event on a dispatcher worker
+        Dispatcher.dispatch(device.getId(), self._handleEvent, event, copy.copy(device), prev_device)
+
+    Creating = "creating"
+
+    def _handleEvent(self, event, device, prev_device):
         try:
             if device.getValue():
-                if self._missionid is None:
+                with self._lock:
+                    create = self._missionid is None
+                    if create:
+                        self._missionid = self.Creating
+                if create:
                     log.info("Button %s pressed: Create mission %s" % ( self._config["button"], self._config["description"] ) )
-                    self._missionid = Missions.createMission( "Transport from station to station", self._config["description"], self._config["from"], self._config["to"], self._config["payload"], self._config["priority"] )
+                    missionid = Missions.createMission( "Transport from station to station", self._config["description"], self._config["from"], self._config["to"], self._config["payload"], self._config["priority"], fatal=False )
+                    with self._lock:
+                        if self._missionid == self.Creating:
+                            self._missionid = missionid
                 else:
                     log.warn("Button %s pressed twice (IGNORED)" % self._config["button"])
         except Exception as e: 
@@ -291,15 +353,15 @@ if __name__ == '__main__':
     Configuration = readConfigFile(args.config)
 
     restClient = ANTServerRESTClient.ANTServerRestClient( ipAddress = args.host, debug=args.debug )
+    if args.statistics is not None:
+        restClient.enableStatistics(float(args.statistics))
     Devices.setRestClient(restClient)
     Missions.setRestClient(restClient)
 
-    if args.multithreading:
-        # start monitoring devices.
-        log.info(" ---- Start Monitoring Devices ---- ")
-        y = threading.Thread(target=Devices.monitorDevices, args=(float(args.interval), args.max, None), daemon=True )
-        y.start()
-
+    Dispatcher = EventDispatcher.EventDispatcher(int(args.workers), int(args.queue))
+    Dispatcher.start()
+    if args.kpi is not None:
+        Collector = KPI.KPICollector()
 
     Devices.monitorDevices( 0, args.max, None )
     time.sleep(1)
@@ -309,19 +371,16 @@ if __name__ == '__main__':
     Stations.setupStationTypes( Configuration["StationTypes"] )
     Stations.setupStations( Configuration["Stations"] )
 
-    if args.multithreading:
-        log.info(" ---- Start Monitoring Missions ---- ")
-        x = threading.Thread(target=Missions.monitorMissions, args=(float(args.interval), args.max, missionEventHandler), daemon=True )
-        x.start()
-
-    while True:
-        if args.multithreading:
-            if not x.is_alive() or not y.is_alive():
-                log.fatal("Thread stopped; exiting")
-                sys.exit(-1)
-
-        Devices.monitorDevices( 0, args.max, None )
-        Missions.monitorMissions( 0, args.max, missionEventHandler )
-        checkForTimeoutReturnMissions( Configuration )
-        time.sleep(1)
-
+    # one scheduler polls devices and missions and checks the return timeouts;
+    # with multithreading the resources run on their own worker thread.
+    log.info(" ---- Start Monitoring Devices and Missions ---- ")
+    scheduler = Monitor.PollingScheduler(restClient, workers=3 if args.multithreading else 1, jitter=float(args.jitter))
+    interval = float(args.interval) or 1.0
+    scheduler.add("devices", Devices.monitorDevices, [0, args.max, None, args.incremental], interval)
+    scheduler.add("missions", Missions.monitorMissions, [0, args.max, Dispatcher.handler(missionEventHandler, lambda mission: mission.id), args.incremental], interval)
+    scheduler.add("timeouts", checkForTimeoutReturnMissions, [Configuration], 1.0)
+    if Collector is not None:
+        scheduler.add("kpi", Collector.writeSnapshot, [args.kpi], float(args.kpi_every), jitter=0, delay=float(args.kpi_every))
+    if args.statistics is not None:
+        scheduler.add("timings", lambda: print("Monitor timings: %s\nEvent dispatcher: %s" % (json.dumps(scheduler.getTimings()), json.dumps(Dispatcher.getMetrics()))), [], float(args.statistics), jitter=0)
+    scheduler.run()
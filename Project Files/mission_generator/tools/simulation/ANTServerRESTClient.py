@@ -5,12 +5,138 @@ import sys
 from os import path
 import json
 import urllib
-from urllib import request
-from urllib.request import Request
+from urllib.parse import urlsplit, quote
+from urllib.error import HTTPError
 from datetime import datetime
 import logging
 import datetime
 import time
+import re
+import threading
+import queue
+import concurrent.futures
+import http.client
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), "..", "common"))
+import common
+
+
+# ==============================================================================
+class ConnectionPool():
+    '''
+    Pool of persistent HTTP/1.1 (keep-alive) connections to one ANT server.
+    Connections are handed out to one thread at a time, so the pool can be
+    shared by all monitor threads.
+    When the server closed a reused idle connection, a request is sent again on
+    a fresh connection, unless it is not idempotent (e.g. a POST creating
+    missions) and may already have reached the server.
+    '''
+    Idempotent = ( "GET", "HEAD", "PUT", "DELETE", "OPTIONS" )
+
+    def __init__(self, host, port, poolSize=4, timeout=10 * 60):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self.poolSize = poolSize
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(poolSize)
+        self._lock = threading.Lock()
+        self._connectionsCreated = 0
+        self._connectionsReused = 0
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            connection = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+            reused = False
+        with self._lock:
+            if reused:
+                self._connectionsReused += 1
+            else:
+                self._connectionsCreated += 1
+        return connection, reused
+
+    def _release(self, connection, keep):
+        if keep:
+            self._idle.put(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    def request(self, method, path, body=None, headers=None):
+        ''' send request on a pooled connection; return (status, reason, headers, body) '''
+        while True:
+            connection, reused = self._acquire()
+            sent = False
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                sent = True
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, http.client.CannotSendRequest, http.client.BadStatusLine):
+                self._release(connection, False)
+                if reused and ( not sent or method in ConnectionPool.Idempotent ):
+                    # server closed the idle connection; retry on a fresh one
+                    continue
+                raise
+            except:
+                self._release(connection, False)
+                raise
+            self._release(connection, not response.will_close)
+            return response.status, response.reason, response.headers, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def getStats(self):
+        with self._lock:
+            return { "poolsize": self.poolSize,
+                     "created": self._connectionsCreated,
+                     "reused": self._connectionsReused,
+                     "idle": self._idle.qsize() }
+
+
+# ==============================================================================
+class RESTStatistics():
+    '''
+    Per endpoint and method counters of the REST traffic: requests, errors,
+    bytes in/out and a latency histogram. Ids in the path are replaced by {id},
+    e.g. "POST /wms/rest/devices/{id}/command".
+    '''
+    _idPattern = re.compile(r"/(missions|missioncommands|devices|vehicles|areas|alarms)/[^/]+")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._started = time.time()
+
+    @staticmethod
+    def endpoint(method, path):
+        return method + " " + RESTStatistics._idPattern.sub(r"/\1/{id}", path)
+
+    def record(self, method, path, latency, bytesOut, bytesIn, error):
+        key = RESTStatistics.endpoint(method, path)
+        with self._lock:
+            entry = self._endpoints.get(key)
+            if entry is None:
+                entry = self._endpoints[key] = { "requests": 0, "errors": 0, "bytesout": 0, "bytesin": 0, "latency": common.Histogram() }
+            entry["requests"] += 1
+            entry["bytesout"] += bytesOut
+            entry["bytesin"] += bytesIn
+            if error:
+                entry["errors"] += 1
+            entry["latency"].add(latency)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = { key: dict(entry, latency=entry["latency"].snapshot()) for key, entry in self._endpoints.items() }
+        return { "since": self._started, "duration": time.time() - self._started, "endpoints": endpoints }
 
 
 # ==============================================================================
@@ -18,8 +144,14 @@ class ANTServerRestClient():
     '''
     Rest client to send Rest requests and to receive Rest responses
     '''
-    def __init__(self, ipAddress="localhost", portNumber=8081, username="admin", password="123456", debug=False): 
-        ''' Initialize connection url. '''
+    ConnectionPoolClass = ConnectionPool
+
+    def __init__(self, ipAddress="localhost", portNumber=8081, username="admin", password="123456", debug=False, poolSize=4, sessionTimeout=300): 
+        ''' Initialize connection url. 
+            sessionTimeout: seconds a session token is reused before logging in again (None: until rejected)
+        '''
+        timeout = 10 * 60 #seconds
+        self._connectionPool = self.ConnectionPoolClass(ipAddress, portNumber, poolSize, timeout)
         self._hostUrl = "{0}:{1}".format(ipAddress, portNumber)
         self._ipAddress = ipAddress
         self._portNumber = portNumber
@@ -41,6 +173,12 @@ class ANTServerRestClient():
             "high" : 3
         }
         self._sessionToken = ""
+        self._sessionTimeout = sessionTimeout
+        self._sessionExpiry = 0.0
+        self._sessionLock = threading.Lock()
+        self._sessionLogins = 0
+        self._statistics = None
+        self._statisticsDumper = None
         now = datetime.datetime.utcnow()
         timeFormat = "%Y-%m-%dT%H:%M:%S.%mZ"
         self._currentTime = now.strftime(timeFormat)
@@ -62,6 +200,8 @@ class ANTServerRestClient():
         self._restMapRequestPath = "http://"+self._hostUrl+"/wms/rest/maps/level/1/data"
 
         self._sessionTokenPath = "?&sessiontoken="
+        # dataselection criterion to select rows updated since a timestamp
+        self._changedSinceCriterion = "%s::date >=: %s"
 
     def checkConnection(self):
         ''' verify that connection is possible'''
@@ -83,12 +223,78 @@ class ANTServerRestClient():
         return False
 
 
+    # -----------------------------------
+    # statistics of the keep-alive connection pool
+    def getConnectionStats(self):
+        ''' return number of connections created and reused by the pool '''
+        stats = self._connectionPool.getStats()
+        stats["logins"] = self._sessionLogins
+        return stats
+
+    def close(self):
+        ''' close all idle pooled connections '''
+        self.disableStatistics()
+        self._connectionPool.close()
+
+
+    # -----------------------------------
+    # per endpoint statistics of the REST traffic; off by default (no overhead)
+    def enableStatistics(self, dumpInterval=None, dumpHandler=None):
+        ''' start collecting statistics; with dumpInterval, pass a snapshot to
+            dumpHandler (default: print as json) every dumpInterval seconds '''
+        self.disableStatistics()
+        self._statistics = RESTStatistics()
+        if dumpInterval:
+            if dumpHandler is None:
+                dumpHandler = lambda snapshot: print("REST statistics: %s" % json.dumps(snapshot))
+            stop = threading.Event()
+            def dump():
+                while not stop.wait(dumpInterval):
+                    dumpHandler(self.getStatistics())
+            self._statisticsDumper = stop
+            threading.Thread(target=dump, daemon=True).start()
+
+    def disableStatistics(self):
+        if self._statisticsDumper is not None:
+            self._statisticsDumper.set()
+            self._statisticsDumper = None
+        self._statistics = None
+
+    def getStatistics(self):
+        ''' snapshot of the statistics; None when disabled '''
+        statistics = self._statistics
+        return None if statistics is None else statistics.snapshot()
+
+
     # -----------------------------------
     # Method to call when starting a session with ANT server
+    # The token is cached and shared by all threads; a login is only done when
+    # there is no token yet, when it expired or when the server rejected it.
     def getSessionToken(self):
-        loginResp = self.executeRESTRequest(self._restLoginRequestPath, "GET")
-        jsonLogin = json.loads(loginResp)
-        self._sessionToken = str(jsonLogin["payload"]["sessiontoken"])
+        if self._sessionToken != "" and not self._isSessionExpired():
+            return self._sessionToken
+        return self.refreshSessionToken(self._sessionToken)
+
+    def refreshSessionToken(self, staleToken=None):
+        ''' login again unless another thread already replaced staleToken '''
+        with self._sessionLock:
+            if self._sessionToken != "" and self._sessionToken != staleToken and not self._isSessionExpired():
+                return self._sessionToken
+            loginResp = self.executeRESTRequest(self._restLoginRequestPath, "GET")
+            jsonLogin = json.loads(loginResp)
+            self._sessionToken = str(jsonLogin["payload"]["sessiontoken"])
+            self._sessionLogins += 1
+            if self._sessionTimeout:
+                self._sessionExpiry = time.monotonic() + self._sessionTimeout
+            return self._sessionToken
+
+    def invalidateSessionToken(self):
+        ''' force a login on the next call of getSessionToken '''
+        with self._sessionLock:
+            self._sessionToken = ""
+
+    def _isSessionExpired(self):
+        return self._sessionTimeout and time.monotonic() >= self._sessionExpiry
 
 
     def executeRESTRequest(self, requestPath, method, data=None):
@@ -97,15 +303,31 @@ class ANTServerRestClient():
         requestPath = requestPath.replace(" ", "%20")
 
         ''' send REST request and get response'''
-        timeout = 10 * 60 #seconds
         if self._debug:
             print(" REQ:", requestPath)
+        statistics = self._statistics
+        if statistics is not None:
+            start = time.perf_counter()
+        status, body = None, None
         try:
-            req = Request(requestPath, data=data)
-            if method is not None:
-                req.get_method = lambda: method
-
-            response = request.urlopen(req, data, timeout=timeout).read().decode('utf-8')
+            url = urlsplit(requestPath)
+            if method is None:
+                method = "GET" if data is None else "POST"
+            headers = { "Connection": "keep-alive" }
+            if data is not None:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            path = url.path + "?" + url.query if url.query else url.path
+            status, reason, respHeaders, body = self._connectionPool.request(method, path, data, headers)
+            staleToken = re.search("sessiontoken=([^&]*)", path)
+            if status in (401, 403) and staleToken is not None:
+                # session token rejected; login again (once for all threads) and retry
+                freshToken = self.refreshSessionToken(staleToken.group(1))
+                requestPath = requestPath.replace("sessiontoken=" + staleToken.group(1), "sessiontoken=" + freshToken)
+                path = path.replace("sessiontoken=" + staleToken.group(1), "sessiontoken=" + freshToken)
+                status, reason, respHeaders, body = self._connectionPool.request(method, path, data, headers)
+            if status >= 400:
+                raise HTTPError(requestPath, status, reason, respHeaders, None)
+            response = body.decode('utf-8')
             if self._debug:
                 print("RESP:", response)
             return response
@@ -114,6 +336,10 @@ class ANTServerRestClient():
             print("\tERROR: Unable to process request '%s': %s", requestPath, e)
             raise
 
+        finally:
+            if statistics is not None:
+                statistics.record(method, url.path, time.perf_counter() - start, len(data) if data else 0, len(body) if body else 0, status is None or status >= 400)
+
 
     # -----------------------------------
     # insert a vehicle at a specified node
@@ -193,16 +419,30 @@ class ANTServerRestClient():
 
     # -----------------------------------
     # Extract all vehicles from traffic
-    def executeExtractAllVehicleRESTRequest(self):
+    def executeExtractAllVehicleRESTRequest(self, maxParallel=None):
         ''' Execute REST request to extract all vehicles '''
         print("Extracting all vehicles : ")
         vehicleList = self.executeGetVehicleListRESTRequest()
+        for vehicle, (result, error) in zip(vehicleList, self.executeConcurrently(self.executeExtractVehicleRESTRequest, [ (vehicle["name"],) for vehicle in vehicleList ], maxParallel)):
+            if error is not None:
+                print("executeExtractAllVehicleRESTRequest: could not extract %s: %s" % (vehicle["name"], error))
+        return vehicleList
 
-        for vehicle in vehicleList:
-            vehicleName = vehicle["name"]
-            self.executeExtractVehicleRESTRequest(vehicleName)
 
-        return vehicleList
+    # -----------------------------------
+    # call function(*args) for every args of argsList, at most maxParallel
+    # (default: pool size) at a time; returns [ (result, exception), ... ] in argsList order
+    def executeConcurrently(self, function, argsList, maxParallel=None):
+        def call(args):
+            try:
+                return (function(*args), None)
+            except Exception as e:
+                return (None, e)
+
+        if maxParallel is None:
+            maxParallel = self._connectionPool.poolSize
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, maxParallel)) as executor:
+            return list(executor.map(call, argsList))
 
 
     # -----------------------------------
@@ -294,6 +534,49 @@ class ANTServerRestClient():
             print("executeCreateMissionRESTRequest: could not retrieve acceptedmissions + pendingmissions; exception: %s" % e)
             return None
 
+    # -----------------------------------
+    # Create many missions with as few round trips as possible.
+    # missions: list of dicts with the createMissionData arguments
+    #   (missionType, source, dest, payload, prio, sourceNodeType, destNodeType, ...)
+    # Identical missions are merged into one request using 'cardinality'; the
+    # remaining requests are posted in parallel over the connection pool.
+    # Returns per distinct mission: { "mission", "count", "acceptedmissions", "pendingmissions", "error" };
+    # a failed request sets "error" and does not stop the other groups.
+    def executeCreateMissionsBulkRESTRequest(self, missions, maxParallel=None):
+        def createGroup(group):
+            missionData = self._createGroupMissionData(group)
+            requestLink = self._restMissionRequestPath + self._sessionTokenPath + self._sessionToken
+            try:
+                jsonMissions = json.loads(self.executeRESTRequest(requestLink, "POST", missionData.encode('utf-8')))
+            except Exception as e:
+                group["error"] = str(e)
+                return group
+            try:
+                group["acceptedmissions"] = jsonMissions["payload"]["acceptedmissions"]
+                group["pendingmissions"] = jsonMissions["payload"]["pendingmissions"]
+            except Exception as e:
+                print("executeCreateMissionsBulkRESTRequest: could not retrieve acceptedmissions + pendingmissions; exception: %s" % e)
+            return group
+
+        if maxParallel is None:
+            maxParallel = self._connectionPool.poolSize
+        with concurrent.futures.ThreadPoolExecutor(max_workers=maxParallel) as executor:
+            return list(executor.map(createGroup, self._groupMissions(missions)))
+
+    def _groupMissions(self, missions):
+        groups = {}
+        for mission in missions:
+            key = json.dumps(mission, sort_keys=True)
+            if key in groups:
+                groups[key]["count"] += 1
+            else:
+                groups[key] = { "mission": mission, "count": 1, "acceptedmissions": [], "pendingmissions": [], "error": None }
+        return list(groups.values())
+
+    def _createGroupMissionData(self, group):
+        mission = dict(group["mission"])
+        return self.createMissionData(mission.pop("missionType"), mission.pop("source"), mission.pop("dest"), group["count"], mission.pop("payload"), **mission)
+
     # -----------------------------------
     # change the priority of a mission
     def executeChangeMissionPriorityRequest(self, missionid, prio ):
@@ -357,6 +640,77 @@ class ANTServerRestClient():
         return missionList
 
 
+    # -----------------------------------
+    # Walk a list resource window by window (datarange=[start,start+pageSize])
+    # and yield the items one by one, so nothing is truncated and only
+    # 'parallel' windows are held in memory. Items already yielded (by idFunc)
+    # are skipped, in case rows shift between windows.
+    def iterateRESTList(self, requestPath, listKey, pageSize=100, parallel=1, query="", idFunc=None):
+        pageSize = int(pageSize)
+
+        def getWindow(start):
+            requestLink = requestPath + self._sessionTokenPath + self._sessionToken
+            requestLink += "&datarange=%5B" + str(start) + "%2C" + str(start + pageSize) + "%5D" + query
+            return json.loads(self.executeRESTRequest(requestLink, "GET"))["payload"][listKey]
+
+        seenIds = set()
+        start = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            while True:
+                if parallel > 1:
+                    windows = [ executor.submit(getWindow, start + n * pageSize) for n in range(parallel) ]
+                else:
+                    windows = None
+                for n in range(max(1, parallel)):
+                    items = windows[n].result() if windows else getWindow(start)
+                    for item in items:
+                        if idFunc is not None:
+                            id = idFunc(item)
+                            if id in seenIds:
+                                continue
+                            seenIds.add(id)
+                        yield item
+                    if len(items) < pageSize:
+                        return
+                    start += pageSize
+
+    # -----------------------------------
+    # Iterate over all missions
+    def iterMissions(self, pageSize=100, parallel=1):
+        query = "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D"
+        return self.iterateRESTList(self._restMissionRequestPath, "missions", pageSize, parallel, query, lambda m: m["missionid"])
+
+    # -----------------------------------
+    # Iterate over all active missions
+    def iterActiveMissions(self, pageSize=100, parallel=1):
+        query = "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D"
+        query += "&dataselection=%7B%22criteria%22%3A%5B%22navigationstate%3A%3Aint IN%3A 3%7C0%7C1%22%5D%2C%22composition%22%3A%22AND%22%7D"
+        return self.iterateRESTList(self._restMissionRequestPath, "missions", pageSize, parallel, query, lambda m: m["missionid"])
+
+    # -----------------------------------
+    # Iterate over all devices
+    def iterDevices(self, pageSize=100, parallel=1):
+        return self.iterateRESTList(self._restDeviceRequestPath, "devices", pageSize, parallel, "", lambda d: d["meta"]["deviceid"])
+
+
+    # -----------------------------------
+    # dataselection query for rows whose timestamp field is at or after 'since'
+    def changedSinceQuery(self, field, since):
+        selection = { "criteria": [ self._changedSinceCriterion % (field, since) ], "composition": "AND" }
+        return "&dataselection=" + quote(json.dumps(selection, separators=(',', ':')))
+
+    # -----------------------------------
+    # Iterate over all missions (active or not) changed since a timestamp
+    def iterChangedMissions(self, since, pageSize=100, parallel=1, field="timestamp"):
+        query = "&dataorderby=%5B%5B%22createdat%22%2C%22desc%22%5D%5D" + self.changedSinceQuery(field, since)
+        return self.iterateRESTList(self._restMissionRequestPath, "missions", pageSize, parallel, query, lambda m: m["missionid"])
+
+    # -----------------------------------
+    # Iterate over all devices changed since a timestamp
+    def iterChangedDevices(self, since, pageSize=100, parallel=1, field="meta.state.timestamp"):
+        return self.iterateRESTList(self._restDeviceRequestPath, "devices", pageSize, parallel, self.changedSinceQuery(field, since), lambda d: d["meta"]["deviceid"])
+
+
     # -----------------------------------
     # Cancel a specific mission
     def executeCancelMissionRESTRequest(self, missionID):
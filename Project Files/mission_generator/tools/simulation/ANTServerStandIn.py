@@ -0,0 +1,665 @@
+#!/usr/bin/python3
+# Local stand-in for the ANT server REST API; used for load tests and benchmarks
+# when no live ANT server is available.
+
+import sys
+sys.path.append("../libraries/common/")
+
+import json
+import re
+import time
+import datetime
+import random
+import itertools
+import heapq
+import collections
+import threading
+import argparse
+import logging
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import common
+import Clock
+import Layout
+from common import getValueFromDict
+
+log = logging.getLogger("ANTServerStandIn")
+
+
+# request handler; every request is passed to ANTServerStandIn.handleRequest
+class ANTServerStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately; avoid the nagle / delayed ack stall
+    disable_nagle_algorithm = True
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length > 0 else None
+        status, response = self.server.standIn.handleRequest(method, self.path, body)
+        data = json.dumps(response, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+class ANTServerStandIn():
+    '''
+    In-memory stand-in for the ANT server.
+    Implements the endpoints used by ANTServerRestClient with configurable
+    latency and failure injection. Run it in the background with start()/stop()
+    or as a context manager.
+    With missionProgress the created missions go through their states on the
+    clock (which may be a Clock.VirtualClock): accepted after acceptTime, then
+    assigned to the nearest free inserted vehicle (missions wait in order of
+    creation when there is none; without vehicles there is no limit). The
+    vehicle drives the shortest route on the map (mapData in the layout of
+    getMap(); default a grid of the stations, spacing apart) at its speed in
+    map units per second, loads and unloads in handlingTime each. Missions
+    that cannot be driven on the map stay accepted with schedulerstate 2.
+    '''
+    _deviceTypes = [ "i/o", "digitaldetector", "presence-detector", "arrival-selector", "smart-departure", "fire-detector", "parking", "charger" ]
+
+    def __init__(self, host="127.0.0.1", port=0, username="admin", password="123456",
+                 nMissions=0, nDevices=0, nVehicles=0, stations=None,
+                 latency=0.0, latencyJitter=0.0, failureRate=0.0, failureEndpoints=None,
+                 sessionTimeout=None, seed=None,
+                 clock=None, missionProgress=False, acceptTime=1.0, speed=1.0, handlingTime=10.0,
+                 mapData=None, spacing=20.0):
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password
+        self._latency = latency
+        self._latencyJitter = latencyJitter
+        self._failureRate = failureRate
+        self._failureEndpoints = failureEndpoints
+        self._sessionTimeout = sessionTimeout
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._clock = Clock.Real if clock is None else clock
+        self._missionProgress = missionProgress
+        self._acceptTime = acceptTime
+        self._speed = speed
+        self._handlingTime = handlingTime
+        self._mapData = mapData
+        self._spacing = spacing
+        self._layout = None
+        self._vehicleSpeeds = {}
+        self._trips = {}
+        self._progress = []
+        self._progressSequence = itertools.count()
+        self._waiting = collections.deque()
+        self._busyVehicles = {}
+        self._server = None
+        self._thread = None
+
+        self._sessions = {}
+        self._missions = {}
+        self._devices = {}
+        self._vehicles = {}
+        self._areas = {}
+        self._alarms = {}
+        self._paused = False
+        self._nextMissionId = 1
+        self._nextSessionId = 1
+        self._requests = {}
+        self._failures = 0
+
+        if stations is None:
+            stations = [ "S%03d" % n for n in range(1, 21) ]
+        self._stations = stations
+        self._generateData(nMissions, nDevices, nVehicles)
+
+    @classmethod
+    def fromConfiguration(cls, Configuration, **kwargs):
+        ''' stand-in with the stations used by the triggers and backlog of a simulation
+            config, and its vehicles at their initial positions '''
+        stations = set()
+        for trigger in getValueFromDict(Configuration, "Triggers", []) + getValueFromDict(Configuration, "Backlog", []):
+            if "mission" in trigger:
+                stations.update(trigger["mission"]["from"] + trigger["mission"]["to"])
+        # the vehicles start on the map too
+        stations.update( vehicle["location"] for vehicle in getValueFromDict(Configuration, "Initial positions", []) if vehicle["location"] != "extracted" )
+        standIn = cls(stations=sorted(stations) or None, **kwargs)
+        for vehicle in getValueFromDict(Configuration, "Initial positions", []):
+            standIn.addVehicle(vehicle["id"], None if vehicle["location"] == "extracted" else vehicle["location"])
+        return standIn
+
+    # -----------------------------------
+    # start serving in a background thread; returns the port
+    def start(self):
+        self._server = ThreadingHTTPServer((self._host, self._port), ANTServerStandInHandler)
+        self._server.daemon_threads = True
+        self._server.standIn = self
+        self._port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        log.info("ANT server stand-in listening on %s:%d" % (self._host, self._port))
+        return self._port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def getPort(self):
+        return self._port
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def getStatistics(self):
+        with self._lock:
+            navigationStates = collections.Counter( mission["navigationstate"] for mission in self._missions.values() )
+            return { "requests": dict(self._requests), "failures": self._failures,
+                     "missions": len(self._missions), "devices": len(self._devices), "vehicles": len(self._vehicles),
+                     "missions per navigationstate": { str(state): count for state, count in sorted(navigationStates.items()) } }
+
+    def getMissions(self):
+        ''' copies of all mission records, in order of creation '''
+        with self._lock:
+            return [ dict(mission) for mission in self._missions.values() ]
+
+    def getBacklog(self):
+        ''' (active missions, active missions not assigned to a vehicle yet) '''
+        with self._lock:
+            active = [ mission for mission in self._missions.values() if mission["navigationstate"] in (0, 1, 3) ]
+            return len(active), sum( 1 for mission in active if mission["schedulerstate"] == 1 )
+
+    # -----------------------------------
+    # time stamps in the ANT format
+    def now(self):
+        return self._clock.time()
+
+    def timestamp(self, t=None):
+        if t is None:
+            t = self.now()
+        return datetime.datetime.fromtimestamp(t, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    # -----------------------------------
+    # synthetic data
+    def _generateData(self, nMissions, nDevices, nVehicles):
+        for n in range(nVehicles):
+            self.addVehicle("V%d" % (n + 1), self._stations[n % len(self._stations)])
+        for n in range(nDevices):
+            deviceType = ANTServerStandIn._deviceTypes[n % len(ANTServerStandIn._deviceTypes)]
+            station = self._stations[n % len(self._stations)]
+            self.addDevice("%s_%s_%d" % (station, deviceType.replace("/", ""), n), deviceType, station)
+        for n in range(nMissions):
+            missionIds = self.createMissions({ "missiontype": "9", "fromnode": self._random.choice(self._stations),
+                                               "tonode": self._random.choice(self._stations), "cardinality": 1, "priority": 2,
+                                               "parameters": { "value": { "payload": "Default Payload" } } })
+            mission = self._missions[missionIds[0]]
+            mission["navigationstate"] = self._random.choice([0, 1, 3, 4])
+            mission["transportstate"] = { 0: 0, 1: 1, 3: 4, 4: 8 }[mission["navigationstate"]]
+        for n, station in enumerate(self._stations):
+            self._areas[n + 1] = { "areaid": n + 1, "alias": "Area %s" % station, "alternativeareas": [], "nodes": [ station ],
+                                   "state": "Open", "timestamp": self.timestamp() }
+
+    def addVehicle(self, name, node=None, speed=None):
+        ''' speed: of this vehicle in map units per second (default the speed of the stand-in) '''
+        with self._lock:
+            if speed is not None:
+                self._vehicleSpeeds[name] = speed
+            self._vehicles[name] = { "name": name, "isloaded": False, "payload": "", "operatingstate": 0 if node is None else 1,
+                                     "action": "", "location": { "coord": self._coord(node), "currentnode": { "name": node } },
+                                     "state": { "vehicle.state": [ "parking", "false" ], "battery.info": [ "100", "0.0" ],
+                                                "traffic.info": [ "Free", "", "Inserted" if node else "Extracted" ],
+                                                "mission.info": [ "", "", "" ], "errors": [] },
+                                     "timestamp": self.timestamp() }
+            return self._vehicles[name]
+
+    def addDevice(self, deviceId, deviceType, station, state=None):
+        with self._lock:
+            if state is None:
+                state = { "value": 0 } if deviceType == "i/o" else { "presencedetected": False, "label": "No presence" }
+            self._devices[deviceId] = { "node": station, "enabled": True, "group": station, "type": deviceType, "class": "device",
+                                        "meta": { "deviceid": deviceId, "devicetype": deviceType, "driverid": "standin", "hardwareid": deviceId,
+                                                  "state": { "isconnected": True, "state": state, "timestamp": self.timestamp() } },
+                                        "location": { "coord": [ 0.0, 0.0, 0.0 ], "course": 0, "currentnode": { "name": station, "id": 0 },
+                                                      "map": "1", "group": station } }
+            return self._devices[deviceId]
+
+    # -----------------------------------
+    # missions
+    def createMissions(self, missionRequest):
+        with self._lock:
+            missionIds = []
+            t = self.now()
+            parameters = getValueFromDict(missionRequest, "parameters", {})
+            for n in range(int(getValueFromDict(missionRequest, "cardinality", 1))):
+                missionId = str(self._nextMissionId)
+                self._nextMissionId += 1
+                self._missions[missionId] = { "missionid": missionId,
+                                              "missiontype": int(getValueFromDict(missionRequest, "missiontype", 9)),
+                                              "fromnode": getValueFromDict(missionRequest, "fromnode"),
+                                              "tonode": getValueFromDict(missionRequest, "tonode"),
+                                              "payload": getValueFromDict(getValueFromDict(parameters, "value", {}), "payload", ""),
+                                              "priority": getValueFromDict(missionRequest, "priority", 2),
+                                              "deadline": getValueFromDict(missionRequest, "deadline"),
+                                              "dispatchtime": getValueFromDict(missionRequest, "dispatchtime"),
+                                              "parameters": parameters,
+                                              "isloaded": False, "assignedto": "", "groupid": 0, "missionrule": {}, "istoday": True,
+                                              "state": 0, "navigationstate": 0, "transportstate": 0, "schedulerstate": 1, "stateinfo": 0,
+                                              "askedforcancellation": False,
+                                              "createdat": self.timestamp(t), "timestamp": self.timestamp(t) }
+                missionIds.append(missionId)
+                if self._missionProgress:
+                    self._scheduleProgress(self._clock.now() + self._acceptTime, missionId, "accept")
+            return missionIds
+
+    def updateMission(self, mission, at=None, **fields):
+        ''' at: clock time of the change (default now) '''
+        mission.update(fields)
+        mission["timestamp"] = self.timestamp(None if at is None else self._clock.toTime(at))
+
+    def cancelMission(self, mission):
+        if mission["navigationstate"] in (0, 1, 3):
+            self.updateMission(mission, navigationstate=5, transportstate=9, state=6, askedforcancellation=True)
+            # the vehicle stops at the node where it started its current drive
+            trip = self._trips.pop(mission["missionid"], None)
+            if trip is not None and trip[0] in self._vehicles:
+                self._vehicles[trip[0]]["location"]["coord"] = self._coord(self._vehicles[trip[0]]["location"]["currentnode"]["name"])
+            self._releaseVehicle(mission)
+
+    # -----------------------------------
+    # mission progress model
+    def _scheduleProgress(self, at, missionId, step):
+        heapq.heappush(self._progress, (at, next(self._progressSequence), missionId, step))
+
+    def getLayout(self):
+        ''' the Layout the vehicles drive on '''
+        if self._layout is None:
+            self._layout = Layout.Layout(self.getMapData())
+        return self._layout
+
+    def _coord(self, node):
+        coord = self.getLayout().coord(node)
+        return [ 0.0, 0.0 ] if coord is None else list(coord)
+
+    def _driveTime(self, vehicle, fr, to):
+        distance = self.getLayout().distance(fr, to)
+        return None if distance is None else distance / self._vehicleSpeeds.get(vehicle, self._speed)
+
+    def _drive(self, vehicle, mission, fr, to, at, step, after=0.0):
+        ''' drive from node fr to node to, starting at clock time at; step is due when
+            arrived and (un)loaded. after: time from then to the mission destination '''
+        route = self.getLayout().route(fr, to)
+        speed = self._vehicleSpeeds.get(vehicle, self._speed)
+        arrival = at + route.length / speed + self._handlingTime
+        self._trips[mission["missionid"]] = (vehicle, route, at, speed, after)
+        self._scheduleProgress(arrival, mission["missionid"], step)
+        return arrival - at + after
+
+    def refreshTrips(self):
+        ''' position of the driving vehicles and time to destination of their missions at the current clock time '''
+        with self._lock:
+            now = self._clock.now()
+            for missionId, (vehicle, route, start, speed, after) in self._trips.items():
+                travelled = (now - start) * speed
+                if vehicle in self._vehicles:
+                    self._vehicles[vehicle]["location"]["coord"] = list(route.position(travelled))
+                remaining = max(0.0, route.length / speed + self._handlingTime - (now - start)) + after
+                self._missions[missionId]["timetodestination"] = int(remaining)
+
+    def advance(self):
+        ''' apply the mission progress that is due at the current clock time '''
+        with self._lock:
+            now = self._clock.now()
+            while self._progress and self._progress[0][0] <= now:
+                at, n, missionId, step = heapq.heappop(self._progress)
+                mission = self._missions.get(missionId)
+                if mission is None or mission["navigationstate"] in (2, 4, 5):
+                    continue
+                self._progressMission(mission, step, at)
+
+    def _progressMission(self, mission, step, at):
+        vehicle = self._vehicles.get(mission["assignedto"])
+        if step == "accept":
+            self.updateMission(mission, at, navigationstate=1, transportstate=1, state=2)
+            self._waiting.append(mission["missionid"])
+            self._assignMissions(at)
+        elif step == "pickup":
+            if vehicle is not None:
+                vehicle["location"]["currentnode"]["name"] = mission["fromnode"]
+                vehicle["location"]["coord"] = self._coord(mission["fromnode"])
+                vehicle["isloaded"] = True
+                vehicle["timestamp"] = self.timestamp(self._clock.toTime(at))
+            timeToDestination = self._drive(mission["assignedto"], mission, mission["fromnode"], mission["tonode"], at, "deliver")
+            self.updateMission(mission, at, transportstate=7, isloaded=True, timetodestination=int(timeToDestination))
+        elif step == "deliver":
+            self._trips.pop(mission["missionid"], None)
+            if vehicle is not None:
+                vehicle["location"]["currentnode"]["name"] = mission["tonode"]
+                vehicle["location"]["coord"] = self._coord(mission["tonode"])
+                vehicle["isloaded"] = False
+                vehicle["timestamp"] = self.timestamp(self._clock.toTime(at))
+            self.updateMission(mission, at, navigationstate=4, transportstate=8, isloaded=False, timetodestination=0)
+            self._releaseVehicle(mission, at)
+
+    def _freeVehicles(self):
+        return [ name for name, vehicle in self._vehicles.items() if vehicle["operatingstate"] == 1 and name not in self._busyVehicles ]
+
+    def _assignMissions(self, at):
+        ''' assign the waiting missions to the nearest free vehicles (all of them when there are no vehicles) '''
+        while self._waiting:
+            mission = self._missions.get(self._waiting[0])
+            if mission is None or mission["navigationstate"] != 1:
+                self._waiting.popleft()
+                continue
+            delivery = self._driveTime("", mission["fromnode"], mission["tonode"])
+            vehicle = ""
+            if self._vehicles and delivery is not None:
+                free = self._freeVehicles()
+                if not free:
+                    return
+                reachable = [ (driveTime, name) for driveTime, name in
+                              ( (self._driveTime(name, self._vehicles[name]["location"]["currentnode"]["name"], mission["fromnode"]), name) for name in free )
+                              if driveTime is not None ]
+                if reachable:
+                    vehicle = min(reachable)[1]
+                    self._busyVehicles[vehicle] = mission["missionid"]
+                    delivery = self._driveTime(vehicle, mission["fromnode"], mission["tonode"])
+                else:
+                    delivery = None
+            self._waiting.popleft()
+            if delivery is None:
+                # no vehicle can drive the mission
+                self.updateMission(mission, at, schedulerstate=2)
+                continue
+            fr = self._vehicles[vehicle]["location"]["currentnode"]["name"] if vehicle else mission["fromnode"]
+            timeToDestination = self._drive(vehicle, mission, fr, mission["fromnode"], at, "pickup", self._handlingTime + delivery)
+            self.updateMission(mission, at, navigationstate=3, transportstate=4, schedulerstate=0, assignedto=vehicle,
+                               timetodestination=int(timeToDestination))
+
+    def _releaseVehicle(self, mission, at=None):
+        vehicle = mission.get("assignedto")
+        if vehicle and self._busyVehicles.get(vehicle) == mission["missionid"]:
+            del self._busyVehicles[vehicle]
+            self._assignMissions(self._clock.now() if at is None else at)
+
+    # -----------------------------------
+    # parse 'field::type OPERATOR: value' criteria of a dataselection
+    @staticmethod
+    def _parseCriterion(criterion):
+        match = re.match(r"\s*([\w.]+)(?:::(\w+))?\s*(IN|>=|<=|>|<|=)\s*:\s*(.*)$", criterion)
+        if match is None:
+            return None
+        field, fieldType, operator, value = match.groups()
+        if operator == "IN":
+            values = value.split("|")
+            if fieldType == "int":
+                values = [ int(v) for v in values ]
+            return (field, operator, set(values))
+        if fieldType == "int":
+            value = int(value)
+        return (field, operator, value.strip())
+
+    @staticmethod
+    def _getField(item, field):
+        for key in field.split("."):
+            if not isinstance(item, dict) or key not in item:
+                return None
+            item = item[key]
+        return item
+
+    @staticmethod
+    def _match(item, criteria):
+        for (field, operator, value) in criteria:
+            v = ANTServerStandIn._getField(item, field)
+            if v is None:
+                return False
+            if operator == "IN" and v not in value: return False
+            if operator == ">=" and not v >= value: return False
+            if operator == "<=" and not v <= value: return False
+            if operator == ">" and not v > value: return False
+            if operator == "<" and not v < value: return False
+            if operator == "=" and not v == value: return False
+        return True
+
+    def _selectList(self, items, query, reverse=False):
+        ''' apply dataselection, dataorderby and datarange query arguments to items;
+            items are in creation order, so 'createdat desc' is served lazily by walking them backwards '''
+        criteria = []
+        if "dataselection" in query:
+            selection = json.loads(query["dataselection"][0])
+            criteria = [ c for c in map(ANTServerStandIn._parseCriterion, selection.get("criteria", [])) if c is not None ]
+        orderBy = json.loads(query["dataorderby"][0]) if "dataorderby" in query else []
+        if reverse and orderBy == [ [ "createdat", "desc" ] ]:
+            items, orderBy = reversed(items), []
+        items = ( item for item in items if ANTServerStandIn._match(item, criteria) )
+        if orderBy:
+            items = list(items)
+            for (field, order) in reversed(orderBy):
+                items.sort(key=lambda item: ANTServerStandIn._getField(item, field) or "", reverse=(order == "desc"))
+        if "datarange" in query:
+            start, end = json.loads(query["datarange"][0])
+            return list(itertools.islice(items, start, end))
+        return list(items)
+
+    # -----------------------------------
+    # dispatch one request; returns (http status, json response)
+    def handleRequest(self, method, requestPath, body):
+        url = urlsplit(requestPath)
+        query = parse_qs(url.query)
+        path = url.path.rstrip("/")
+        endpoint = re.sub(r"/(missions|devices|vehicles|areas|alarms|missioncommands)/[^/]+", r"/\1/{id}", path)
+        with self._lock:
+            key = method + " " + endpoint
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+        if self._latency or self._latencyJitter:
+            time.sleep(self._latency + self._latencyJitter * self._random.random())
+        if self._failureRate and ( self._failureEndpoints is None or any(e in path for e in self._failureEndpoints) ):
+            if self._random.random() < self._failureRate:
+                with self._lock:
+                    self._failures += 1
+                return 500, { "retcode": -1, "payload": {} }
+
+        try:
+            if path == "/wms/monitor/session/login":
+                return self._login(query)
+            if not self._isValidSession(getValueFromDict(query, "sessiontoken", [""])[0]):
+                return 401, { "retcode": 1, "payload": { "error": "invalid session token" } }
+            data = json.loads(body) if body else {}
+            with self._lock:
+                self.advance()
+                if method == "GET" and self._trips:
+                    self.refreshTrips()
+                payload = self._handleRestRequest(method, [ unquote(p) for p in path.split("/")[3:] ], query, data)
+            if payload is None:
+                return 404, { "retcode": 2, "payload": {} }
+            return 200, { "retcode": 0, "payload": payload }
+        except Exception as e:
+            log.warning("stand-in could not handle %s %s: %s" % (method, requestPath, e))
+            return 400, { "retcode": 3, "payload": { "error": str(e) } }
+
+    def _login(self, query):
+        if getValueFromDict(query, "username", [""])[0] != self._username or getValueFromDict(query, "pwd", [""])[0] != self._password:
+            return 401, { "retcode": 1, "payload": {} }
+        with self._lock:
+            token = "standin-%d" % self._nextSessionId
+            self._nextSessionId += 1
+            self._sessions[token] = time.monotonic()
+        return 200, { "retcode": 0, "payload": { "sessiontoken": token } }
+
+    def _isValidSession(self, token):
+        with self._lock:
+            if token not in self._sessions:
+                return False
+            if self._sessionTimeout and time.monotonic() - self._sessions[token] > self._sessionTimeout:
+                del self._sessions[token]
+                return False
+            return True
+
+    def invalidateSessions(self):
+        ''' drop all session tokens; clients have to login again '''
+        with self._lock:
+            self._sessions = {}
+
+    def _handleRestRequest(self, method, resource, query, data):
+        name = resource[0] if len(resource) > 0 else ""
+        id = resource[1] if len(resource) > 1 else None
+
+        if name == "missions":
+            if id is None:
+                if method == "GET":
+                    return { "missions": self._selectList(self._missions.values(), query, reverse=True) }
+                if method == "POST":
+                    return { "acceptedmissions": self.createMissions(data["missionrequest"]), "pendingmissions": [] }
+                if method == "DELETE":
+                    for mission in self._missions.values():
+                        self.cancelMission(mission)
+                    return {}
+            if id not in self._missions:
+                return None
+            if method == "DELETE":
+                self.cancelMission(self._missions[id])
+            return { "missions": [ self._missions[id] ] }
+
+        if name == "missioncommands" and id in self._missions:
+            command = data["command"]
+            if command["name"] == "setPriority":
+                self.updateMission(self._missions[id], priority=int(command["args"]["priority"]))
+            return { "missions": [ self._missions[id] ] }
+
+        if name == "devices":
+            if id is None:
+                return { "devices": self._selectList(self._devices.values(), query) }
+            if id not in self._devices:
+                return None
+            device = self._devices[id]
+            if method == "POST" and data["command"]["name"] == "write":
+                value = data["command"]["args"]["value"]
+                device["meta"]["state"]["state"] = { "value": 1 if value in ("1", "True", "true") else 0 }
+                device["meta"]["state"]["timestamp"] = self.timestamp()
+            return { "devices": [ device ] }
+
+        if name == "vehicles":
+            if id is None:
+                return { "vehicles": list(self._vehicles.values()) }
+            if id not in self._vehicles:
+                return None
+            vehicle = self._vehicles[id]
+            if method == "POST":
+                self._vehicleCommand(vehicle, data["command"])
+            return { "vehicle": [ vehicle ] }
+
+        if name == "areas":
+            if id is None:
+                return { "areas": list(self._areas.values()) }
+            area = self._areas.get(int(id)) if id.isdigit() else next((a for a in self._areas.values() if a["alias"] == id), None)
+            if area is None:
+                return None
+            if method == "POST" and data["command"]["name"] == "open":
+                area["state"] = "Open" if data["command"]["args"]["open"] == "true" else "Closed"
+                area["timestamp"] = self.timestamp()
+            return { "areas": [ area ] }
+
+        if name == "alarms":
+            if id is None:
+                return { "alarms": list(self._alarms.values()) }
+            if method == "DELETE":
+                self._alarms.pop(id, None)
+            return {}
+
+        if name == "groups":
+            return { "groups": [ { "name": station, "nodes": [ station ] } for station in self._stations ] }
+
+        if name == "maps":
+            return { "data": [ self.getMapData() ] }
+
+        if name == "application":
+            if id == "navigationsettings":
+                for command in data.get("commands", []):
+                    if command["name"] == "pauseANTServer":
+                        self._paused = command["args"]["pause"] == "true"
+                return { "paused": self._paused }
+            return { "application": { "name": "ANT server stand-in", "version": "1.0", "configuration": "", "ASversion": "", "ALversion": "",
+                                      "application": { "name": "stand-in", "version": "1.0" } } }
+
+        if name == "server":
+            return { "name": "ANT server stand-in", "paused": self._paused }
+
+        return None
+
+    def _vehicleCommand(self, vehicle, command):
+        if command["name"] == "insert":
+            vehicle["operatingstate"] = 1
+            vehicle["location"]["currentnode"]["name"] = command["args"]["nodeId"]
+            vehicle["location"]["coord"] = self._coord(command["args"]["nodeId"])
+            vehicle["state"]["traffic.info"][2] = "Inserted"
+            self._assignMissions(self._clock.now())
+        elif command["name"] == "extract":
+            vehicle["operatingstate"] = 0
+            vehicle["location"]["currentnode"]["name"] = None
+            vehicle["state"]["traffic.info"][2] = "Extracted"
+        vehicle["timestamp"] = self.timestamp()
+
+    def getMapData(self):
+        ''' map data in the layout of getMap(): the mapData of the stand-in, or the stations on a grid '''
+        if self._mapData is not None:
+            return self._mapData
+        return Layout.gridMap(self._stations, self._spacing)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='Listen address', default='127.0.0.1')
+    parser.add_argument('--port', help='Listen port', type=int, default=8081)
+    parser.add_argument('--missions', help='Number of synthetic missions', type=int, default=0)
+    parser.add_argument('--devices', help='Number of synthetic devices', type=int, default=0)
+    parser.add_argument('--vehicles', help='Number of synthetic vehicles', type=int, default=0)
+    parser.add_argument('--latency', help='Latency per request in seconds', type=float, default=0.0)
+    parser.add_argument('--jitter', help='Random extra latency per request in seconds', type=float, default=0.0)
+    parser.add_argument('--failure_rate', help='Fraction of requests answered with an error', type=float, default=0.0)
+    parser.add_argument('--config', help='Simulation config; vehicles are taken from Initial positions', default=None)
+    parser.add_argument('--seed', help='Random seed', type=int, default=None)
+    parser.add_argument('--progress', help="Let the created missions progress: accepted, assigned, loaded, delivered", action='store_true')
+    parser.add_argument('--speed', help='Speed of the vehicles in map units per second (with --progress)', type=float, default=1.0)
+    parser.add_argument('--handling_time', help='Time to load and to unload in seconds (with --progress)', type=float, default=10.0)
+    parser.add_argument('--map', help='Map (getMap() output) in json file; default a grid of the stations', default=None)
+    parser.add_argument('--info', help="Show info", action='store_true')
+    parser.add_argument('--debug', help="Show debug", action='store_true')
+    args = parser.parse_args()
+
+    common.setLogLevel( args.debug, args.info )
+
+    standInArgs = { "host": args.host, "port": args.port, "nMissions": args.missions, "nDevices": args.devices, "nVehicles": args.vehicles,
+                    "latency": args.latency, "latencyJitter": args.jitter, "failureRate": args.failure_rate, "seed": args.seed,
+                    "missionProgress": args.progress, "speed": args.speed, "handlingTime": args.handling_time,
+                    "mapData": None if args.map is None else common.readConfigFile(args.map) }
+    if args.config is not None:
+        standIn = ANTServerStandIn.fromConfiguration(common.readConfigFile(args.config), **standInArgs)
+    else:
+        standIn = ANTServerStandIn(**standInArgs)
+    standIn.start()
+    print("ANT server stand-in listening on %s:%d" % (args.host, standIn.getPort()))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        standIn.stop()
+        print(json.dumps(standIn.getStatistics(), indent=4))
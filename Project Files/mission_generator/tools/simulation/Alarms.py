@@ -78,7 +78,7 @@ def monitorAlarms(restClient, interval, maxAlarms, event_handler):
     while True:
         try:
             restClient.getSessionToken()
-            handledAlarmIds = []
+            handledAlarmIds = set()
             for sourceType in Alarm._sourceType:
                 for alarmData in restClient.getAlarms("station"):
                     alarm = Alarm(alarmData)
@@ -91,16 +91,11 @@ def monitorAlarms(restClient, interval, maxAlarms, event_handler):
                     else:
                         Alarms[id] = alarm
                         callEventHandlers("new", Alarms[id], None, event_handler);
-                    handledAlarmIds.append(id)
-
-                deleteAlarmIds = []
-                for id in Alarms:
-                    if id not in handledAlarmIds:
-                        callEventHandlers("deleted", Alarms[id], None, event_handler);
-                        deleteAlarmIds.append(id)
-                # now realy remove the area.
-                for id in deleteAlarmIds:
-                        del Alarms[id]
+                    handledAlarmIds.add(id)
+
+                for id in Alarms.keys() - handledAlarmIds:
+                    callEventHandlers("deleted", Alarms[id], None, event_handler);
+                    del Alarms[id]
         except Exception as e: 
             print("monitorAlarms: exception :", e)
         if interval == 0:
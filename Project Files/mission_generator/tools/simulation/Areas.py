@@ -70,8 +70,8 @@ def monitorAreas(restClient, interval, maxAreas, event_handler):
     while True:
         try:
             restClient.getSessionToken()
-            handledAreaIds = []
-            for areaData in restClient.executeGetAreaListRESTRequest(args.max):
+            handledAreaIds = set()
+            for areaData in restClient.executeGetAreaListRESTRequest(maxAreas):
                 id = areaData["areaid"]
                 if id in Areas.keys():
                     if Areas[id].isChanged(areaData):
@@ -81,19 +81,17 @@ def monitorAreas(restClient, interval, maxAreas, event_handler):
                 else:
                     Areas[id] = Area(areaData)
                     callEventHandlers("new", Areas[id], None, event_handler);
-                handledAreaIds.append(id)
-
-            deleteAreaIds = []
-            for id in Areas:
-                if id not in handledAreaIds:
-                    callEventHandlers("deleted", Areas[id], None, event_handler);
-                    deleteAreaIds.append(id)
-            # now realy remove the area.
-            for id in deleteAreaIds:
-                    del Areas[id]
+                handledAreaIds.add(id)
+
+            for id in Areas.keys() - handledAreaIds:
+                callEventHandlers("deleted", Areas[id], None, event_handler);
+                del Areas[id]
         except Exception as e: 
             print("monitorAreas: exception :", e)
-        time.sleep(interval)
+        if interval == 0:
+            return
+        else:
+            time.sleep(interval)
 
 def getArea(id):
     if id in Areas.keys():
@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+# Throughput and latency benchmark of ANTServerRestClient against the local ANT server stand-in.
+# Results are written as json, so runs can be compared (--compare) to catch regressions.
+
+import sys
+sys.path.append("../libraries/common/")
+
+import json
+import time
+import platform
+import datetime
+import argparse
+import asyncio
+import threading
+import multiprocessing
+import common
+from ANTServerRESTClient import ANTServerRestClient
+from AsyncANTServerRESTClient import AsyncANTServerRestClient
+from ANTServerStandIn import ANTServerStandIn
+
+BenchmarkIO = "S001_io_0"
+
+# operation name -> function(restClient); the same calls work for the sync and the async client
+Operations = {
+    "mission create": lambda c: c.executeCreateMissionRESTRequest(c.createMissionData("transport from station to station", "S001", "S002", 1, "Default Payload")),
+    "active missions 100": lambda c: c.executeGetActiveMissionListRESTRequest(100),
+    "active missions 1k": lambda c: c.executeGetActiveMissionListRESTRequest(1000),
+    "active missions 10k": lambda c: c.executeGetActiveMissionListRESTRequest(10000),
+    "device list": lambda c: c.executeGetDeviceListRESTRequest(1000),
+    "io write": lambda c: c.executeSetIOValueRESTRequest(BenchmarkIO, 1),
+    "vehicle info": lambda c: c.getVehiclesInfo(),
+}
+Modes = [ "single", "threads", "async" ]
+
+
+# -----------------------------------
+# the stand-in runs in its own process, so the measured cpu time is the client's only
+def _serveStandIn(connection, standInArgs):
+    standIn = ANTServerStandIn(**standInArgs)
+    connection.send(standIn.start())
+    connection.recv()
+    standIn.stop()
+
+def startStandIn(standInArgs):
+    parentConnection, childConnection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serveStandIn, args=(childConnection, standInArgs), daemon=True)
+    process.start()
+    port = parentConnection.recv()
+    return process, parentConnection, port
+
+def stopStandIn(process, connection):
+    connection.send("stop")
+    process.join()
+
+
+# -----------------------------------
+def percentile(sortedValues, p):
+    if len(sortedValues) == 0:
+        return None
+    return sortedValues[min(len(sortedValues) - 1, int(p / 100.0 * len(sortedValues)))]
+
+def summarize(operation, mode, concurrency, latencies, errors, wall, cpu):
+    latencies.sort()
+    requests = len(latencies) + errors
+    return { "operation": operation, "mode": mode, "concurrency": concurrency,
+             "requests": requests, "errors": errors, "wall": wall,
+             "rps": requests / wall if wall > 0 else None,
+             "mean": sum(latencies) / len(latencies) if latencies else None,
+             "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+             "cpu_per_request": cpu / requests if requests else None }
+
+
+# -----------------------------------
+# run 'requests' calls of operation with 'concurrency' threads sharing one client
+def runThreads(restClient, operation, requests, concurrency):
+    latencies = []
+    errors = [ 0 ]
+    lock = threading.Lock()
+    function = Operations[operation]
+
+    def worker(n):
+        local = []
+        for i in range(n):
+            start = time.perf_counter()
+            try:
+                function(restClient)
+                local.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [ threading.Thread(target=worker, args=(requests // concurrency + (1 if i < requests % concurrency else 0),)) for i in range(concurrency) ]
+    wall, cpu = time.perf_counter(), time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - wall, time.process_time() - cpu
+
+
+# -----------------------------------
+# run 'requests' calls of operation with 'concurrency' tasks on one event loop
+async def runAsync(restClient, operation, requests, concurrency):
+    latencies = []
+    errors = 0
+    function = Operations[operation]
+
+    async def worker(n):
+        nonlocal errors
+        for i in range(n):
+            start = time.perf_counter()
+            try:
+                await function(restClient)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    await asyncio.gather(*[ worker(requests // concurrency + (1 if i < requests % concurrency else 0)) for i in range(concurrency) ])
+    return latencies, errors, time.perf_counter() - wall, time.process_time() - cpu
+
+
+# -----------------------------------
+def runBenchmark(host, port, operations, modes, requests, concurrency, warmup=3):
+    results = []
+    for mode in modes:
+        if mode == "async":
+            async def runAll():
+                restClient = AsyncANTServerRestClient(host, port, poolSize=concurrency)
+                modeResults = []
+                for operation in operations:
+                    await runAsync(restClient, operation, warmup, 1)
+                    modeResults.append(summarize(operation, mode, concurrency, *await runAsync(restClient, operation, requests, concurrency)))
+                restClient.close()
+                return modeResults
+            results += asyncio.run(runAll())
+        else:
+            threads = 1 if mode == "single" else concurrency
+            restClient = ANTServerRestClient(host, port, poolSize=threads)
+            for operation in operations:
+                runThreads(restClient, operation, warmup, 1)
+                results.append(summarize(operation, mode, threads, *runThreads(restClient, operation, requests, threads)))
+            restClient.close()
+    return results
+
+
+def printResults(results):
+    print("%-22s %-8s %5s %8s %7s %9s %9s %9s %11s" % ("operation", "mode", "conc", "requests", "errors", "req/s", "p50 ms", "p99 ms", "cpu/req ms"))
+    for r in results:
+        ms = lambda v: "-" if v is None else "%.2f" % (v * 1000)
+        print("%-22s %-8s %5d %8d %7d %9.1f %9s %9s %11s" % (r["operation"], r["mode"], r["concurrency"], r["requests"], r["errors"],
+                                                             r["rps"] or 0, ms(r["p50"]), ms(r["p99"]), ms(r["cpu_per_request"])))
+
+
+# -----------------------------------
+# compare with a previous result file; returns the list of regressions
+def compareResults(results, baseline, tolerance):
+    previous = { (r["operation"], r["mode"]): r for r in baseline["results"] }
+    regressions = []
+    for r in results:
+        p = previous.get((r["operation"], r["mode"]))
+        if p is None:
+            continue
+        if p["rps"] and r["rps"] is not None and r["rps"] < p["rps"] * (1 - tolerance):
+            regressions.append("%s/%s: req/s %.1f -> %.1f" % (r["operation"], r["mode"], p["rps"], r["rps"]))
+        if p["p95"] and r["p95"] is not None and r["p95"] > p["p95"] * (1 + tolerance):
+            regressions.append("%s/%s: p95 %.2f ms -> %.2f ms" % (r["operation"], r["mode"], p["p95"] * 1000, r["p95"] * 1000))
+    return regressions
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='Host address of an ANT-Server (stand-in); default: start a local stand-in', default=None)
+    parser.add_argument('--port', help='Port of ANT-Server', type=int, default=8081)
+    parser.add_argument('--requests', help='Requests per operation and mode', type=int, default=200)
+    parser.add_argument('--concurrency', help='Threads / tasks in the threads and async modes', type=int, default=8)
+    parser.add_argument('--operations', help='Comma separated operations (default all): %s' % ", ".join(Operations), default=None)
+    parser.add_argument('--modes', help='Comma separated modes (default all): %s' % ", ".join(Modes), default=",".join(Modes))
+    parser.add_argument('--missions', help='Synthetic missions in the stand-in', type=int, default=15000)
+    parser.add_argument('--devices', help='Synthetic devices in the stand-in', type=int, default=1000)
+    parser.add_argument('--vehicles', help='Synthetic vehicles in the stand-in', type=int, default=20)
+    parser.add_argument('--latency', help='Stand-in latency per request in seconds', type=float, default=0.0)
+    parser.add_argument('--output', help='Write results to this json file', default=None)
+    parser.add_argument('--compare', help='Compare with a previous json result file; exit 1 on regression', default=None)
+    parser.add_argument('--tolerance', help='Allowed relative regression for --compare', type=float, default=0.2)
+    args = parser.parse_args()
+
+    operations = list(Operations) if args.operations is None else [ o.strip() for o in args.operations.split(",") ]
+    modes = [ m.strip() for m in args.modes.split(",") ]
+    standInArgs = { "nMissions": args.missions, "nDevices": args.devices, "nVehicles": args.vehicles, "latency": args.latency, "seed": 1 }
+
+    standIn = None
+    host, port = args.host, args.port
+    if host is None:
+        host = "127.0.0.1"
+        standIn, connection, port = startStandIn(standInArgs)
+
+    try:
+        results = runBenchmark(host, port, operations, modes, args.requests, args.concurrency)
+    finally:
+        if standIn is not None:
+            stopStandIn(standIn, connection)
+
+    printResults(results)
+    output = { "date": datetime.datetime.now().isoformat(), "python": platform.python_version(), "platform": platform.platform(),
+               "requests": args.requests, "concurrency": args.concurrency, "standin": standInArgs if args.host is None else None,
+               "results": results }
+    if args.output is not None:
+        with open(args.output, "w") as outputFile:
+            json.dump(output, outputFile, indent=4)
+
+    if args.compare is not None:
+        regressions = compareResults(results, common.readConfigFile(args.compare), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION: %s" % regression)
+        sys.exit(1 if regressions else 0)
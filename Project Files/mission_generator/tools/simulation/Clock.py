@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+# Clocks for the simulation: the real clock, or a virtual clock that only moves
+# when it is advanced, so a day of simulated traffic runs in seconds.
+
+import time
+import threading
+
+
+class RealClock():
+    ''' now() is monotonic seconds, time() wall clock seconds since the epoch '''
+    virtual = False
+
+    def now(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def toTime(self, t):
+        ''' wall clock time of clock time t '''
+        return time.time() + (t - time.monotonic())
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock():
+    '''
+    Simulated time: now() starts at start and only changes by advance() (done by
+    the Timer scheduler when it jumps to the next due timer) or sleep().
+    time() maps it on the wall clock, starting at epoch (default: the time of creation).
+    '''
+    virtual = True
+
+    def __init__(self, start=0.0, epoch=None):
+        self._now = start
+        self._epoch = (time.time() if epoch is None else epoch) - start
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._now
+
+    def time(self):
+        return self._epoch + self._now
+
+    def toTime(self, t):
+        return self._epoch + t
+
+    def advance(self, t):
+        ''' move to clock time t; the clock never goes back '''
+        with self._lock:
+            if t > self._now:
+                self._now = t
+
+    def sleep(self, seconds):
+        self.advance(self._now + seconds)
+
+
+Real = RealClock()
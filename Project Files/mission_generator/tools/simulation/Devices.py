@@ -12,7 +12,10 @@ import re
 import threading
 import argparse
 import logging
+import copy
+import collections.abc
 import common
+import DiffEngine
 
 log = logging.getLogger("Devices")
 
@@ -52,7 +55,92 @@ def setRestClient(rest_client):
     global restClient
     restClient = rest_client
             
-Devices = {}
+
+class DeviceRegistry(collections.abc.MutableMapping):
+    '''
+    The monitored devices by device id, with indexes by device type, node,
+    group (location group) and station (device group). Each index maps a value
+    to the ids of the devices with that value (insertion ordered).
+    '''
+    Indexes = {
+        "type":    lambda device: device.getType(),
+        "node":    lambda device: device.getNode(),
+        "group":   lambda device: device.getGroup(),
+        "station": lambda device: device.getStationName(),
+    }
+
+    def __init__(self):
+        self._devices = {}
+        self._keys = {}
+        self._indexes = { name: {} for name in DeviceRegistry.Indexes }
+        self._lock = threading.RLock()
+
+    def __getitem__(self, id):
+        return self._devices[id]
+
+    def __contains__(self, id):
+        return id in self._devices
+
+    def __iter__(self):
+        return iter(self._devices)
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __setitem__(self, id, device):
+        with self._lock:
+            self._unindex(id)
+            self._devices[id] = device
+            self._index(id, device)
+
+    def __delitem__(self, id):
+        with self._lock:
+            self._unindex(id)
+            del self._devices[id]
+
+    def _index(self, id, device):
+        keys = { name: key(device) for name, key in DeviceRegistry.Indexes.items() }
+        self._keys[id] = keys
+        for name, value in keys.items():
+            self._indexes[name].setdefault(value, {})[id] = None
+
+    def _unindex(self, id):
+        keys = self._keys.pop(id, None)
+        if keys is None:
+            return
+        for name, value in keys.items():
+            ids = self._indexes[name][value]
+            del ids[id]
+            if not ids:
+                del self._indexes[name][value]
+
+    def reindex(self, id):
+        ''' update the indexes after the data of a device changed '''
+        with self._lock:
+            device = self._devices[id]
+            if self._keys.get(id) != { name: key(device) for name, key in DeviceRegistry.Indexes.items() }:
+                self._unindex(id)
+                self._index(id, device)
+
+    def find(self, **criteria):
+        ''' devices matching all criteria, e.g. find(type="presence-detector", station="A") '''
+        with self._lock:
+            buckets = sorted( ( self._indexes[name].get(value, {}) for name, value in criteria.items() ), key=len )
+            if not buckets:
+                return list(self._devices.values())
+            return [ self._devices[id] for id in buckets[0] if all( id in bucket for bucket in buckets[1:] ) ]
+
+    def getMany(self, ids):
+        ''' devices for a list of ids; None for an unknown id '''
+        return [ self._devices.get(id) for id in ids ]
+
+    def values(self):
+        return self._devices.values()
+
+    def keys(self):
+        return self._devices.keys()
+
+Devices = DeviceRegistry()
 
 class DeviceHandler:
 
@@ -62,249 +150,296 @@ class DeviceHandler:
 
 
 class Device:
+    # id and type never change; the hot fields (enabled, station, node, location group and the
+    # state) are attributes, the other fields are kept as compact JSON, only parsed for verbose output.
+    __slots__ = ( "id", "type", "enabled", "station", "node", "group", "_state", "_rare", "_changedFields", "_eventHandlers" )
+
     def __init__(self, deviceData):
-        self._deviceData = deviceData
+        self.id = deviceData['meta']['deviceid']
+        self.type = deviceData['meta']['devicetype']
+        self._load(deviceData)
+        self._changedFields = None
         self._eventHandlers = []
 
+    def _load(self, deviceData):
+        location = deviceData.get('location', {})
+        self.enabled = deviceData.get('enabled')
+        self.station = deviceData.get('group', "NO STATION")
+        self.node = deviceData['node'] if 'node' in deviceData else common.getValueFromDict(common.getValueFromDict(location, 'currentnode', {}), 'name')
+        self.group = common.getValueFromDict(location, 'group')
+        self._state = deviceData['meta']['state']
+        rare = { key: value for key, value in deviceData.items() if key != 'meta' }
+        rare['meta'] = { key: value for key, value in deviceData['meta'].items() if key not in ('deviceid', 'devicetype', 'state') }
+        self._rare = json.dumps(rare, separators=(",", ":")).encode()
+
+    def getDeviceData(self):
+        ''' all fields of the device '''
+        deviceData = json.loads(self._rare)
+        deviceData['meta'].update(deviceid=self.id, devicetype=self.type, state=self._state)
+        return deviceData
+
+    _deviceData = property(getDeviceData)
+
     def addEventHandler(self, event_handler):
         self._eventHandlers.append(event_handler)
         
 
     def getId(self):
-        return self._deviceData['meta']['deviceid']
+        return self.id
 
     def getType(self):
-        return self._deviceData['meta']['devicetype']
+        return self.type
+
+    def getNode(self):
+        return self.node
 
-    def update(self, deviceData):
-        self._deviceData = deviceData
+    def getGroup(self):
+        return self.group
+
+    def update(self, deviceData, changedFields=None):
+        self._load(deviceData)
+        self._changedFields = changedFields
+
+    def getChangedFields(self):
+        ''' fields changed by the last update (e.g. {"meta.state.state.value"}); None for a new device '''
+        return self._changedFields
 
     def isChanged(self, deviceData):
-        d = self._deviceData
-        d['meta']['state']['timestamp'] = deviceData['meta']['state']['timestamp'] 
-        return d != deviceData
+        ''' changed apart from the state timestamp '''
+        return DeviceDiff.changes(self.id, deviceData) != set()
 
     def isEnabled(self):
-        return self._deviceData['enabled']
+        return self.enabled
 
     def getStationName(self):
-        if 'group' in self._deviceData:
-            return self._deviceData['group']
-        else:
-            return "NO STATION"
+        return self.station
 
     def show(self, verbose=False):
         if verbose:
+            deviceData = self.getDeviceData()
             try:
                 print("%20s : %s" % ( 'deviceid   ',                self.getId() ) )
-                if 'meta' in self._deviceData:
-                    if 'devicetype' in self._deviceData['meta']:
-                        print("%20s : %s" % ( 'devicetype   ',              self._deviceData['meta']['devicetype'] ) )
-                    if 'state' in self._deviceData['meta']:
-                        if 'isconnected' in self._deviceData['meta']['state']:
-                            print("%20s : %s" % ( 'isconnected ',             self._deviceData['meta']['state']['isconnected'] ) )
-                        if 'state' in self._deviceData['meta']['state']:
-                            print("%20s : %s" % ( 'state ',                   self._deviceData['meta']['state']['state'] ) )
-                        if 'timestamp' in self._deviceData['meta']['state']:
-                            print("%20s : %s" % ( 'timestamp ',               self._deviceData['meta']['state']['timestamp'] ) )
-                    if 'hardwareid' in self._deviceData['meta']:
-                        print("%20s : %s" % ( 'hardwareid     ',              self._deviceData['meta']['hardwareid'] ) )
-                if 'enabled' in self._deviceData:
-                    print("%20s : %s" % ( 'enabled      ',                    self._deviceData['enabled'] ) )
-                if 'node' in self._deviceData:
-                    print("%20s : %s" % ( 'node       ',                       self._deviceData['node'] ) )
-                if 'location' in self._deviceData:
+                if 'meta' in deviceData:
+                    if 'devicetype' in deviceData['meta']:
+                        print("%20s : %s" % ( 'devicetype   ',              deviceData['meta']['devicetype'] ) )
+                    if 'state' in deviceData['meta']:
+                        if 'isconnected' in deviceData['meta']['state']:
+                            print("%20s : %s" % ( 'isconnected ',             deviceData['meta']['state']['isconnected'] ) )
+                        if 'state' in deviceData['meta']['state']:
+                            print("%20s : %s" % ( 'state ',                   deviceData['meta']['state']['state'] ) )
+                        if 'timestamp' in deviceData['meta']['state']:
+                            print("%20s : %s" % ( 'timestamp ',               deviceData['meta']['state']['timestamp'] ) )
+                    if 'hardwareid' in deviceData['meta']:
+                        print("%20s : %s" % ( 'hardwareid     ',              deviceData['meta']['hardwareid'] ) )
+                if 'enabled' in deviceData:
+                    print("%20s : %s" % ( 'enabled      ',                    deviceData['enabled'] ) )
+                if 'node' in deviceData:
+                    print("%20s : %s" % ( 'node       ',                       deviceData['node'] ) )
+                if 'location' in deviceData:
                     print("%20s :" % ( 'location         ') )
-                    if 'coord' in self._deviceData['location']:
-                        print("%20s : %s" % ( 'coord     ',                   self._deviceData['location']['coord'] ) )
-                    if 'course' in self._deviceData['location']:
-                        print("%20s : %s" % ( 'course     ',                  self._deviceData['location']['course'] ) )
-                    if 'currentnode' in self._deviceData['location']:
+                    if 'coord' in deviceData['location']:
+                        print("%20s : %s" % ( 'coord     ',                   deviceData['location']['coord'] ) )
+                    if 'course' in deviceData['location']:
+                        print("%20s : %s" % ( 'course     ',                  deviceData['location']['course'] ) )
+                    if 'currentnode' in deviceData['location']:
                         print("%20s :" % ( 'currentnode     ') )
-                        if 'name' in self._deviceData['location']['currentnode']:
-                            print("%20s : %s" % ( 'name ',                    self._deviceData['location']['currentnode']['name'] ) )
-                        if 'id' in self._deviceData['location']['currentnode']:
-                            print("%20s : %s" % ( 'id ',                      self._deviceData['location']['currentnode']['id'] ) )
-                    if 'map' in self._deviceData['location']:
-                        print("%20s : %s" % ( 'map     ',                     self._deviceData['location']['map'] ) )
-                    if 'group' in self._deviceData['location']:
-                        print("%20s : %s" % ( 'group     ',                   self._deviceData['location']['group'] ) )
-                if 'type' in self._deviceData:
-                    print("%20s : %s" % ( 'type      ',                       self._deviceData['type'] ) )
-                if 'class' in self._deviceData:
-                    print("%20s : %s" % ( 'class      ',                      self._deviceData['class'] ) )
-                if 'group' in self._deviceData:
-                    print("%20s : %s" % ( 'group      ',                      self._deviceData['group'] ) )
+                        if 'name' in deviceData['location']['currentnode']:
+                            print("%20s : %s" % ( 'name ',                    deviceData['location']['currentnode']['name'] ) )
+                        if 'id' in deviceData['location']['currentnode']:
+                            print("%20s : %s" % ( 'id ',                      deviceData['location']['currentnode']['id'] ) )
+                    if 'map' in deviceData['location']:
+                        print("%20s : %s" % ( 'map     ',                     deviceData['location']['map'] ) )
+                    if 'group' in deviceData['location']:
+                        print("%20s : %s" % ( 'group     ',                   deviceData['location']['group'] ) )
+                if 'type' in deviceData:
+                    print("%20s : %s" % ( 'type      ',                       deviceData['type'] ) )
+                if 'class' in deviceData:
+                    print("%20s : %s" % ( 'class      ',                      deviceData['class'] ) )
+                if 'group' in deviceData:
+                    print("%20s : %s" % ( 'group      ',                      deviceData['group'] ) )
             except Exception as e: 
                 print("Exception missing:", e)
         else:
-            print("device %s @ %s state=%s enabled=%s" % (self._deviceData["meta"]["deviceid"], self._deviceData["meta"]["state"]["timestamp"], self._deviceData["meta"]["state"]["state"], self._deviceData["enabled"]) ) 
+            print("device %s @ %s state=%s enabled=%s" % (self.id, self._state["timestamp"], self._state["state"], self.enabled) ) 
 
 
 class IO(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("IO: '%s': state=%s, getValue()=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'], self.getValue() ) )
+            print ("IO: '%s': state=%s, getValue()=%s" % (self.id, self._state['state'], self.getValue() ) )
 
     def getValue(self):
-        if 'value' in self._deviceData['meta']['state']['state']:
-            return (self._deviceData['meta']['state']['state']['value'] == 1)
+        if 'value' in self._state['state']:
+            return (self._state['state']['value'] == 1)
         else:
             return False
 
     def set(self, on):
         log.debug("IO.set %s to %s" % (self.getId(), on) )
-        restClient.executeSetIOValueRESTRequest(self._deviceData['meta']['deviceid'], "%s" % on)
+        restClient.executeSetIOValueRESTRequest(self.id, "%s" % on)
 
 class OPC_UA_Node(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("OPC_UA_Node: '%s': state=%s, getValue()=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'], self.getValue() ) )
+            print ("OPC_UA_Node: '%s': state=%s, getValue()=%s" % (self.id, self._state['state'], self.getValue() ) )
 
     def getValue(self):
-        if 'value' in self._deviceData['meta']['state']['state']:
-            return (self._deviceData['meta']['state']['state']['value'] == True)
+        if 'value' in self._state['state']:
+            return (self._state['state']['value'] == True)
         else:
             return False
 
     def set(self, on):
         log.debug("OPC_UA_NODE.set %s to %s" % (self.getId(), on) )
-        restClient.executeSetIOValueRESTRequest(self._deviceData['meta']['deviceid'], "%s" % on)
+        restClient.executeSetIOValueRESTRequest(self.id, "%s" % on)
 
 
 class DigitalDetector(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("DigitalDetector: '%s' state=%s, getValue()=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'], self.getValue() ) )
+            print ("DigitalDetector: '%s' state=%s, getValue()=%s" % (self.id, self._state['state'], self.getValue() ) )
 
     def getValue(self):
-        return self._deviceData['meta']['state']['state']['presencedetected']
+        return self._state['state']['presencedetected']
 
 
 class OPC_UA_DigitalDetector(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if args.verbose:
             Device.show(self, args.verbose)
         else:
-            print ("OPC_UA_DigitalDetector: '%s' state=%s, getValue()=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'], self.getValue() ) )
+            print ("OPC_UA_DigitalDetector: '%s' state=%s, getValue()=%s" % (self.id, self._state['state'], self.getValue() ) )
 
     def getValue(self):
-        log.debug ("OPC_UA_DigitalDetector: '%s' state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state']) )
-        if 'Presence' in self._deviceData['meta']['state']['state']:
-            return self._deviceData['meta']['state']['state']['Presence']
+        log.debug ("OPC_UA_DigitalDetector: '%s' state=%s" % (self.id, self._state['state']) )
+        if 'Presence' in self._state['state']:
+            return self._state['state']['Presence']
         else:
             return False
 
 class PresenceDetector(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("PresenceDetector: '%s': state=%s, getValue()=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'], self.getValue() ) )
+            print ("PresenceDetector: '%s': state=%s, getValue()=%s" % (self.id, self._state['state'], self.getValue() ) )
 
     def getValue(self):
-        if 'label' in self._deviceData['meta']['state']['state']:
-            return self._deviceData['meta']['state']['state']['label'] == "Presence detected"
+        if 'label' in self._state['state']:
+            return self._state['state']['label'] == "Presence detected"
         else:
             return False
 
 class FireDetector(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("FireDetector: '%s': state=%s, getValue()=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'], self.getValue() ) )
+            print ("FireDetector: '%s': state=%s, getValue()=%s" % (self.id, self._state['state'], self.getValue() ) )
 
     def getValue(self):
-        return self._deviceData['meta']['state']['state']['label'] != 'No fire detected' 
+        return self._state['state']['label'] != 'No fire detected' 
 
 class OPC_UA_FireDetector(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("FireDetector: '%s': state=%s, getValue()=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'], self.getValue() ) )
+            print ("FireDetector: '%s': state=%s, getValue()=%s" % (self.id, self._state['state'], self.getValue() ) )
 
     def getValue(self):
-        if 'label' in self._deviceData['meta']['state']['state']:
-            return self._deviceData['meta']['state']['state']['label'] != 'No fire detected' 
+        if 'label' in self._state['state']:
+            return self._state['state']['label'] != 'No fire detected' 
         else:
             return False
 
 class DigitalReader(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("DigitalReader: '%s': state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'] ) )
+            print ("DigitalReader: '%s': state=%s" % (self.id, self._state['state'] ) )
 
     def getValue(self):
-        if 'Presence' in self._deviceData['meta']['state']['state']:
-            return self._deviceData['meta']['state']['state']['Presence']
+        if 'Presence' in self._state['state']:
+            return self._state['state']['Presence']
         else:
             return False
 
     def getMissionId(self):
-        if 'missionid' in self._deviceData['meta']['state']['state']:
-            return self._deviceData['meta']['state']['state']['missionid']
+        if 'missionid' in self._state['state']:
+            return self._state['state']['missionid']
         else:
             return 0
 
 
 class OPC_UA_DigitalReader(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("OPC_UA_DigitalReader: '%s': state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'] ) )
+            print ("OPC_UA_DigitalReader: '%s': state=%s" % (self.id, self._state['state'] ) )
 
     def getValue(self):
-        if 'Presence' in self._deviceData['meta']['state']['state']:
-            return self._deviceData['meta']['state']['state']['Presence']
+        if 'Presence' in self._state['state']:
+            return self._state['state']['Presence']
         else:
             return False
 
     def getMissionId(self):
-        if 'missionid' in self._deviceData['meta']['state']['state']:
-            return self._deviceData['meta']['state']['state']['missionid']
+        if 'missionid' in self._state['state']:
+            return self._state['state']['missionid']
         else:
             return 0
 
 class OPC_UA_Door(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("OPC_UA_DgitalReader: '%s': state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'] ) )
+            print ("OPC_UA_DgitalReader: '%s': state=%s" % (self.id, self._state['state'] ) )
 
     def getValue(self):
-        return self._deviceData['meta']['state']['state']
+        return self._state['state']
 
     def setValue(self, value):
         print(" ##### OPC_UA_DOOR setValue: TO BE IMPLEMENTED #####")
 
 
 class ChangeDirection(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("ChangeDirection: '%s'" % (self._deviceData['meta']['deviceid'] ) )
+            print ("ChangeDirection: '%s'" % (self.id ) )
 
 class Arrival(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("Arrival: '%s'" % (self._deviceData['meta']['deviceid'] ) )
+            print ("Arrival: '%s'" % (self.id ) )
 
 class ArrivalSelector(Device):
+    __slots__ = ( "_stations", )
     def __init__(self, deviceData):
         Device.__init__(self, deviceData)
         self._stations = []
@@ -313,7 +448,7 @@ class ArrivalSelector(Device):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("ArrivalSelector: '%s': state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'] ) )
+            print ("ArrivalSelector: '%s': state=%s" % (self.id, self._state['state'] ) )
 
     def setStations(self, stations):
         log.debug("ArrivalSelector[%s] set stations: %s" % (self.getId(), stations) )
@@ -327,9 +462,8 @@ class ArrivalSelector(Device):
     def freeplaces(self):
         log.debug("ArrivalSelector[%s]: station=%s" % (self.getId(), self._stations ) )
         n = 0
-        for station in self._stations:
+        for station, device in stationDevices(self._stations):
             try: 
-                device = getDevice(station)
                 log.debug("ArrivalSelector[%s]: station[%s].getValue()=%s, (n=%d)" % (self.getId(), station, device.getValue(), n ) )
                 if not device.getValue(): 
                     n = n + 1
@@ -339,13 +473,15 @@ class ArrivalSelector(Device):
 
 
 class Departure(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("Departure: '%s'" % (self._deviceData['meta']['deviceid'] ) )
+            print ("Departure: '%s'" % (self.id ) )
 
 class SmartDeparture(Device):
+    __slots__ = ( "_stations", )
     def __init__(self, deviceData):
         Device.__init__(self, deviceData)
         self._stations = []
@@ -354,7 +490,7 @@ class SmartDeparture(Device):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("SmartDeparture: '%s': state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'] ) )
+            print ("SmartDeparture: '%s': state=%s" % (self.id, self._state['state'] ) )
 
     def getValue(self):
         # DepartureSelector is loaded when any positions is loaded.
@@ -364,9 +500,8 @@ class SmartDeparture(Device):
     def stocklevel(self):
         log.debug("ArrivalSelector[%s]: station=%s" % (self.getId(), self._stations ) )
         n = 0
-        for station in self._stations:
+        for station, device in stationDevices(self._stations):
             try: 
-                device = getDevice(station)
                 log.debug("ArrivalSelector[%s]: station[%s].getValue()=%s, (n=%d)" % (self.getId(), station, device.getValue(), n ) )
                 if device.getValue(): 
                     n = n + 1
@@ -379,18 +514,71 @@ class SmartDeparture(Device):
         self._stations = stations
 
 class Parking(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("Parking: '%s': state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'] ) )
+            print ("Parking: '%s': state=%s" % (self.id, self._state['state'] ) )
 
 class Charger(Device):
+    __slots__ = ()
     def show(self, verbose=False):
         if verbose:
             Device.show(self, verbose)
         else:
-            print ("Charger: '%s': state=%s" % (self._deviceData['meta']['deviceid'], self._deviceData['meta']['state']['state'] ) )
+            print ("Charger: '%s': state=%s" % (self.id, self._state['state'] ) )
+
+# device type -> class used for the devices of that type; other types get class Device
+DeviceTypes = {
+    'i/o':                      IO,
+    'opcua-node':               OPC_UA_Node,
+    'opcua-input':              OPC_UA_Node,
+    'arrival-selector':         ArrivalSelector,
+    'smart-departure':          SmartDeparture,
+    'digitaldetector':          DigitalDetector,
+    'opc-ua-digital-detector':  OPC_UA_DigitalDetector,
+    'presence-detector':        PresenceDetector,
+    'opcua-presence-detector':  PresenceDetector,
+    'digitalreader':            DigitalReader,
+    'opc-ua-digital-reader':    OPC_UA_DigitalReader,
+    'fire-detector':            FireDetector,
+    'opcua-fire-detector':      OPC_UA_FireDetector,
+    'opcua-door-driver':        OPC_UA_Door,
+    'arrival':                  Arrival,
+    'departure':                Departure,
+    'change-direction':         ChangeDirection,
+    'parking':                  Parking,
+    'charger':                  Charger,
+}
+
+def registerDeviceType(deviceType, deviceClass):
+    DeviceTypes[deviceType] = deviceClass
+
+def createDevice(deviceData):
+    return DeviceTypes.get(deviceData['meta']['devicetype'], Device)(deviceData)
+
+# devices matching all criteria: type, node, group and/or station
+def findDevices(**criteria):
+    return Devices.find(**criteria)
+
+# load presence devices of a station, counted by ArrivalSelector and SmartDeparture
+LoadPresenceTypes = ( "presence-detector", "opcua-presence-detector" )
+
+# (station, device) for the stations of a selector: a station is a device id, or the name of a
+# station (device group) whose load presence devices are found with the indexes; device is None
+# when there is no such device.
+def stationDevices(stations):
+    for station, device in zip(stations, Devices.getMany(stations)):
+        if device is not None:
+            yield station, device
+            continue
+        devices = [ device for type in LoadPresenceTypes for device in findDevices(station=station, type=type) ]
+        if not devices:
+            yield station, None
+        for device in devices:
+            yield station, device
+
 
 # call the global event handler if it exists and for each devices the registered event handlers.
 def callEventHandlers(event, device, prev_device, event_handler): 
@@ -401,70 +589,64 @@ def callEventHandlers(event, device, prev_device, event_handler):
         handler.handleEvent(event, device, prev_device)
     
 
-def monitorDevices(interval, maxDevices, event_handler):
+# incremental sync: field used as cursor.
+DeviceTimestampField = "meta.state.timestamp"
+SyncState = { "cursor": None, "cycle": 0 }
+# last seen device data; a device only counts as changed when more than its state timestamp changed
+DeviceDiff = DiffEngine.DiffEngine(ignore=[ DeviceTimestampField ])
+
+def syncDevices(deviceList, complete, event_handler, pageSize=None):
+    """ merge deviceList into Devices and call the event handlers for every change.
+        complete: deviceList holds all devices; devices not in it are deleted.
+        otherwise deviceList holds the changed devices only.
+        pageSize: deviceList is fetched in pages of pageSize devices; when it took more than one
+        page a missing device is only deleted when it is missing in the next complete deviceList too.
+        returns the highest timestamp seen.
+    """
+    handledDeviceIds = set()
+    cursor = None
+    rows = 0
+    for deviceData in deviceList:
+        rows += 1
+        id = deviceData["meta"]["deviceid"]
+        timestamp = deviceData["meta"]["state"].get("timestamp")
+        if timestamp is not None and ( cursor is None or timestamp > cursor ):
+            cursor = timestamp
+        event, changedFields = DeviceDiff.update(id, deviceData)
+        if id in Devices.keys():
+            if event == "changed":
+                prev_device = copy.copy(Devices[id])
+                Devices[id].update(deviceData, changedFields)
+                Devices.reindex(id)
+                callEventHandlers("changed", Devices[id], prev_device, event_handler);
+        else:
+            Devices[id] = createDevice(deviceData)
+            callEventHandlers("new", Devices[id], None, event_handler);
+        handledDeviceIds.add(id)
+
+    if complete:
+        for id in DeviceDiff.deletedIds(handledDeviceIds, confirm=pageSize is not None and rows >= pageSize):
+            if id in Devices:
+                callEventHandlers("deleted", Devices[id], None, event_handler);
+                del Devices[id]
+            DeviceDiff.remove(id)
+    return cursor
+
+
+# maxDevices is the number of devices fetched per request; all devices are monitored
+# incremental: only fetch the devices changed since the previous cycle (by DeviceTimestampField);
+#              every fullSyncEvery cycles all devices are fetched to detect deleted devices.
+def monitorDevices(interval, maxDevices, event_handler, incremental=False, fullSyncEvery=60):
     while True:
         try:
-            handledDeviceIds = []
             restClient.getSessionToken()
-            for deviceData in restClient.executeGetDeviceListRESTRequest(maxDevices):
-                id = deviceData["meta"]["deviceid"]
-                if id in Devices.keys():
-                    if Devices[id].isChanged(deviceData):
-                        prev_device = Devices[id]
-                        Devices[id].update(deviceData)
-                        callEventHandlers("changed", Devices[id], prev_device, event_handler);
-                else:
-                    if deviceData['meta']['devicetype'] == 'i/o':
-                         Devices[id] = IO(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'opcua-node':
-                         Devices[id] = OPC_UA_Node(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'opcua-input':
-                         Devices[id] = OPC_UA_Node(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'arrival-selector':
-                         Devices[id] = ArrivalSelector(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'smart-departure':
-                         Devices[id] = SmartDeparture(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'digitaldetector':
-                         Devices[id] = DigitalDetector(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'opc-ua-digital-detector':
-                         Devices[id] = OPC_UA_DigitalDetector(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'presence-detector':
-                         Devices[id] = PresenceDetector(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'opcua-presence-detector':
-                         Devices[id] = PresenceDetector(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'digitalreader':
-                         Devices[id] = DigitalReader(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'opc-ua-digital-reader':
-                         Devices[id] = OPC_UA_DigitalReader(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'fire-detector':
-                         Devices[id] = FireDetector(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'opcua-fire-detector':
-                         Devices[id] = OPC_UA_FireDetector(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'opcua-door-driver':
-                         Devices[id] = OPC_UA_Door(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'arrival':
-                         Devices[id] = Arrival(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'departure':
-                         Devices[id] = Departure(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'change-direction':
-                         Devices[id] = ChangeDirection(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'parking':
-                         Devices[id] = Parking(deviceData)
-                    elif deviceData['meta']['devicetype'] == 'charger':
-                         Devices[id] = Charger(deviceData)
-                    else:
-                        Devices[id] = Device(deviceData)
-                    callEventHandlers("new", Devices[id], None, event_handler);
-                handledDeviceIds.append(id)
-
-            deleteDeviceIds = []
-            for id in Devices:
-                if id not in handledDeviceIds:
-                    callEventHandlers("deleted", Devices[id], None, event_handler);
-                    deleteDeviceIds.append(id)
-            # now realy remove the device.
-            for id in deleteDeviceIds:
-                    del Devices[id]
+            cursor = SyncState["cursor"]
+            if incremental and cursor is not None and SyncState["cycle"] % fullSyncEvery != 0:
+                cursor = syncDevices(restClient.iterChangedDevices(cursor, maxDevices, field=DeviceTimestampField), False, event_handler) or cursor
+            else:
+                cursor = syncDevices(restClient.iterDevices(maxDevices), True, event_handler, maxDevices)
+            SyncState["cursor"] = cursor
+            SyncState["cycle"] += 1
         except Exception as e: 
             print("monitorDevices: exception :", e)
         if interval != 0:
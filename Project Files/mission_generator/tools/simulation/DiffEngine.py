@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+# Diff of successive snapshots of ANT server records (missions, devices, vehicles, ...)
+# Used by the monitors to find new, changed and deleted records.
+
+import sys
+
+
+def getPath(record, path):
+    ''' value at a dotted path (e.g. "meta.state.timestamp") or None '''
+    for key in path.split("."):
+        if not isinstance(record, dict) or key not in record:
+            return None
+        record = record[key]
+    return record
+
+
+class DiffEngine():
+    '''
+    Keeps a fingerprint of the last seen record per id, not the record itself:
+    the hash of every leaf value by its dotted path (e.g. "meta.state.state.value").
+    - new and deleted ids are found with set arithmetic on the ids.
+    - a record is unchanged when the value of fingerprintField (e.g. the timestamp
+      ANT updates on every change) is the same, or when there is no fingerprintField,
+      when all leaf hashes are the same.
+    - for changed records the set of changed fields (dotted paths, e.g.
+      {"transportstate", "meta.state.state.value"}) is computed; paths in
+      ignore are never reported, a record where only ignored fields changed is
+      unchanged.
+    '''
+    def __init__(self, ignore=(), fingerprintField=None):
+        self._ignore = frozenset(ignore)
+        self._fingerprintField = fingerprintField
+        self._records = {}
+        self._fingerprints = {}
+        self._missing = set()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, id):
+        return id in self._records
+
+    def get(self, id):
+        ''' fingerprint of the last seen record: { dotted path: hash of the value } '''
+        return self._records.get(id)
+
+    def ids(self):
+        return self._records.keys()
+
+    def flatten(self, record, prefix=""):
+        ''' { dotted path: hash of the value } of every leaf of record not in ignore '''
+        leaves = {}
+        for key, value in record.items():
+            path = sys.intern(prefix + str(key))
+            if path in self._ignore:
+                continue
+            if isinstance(value, dict) and value:
+                leaves.update(self.flatten(value, path + "."))
+            else:
+                leaves[path] = hash(repr(value))
+        return leaves
+
+    def changedFields(self, old, new):
+        ''' set of dotted paths that differ between the fingerprints old and new '''
+        return { path for path in old.keys() | new.keys() if old.get(path) != new.get(path) }
+
+    def changes(self, id, record):
+        ''' fields of record changed since the last seen record with id; None when it is new '''
+        old = self._records.get(id)
+        return None if old is None else self.changedFields(old, self.flatten(record))
+
+    def update(self, id, record):
+        ''' store the fingerprint of record; returns ("new", None), ("changed", fields) or (None, None) when unchanged '''
+        old = self._records.get(id)
+        if self._fingerprintField is not None:
+            fingerprint = getPath(record, self._fingerprintField)
+            if old is not None and fingerprint is not None and fingerprint == self._fingerprints.get(id):
+                return None, None
+            self._fingerprints[id] = fingerprint
+        new = self._records[id] = self.flatten(record)
+        if old is None:
+            return "new", None
+        changes = self.changedFields(old, new)
+        if not changes:
+            return None, None
+        return "changed", changes
+
+    def remove(self, id):
+        self._missing.discard(id)
+        self._fingerprints.pop(id, None)
+        return self._records.pop(id, None)
+
+    def deletedIds(self, seenIds, confirm=False):
+        ''' ids stored but not in seenIds (a set).
+            confirm: only the ids that were missing in the previous call too; the others are
+            held until the next call. A list fetched in pages can miss a record that moved to
+            an earlier page while it was fetched; it shows up again in the next list. '''
+        missing = self._records.keys() - seenIds
+        if not confirm:
+            self._missing = set()
+            return missing
+        deleted = missing & self._missing
+        self._missing = missing - deleted
+        return deleted
+
+    def diff(self, records, idFunc, complete=True):
+        ''' update with all records; yields (event, id, record, fields) for every new, changed
+            and - when records is complete - deleted record (record None) '''
+        seenIds = set()
+        for record in records:
+            id = idFunc(record)
+            event, fields = self.update(id, record)
+            if event is not None:
+                yield event, id, record, fields
+            seenIds.add(id)
+        if complete:
+            for id in self.deletedIds(seenIds):
+                self.remove(id)
+                yield "deleted", id, None, None
@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+# Event queue between the monitors and the event handlers, so a slow handler
+# (e.g. one creating a mission) does not stall the polling of the ANT server.
+
+import sys
+sys.path.append("../libraries/common/")
+
+import time
+import copy
+import queue
+import threading
+import argparse
+import logging
+import common
+
+log = logging.getLogger("EventDispatcher")
+
+
+class EventDispatcher():
+    '''
+    Runs event handlers on a pool of worker threads. Every worker has its own
+    queue and an event goes to the worker chosen by its key (e.g. the mission or
+    device id), so the events of one mission or device are handled in order.
+    The queues are bounded: when the queue of a worker is full, dispatch()
+    blocks the monitor until there is room again (backpressure) instead of
+    letting the backlog grow.
+    workers 0: no worker threads, handlers run inline on the calling thread.
+    '''
+    def __init__(self, workers=4, maxQueue=1000):
+        self._workers = workers
+        self._maxQueue = maxQueue
+        self._queues = [ queue.Queue(maxQueue) for i in range(workers) ]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._maxDepth = [ 0 ] * workers
+        self._dispatched = 0
+        self._handled = 0
+        self._errors = 0
+        self._lastError = None
+        self._blocked = 0
+        self._blockedTime = 0.0
+        self._latency = common.Histogram()
+        self._wait = common.Histogram()
+
+    # -----------------------------------
+    def start(self):
+        for n in range(self._workers):
+            thread = threading.Thread(target=self._work, args=(self._queues[n],), name="EventDispatcher-%d" % n, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        ''' handle the queued events, then stop the workers '''
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    # -----------------------------------
+    def dispatch(self, key, function, *args):
+        ''' call function(*args) on the worker of key '''
+        with self._lock:
+            self._dispatched += 1
+        if self._workers == 0:
+            self._call(function, args, time.monotonic())
+            return
+        n = hash(key) % self._workers
+        q = self._queues[n]
+        item = (function, args, time.monotonic())
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            start = time.monotonic()
+            q.put(item)
+            with self._lock:
+                self._blocked += 1
+                self._blockedTime += time.monotonic() - start
+        depth = q.qsize()
+        if depth > self._maxDepth[n]:
+            self._maxDepth[n] = depth
+
+    def handler(self, event_handler, key):
+        ''' an event handler (event, object, prev_object) that dispatches to event_handler;
+            key(object) gives the ordering key. The object is copied, as the monitors
+            update their records in place. '''
+        def dispatchingEventHandler(event, current, prev):
+            self.dispatch(key(current), event_handler, event, copy.copy(current), prev)
+        return dispatchingEventHandler
+
+    # -----------------------------------
+    def _work(self, q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            self._call(*item)
+
+    def _call(self, function, args, queued):
+        start = time.monotonic()
+        error = None
+        try:
+            function(*args)
+        except Exception as e:
+            error = e
+            log.warning("event handler %s: exception: %s" % (getattr(function, "__name__", function), e))
+        end = time.monotonic()
+        with self._lock:
+            self._handled += 1
+            self._wait.add(start - queued)
+            self._latency.add(end - start)
+            if error is not None:
+                self._errors += 1
+                self._lastError = str(error)
+
+    # -----------------------------------
+    # queue depths (current and max per worker), counters and latencies (seconds)
+    def getMetrics(self):
+        with self._lock:
+            return { "workers": self._workers,
+                     "depth": [ q.qsize() for q in self._queues ],
+                     "maxdepth": list(self._maxDepth),
+                     "dispatched": self._dispatched, "handled": self._handled,
+                     "errors": self._errors, "lasterror": self._lastError,
+                     "blocked": self._blocked, "blockedtime": self._blockedTime,
+                     "wait": self._wait.snapshot(), "latency": self._latency.snapshot() }
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import json
+    import random
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', help='Number of worker threads', type=int, default=4)
+    parser.add_argument('--queue', help='Max queued events per worker', type=int, default=100)
+    parser.add_argument('--events', help='Number of events', type=int, default=2000)
+    parser.add_argument('--keys', help='Number of distinct keys (missions)', type=int, default=50)
+    parser.add_argument('--slow', help='Handler time in seconds', type=float, default=0.002)
+    args = parser.parse_args()
+
+    # check the per key ordering with handlers of random duration
+    lastSeen = {}
+    outOfOrder = [ 0 ]
+    def handleEvent(key, n):
+        time.sleep(random.random() * args.slow)
+        if lastSeen.get(key, -1) > n:
+            outOfOrder[0] += 1
+        lastSeen[key] = n
+
+    dispatcher = EventDispatcher(args.workers, args.queue)
+    dispatcher.start()
+    start = time.monotonic()
+    for n in range(args.events):
+        key = random.randrange(args.keys)
+        dispatcher.dispatch(key, handleEvent, key, n)
+    dispatcher.stop()
+    print("%d events in %.2f s, out of order: %d" % (args.events, time.monotonic() - start, outOfOrder[0]))
+    print(json.dumps(dispatcher.getMetrics(), indent=4))
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# Streaming mission KPIs: subscribed to the mission events of Missions.monitorMissions,
+# it measures the time from creation to assignment, pickup (isloaded), drop-off and
+# termination of every mission, per station pair and per hour. Only the missions in
+# progress are kept; the times go into fixed size histograms (common.Histogram), so
+# the memory does not grow with the length of the run. Snapshots are written as JSON.
+
+import sys
+sys.path.append("../libraries/ANTServerAPI/")
+sys.path.append("../libraries/common/")
+
+import os
+import json
+import time
+import datetime
+import threading
+import collections
+import argparse
+import logging
+import common
+
+log = logging.getLogger("KPI")
+
+# times measured from the creation of a mission
+Phases = ( "assigned", "picked up", "dropped off", "terminated" )
+# outcome of a mission by navigationstate; "deleted" when it disappeared without a final state
+Outcomes = { 2: "rejected", 4: "completed", 5: "cancelled" }
+
+
+def parseTimestamp(timestamp):
+    ''' ANT time stamp -> seconds since the epoch; None when it cannot be parsed '''
+    try:
+        return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=datetime.timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def hourOf(t):
+    return datetime.datetime.fromtimestamp(t, datetime.timezone.utc).strftime("%Y-%m-%d %H:00")
+
+
+class MissionTimes():
+    ''' a mission in progress: its stations and when it reached every phase (seconds since the epoch) '''
+    __slots__ = ( "fromnode", "tonode", "created", "assigned", "pickedup", "droppedoff" )
+
+    def __init__(self, fromnode, tonode, created):
+        self.fromnode = fromnode
+        self.tonode = tonode
+        self.created = created
+        self.assigned = None
+        self.pickedup = None
+        self.droppedoff = None
+
+
+class PhaseStatistics():
+    ''' outcome counts and a histogram of the time to every phase '''
+    __slots__ = ( "outcomes", "phases" )
+
+    def __init__(self, histogram):
+        self.outcomes = collections.Counter()
+        self.phases = { phase: histogram() for phase in Phases }
+
+    def snapshot(self):
+        return { "outcomes": dict(self.outcomes), "phases": { phase: histogram.snapshot() for phase, histogram in self.phases.items() } }
+
+
+class KPICollector():
+    '''
+    Mission event handler (event, mission, prev_mission) collecting the KPIs.
+    The time of a change is the mission timestamp (ANT updates it on every change),
+    or the time of the event when it has none. A mission deleted without a final
+    state ends at the latest timestamp seen and counts as deleted; only a final
+    state reported by ANT counts as completed. Per hour (UTC) the created missions
+    and the outcomes and lead times of the terminated missions are counted; only
+    the last hours are kept. The histograms have buckets growing by growth from
+    smallest seconds; times beyond the last bucket only count in the max.
+    Thread safe: the events may come from the event dispatcher workers.
+    '''
+    def __init__(self, hours=168, smallest=1.0, growth=1.1, buckets=120):
+        self._histogram = lambda: common.Histogram(smallest, growth, buckets)
+        self._hours = hours
+        self._lock = threading.Lock()
+        self._missions = {}
+        self._total = PhaseStatistics(self._histogram)
+        self._pairs = {}
+        self._perHour = {}
+        self._started = time.time()
+        self._events = 0
+        self._latest = 0.0
+
+    # -----------------------------------
+    def handleEvent(self, event, mission, prev_mission):
+        t = parseTimestamp(mission.timestamp)
+        with self._lock:
+            self._events += 1
+            if t is None:
+                t = time.time()
+            elif t > self._latest:
+                self._latest = t
+            record = self._missions.get(mission.id)
+            if record is None:
+                if event == "deleted":
+                    return
+                # new, or already running when the collector started
+                created = parseTimestamp(mission.createdat) or t
+                record = MissionTimes(mission.fromnode, mission.tonode, created)
+                self._missions[mission.id] = record
+                self._hour(created)["created"] += 1
+            if record.assigned is None and ( mission.assignedto or mission.navigationstate == 3 ):
+                record.assigned = t
+            if record.pickedup is None and mission.isloaded:
+                record.pickedup = t
+            if record.pickedup is not None and record.droppedoff is None and not mission.isloaded:
+                record.droppedoff = t
+            outcome = Outcomes.get(mission.navigationstate)
+            if outcome is not None or event == "deleted":
+                # without a final state the mission ended before the latest change seen on ANT
+                self._terminate(mission.id, record, outcome or "deleted", t if outcome else max(t, self._latest))
+
+    def _terminate(self, id, record, outcome, t):
+        del self._missions[id]
+        pair = self._pairs.get((record.fromnode, record.tonode))
+        if pair is None:
+            pair = self._pairs[(record.fromnode, record.tonode)] = PhaseStatistics(self._histogram)
+        times = ( record.assigned, record.pickedup, record.droppedoff, t )
+        for statistics in ( self._total, pair ):
+            statistics.outcomes[outcome] += 1
+            for phase, at in zip(Phases, times):
+                if at is not None:
+                    statistics.phases[phase].add(at - record.created)
+        hour = self._hour(t)
+        hour[outcome] += 1
+        if outcome == "completed":
+            hour["lead time"].add(t - record.created)
+
+    def _hour(self, t):
+        ''' the counters of the hour of t; the oldest hour is dropped beyond the number of hours kept '''
+        key = hourOf(t)
+        hour = self._perHour.get(key)
+        if hour is None:
+            hour = self._perHour[key] = collections.Counter()
+            hour["lead time"] = self._histogram()
+            if len(self._perHour) > self._hours:
+                del self._perHour[min(self._perHour)]
+        return hour
+
+    # -----------------------------------
+    def snapshot(self):
+        with self._lock:
+            return { "time": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                     "uptime": time.time() - self._started, "events": self._events, "in progress": len(self._missions),
+                     "total": self._total.snapshot(),
+                     "pairs": { "%s -> %s" % pair: statistics.snapshot() for pair, statistics in sorted(self._pairs.items(), key=lambda item: str(item[0])) },
+                     "hours": { key: { name: value.snapshot() if name == "lead time" else value for name, value in hour.items() }
+                                for key, hour in sorted(self._perHour.items()) } }
+
+    def writeSnapshot(self, filename):
+        ''' write the snapshot to filename; replaced at once, so a reader never sees half a file '''
+        snapshot = self.snapshot()
+        with open(filename + ".tmp", "w") as snapshotFile:
+            json.dump(snapshot, snapshotFile, indent=2)
+        os.replace(filename + ".tmp", filename)
+        log.info("KPI snapshot written to %s: %d terminated, %d in progress" % (filename, sum(snapshot["total"]["outcomes"].values()), snapshot["in progress"]))
+
+    def printSummary(self):
+        snapshot = self.snapshot()
+        value = lambda v: "-" if v is None else "%.0f" % v
+        print("%-40s %9s %9s  %s" % ("station pair", "completed", "cancelled", " ".join( "%-20s" % ("%s p50/p95" % phase) for phase in Phases )))
+        for pair, statistics in [ ("all", snapshot["total"]) ] + list(snapshot["pairs"].items()):
+            print("%-40s %9d %9d  %s" % (pair[:40], statistics["outcomes"].get("completed", 0), statistics["outcomes"].get("cancelled", 0),
+                  " ".join( "%-20s" % ("%s/%s" % (value(statistics["phases"][phase]["p50"]), value(statistics["phases"][phase]["p95"]))) for phase in Phases )))
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import ANTServerRESTClient
+    import Missions
+    import Monitor
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='Host address of ANT-Server', default='localhost')
+    parser.add_argument('--port', help='Port of ANT-Server', type=int, default=8081)
+    parser.add_argument('--interval', help='Monitor the missions every interval seconds', type=float, default=1.0)
+    parser.add_argument('--max', help='Max number of missions per request', type=int, default=200)
+    parser.add_argument('--incremental', help="Only fetch missions changed since the previous cycle", action='store_true')
+    parser.add_argument('--output', help='KPI snapshot file', default='kpi.json')
+    parser.add_argument('--every', help='Write a snapshot every n seconds', type=float, default=60.0)
+    parser.add_argument('--hours', help='Number of hours kept in the per hour KPIs', type=int, default=168)
+    parser.add_argument('--info', help="Show info", action='store_true')
+    parser.add_argument('--debug', help="Show debug", action='store_true')
+    args = parser.parse_args()
+
+    common.setLogLevel( args.debug, args.info )
+
+    restClient = ANTServerRESTClient.ANTServerRestClient(ipAddress=args.host, portNumber=args.port, debug=args.debug)
+    Missions.setRestClient(restClient)
+    collector = KPICollector(args.hours)
+
+    scheduler = Monitor.PollingScheduler(restClient)
+    scheduler.add("missions", Missions.monitorMissions, [0, args.max, collector.handleEvent, args.incremental], args.interval)
+    scheduler.add("kpi", collector.writeSnapshot, [args.output], args.every, jitter=0, delay=args.every)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        collector.writeSnapshot(args.output)
+        collector.printSummary()
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+# Route graph of an ANT map, as returned by ANTServerRestClient.getMap():
+#   { "data": { "alias": ..., "id": ..., "layers": [ { "symbols": [ { "name": ..., "coord": [x, y] } ] },
+#                                                    { "lines": [ { "coord": [x1, y1, x2, y2] } ] } ] } }
+# The lines are the paths (driven both ways), the named symbols the nodes (stations).
+# Shortest routes are found with Dijkstra; the distances from a node are kept,
+# so with vehicles standing at nodes every node is searched at most once.
+
+import sys
+sys.path.append("../libraries/common/")
+
+import math
+import heapq
+import bisect
+import argparse
+import logging
+import common
+
+log = logging.getLogger("Layout")
+
+
+class Route():
+    ''' a route along the points (x, y), with the distance travelled at every point '''
+    __slots__ = ( "points", "distances", "length" )
+
+    def __init__(self, points):
+        self.points = points
+        self.distances = [ 0.0 ]
+        for n in range(1, len(points)):
+            self.distances.append(self.distances[-1] + math.dist(points[n - 1], points[n]))
+        self.length = self.distances[-1]
+
+    def position(self, travelled):
+        ''' point at distance travelled along the route '''
+        if travelled >= self.length:
+            return self.points[-1]
+        n = bisect.bisect_right(self.distances, travelled)
+        if n == 0:
+            return self.points[0]
+        (x1, y1), (x2, y2) = self.points[n - 1], self.points[n]
+        f = (travelled - self.distances[n - 1]) / (self.distances[n] - self.distances[n - 1])
+        return ( x1 + f * (x2 - x1), y1 + f * (y2 - y1) )
+
+
+class Layout():
+    def __init__(self, mapData):
+        self._edges = {}
+        self._nodes = {}
+        self._searched = {}
+        layers = mapData["data"]["layers"]
+        for layer in layers:
+            for line in layer.get("lines", []):
+                x1, y1, x2, y2 = line["coord"][:4]
+                a, b = Layout._point(x1, y1), Layout._point(x2, y2)
+                length = math.dist(a, b)
+                self._edges.setdefault(a, []).append((b, length))
+                self._edges.setdefault(b, []).append((a, length))
+        for layer in layers:
+            for symbol in layer.get("symbols", []):
+                if "name" in symbol and "coord" in symbol:
+                    self._nodes[symbol["name"]] = self._nearestPoint(Layout._point(*symbol["coord"][:2]))
+
+    @staticmethod
+    def _point(x, y):
+        return ( round(float(x), 3), round(float(y), 3) )
+
+    def _nearestPoint(self, point):
+        ''' the point itself when it is on a path, otherwise the nearest end of a path '''
+        if point in self._edges or not self._edges:
+            return point
+        return min(self._edges, key=lambda p: math.dist(p, point))
+
+    # -----------------------------------
+    def hasNode(self, name):
+        return name in self._nodes
+
+    def getNodes(self):
+        return list(self._nodes)
+
+    def coord(self, name):
+        return self._nodes.get(name)
+
+    def _search(self, source):
+        ''' Dijkstra from point source: (distance, previous point) of every reachable point '''
+        if source not in self._searched:
+            distances = { source: 0.0 }
+            previous = {}
+            heap = [ (0.0, source) ]
+            while heap:
+                distance, point = heapq.heappop(heap)
+                if distance > distances[point]:
+                    continue
+                for neighbour, length in self._edges.get(point, []):
+                    d = distance + length
+                    if d < distances.get(neighbour, math.inf):
+                        distances[neighbour] = d
+                        previous[neighbour] = point
+                        heapq.heappush(heap, (d, neighbour))
+            self._searched[source] = (distances, previous)
+        return self._searched[source]
+
+    def distance(self, fr, to):
+        ''' length of the shortest route between the nodes fr and to; None when there is none '''
+        if fr not in self._nodes or to not in self._nodes:
+            return None
+        distances, previous = self._search(self._nodes[fr])
+        return distances.get(self._nodes[to])
+
+    def route(self, fr, to):
+        ''' the shortest Route between the nodes fr and to; None when there is none '''
+        if self.distance(fr, to) is None:
+            return None
+        source, point = self._nodes[fr], self._nodes[to]
+        distances, previous = self._search(source)
+        points = [ point ]
+        while point != source:
+            point = previous[point]
+            points.append(point)
+        points.reverse()
+        return Route(points)
+
+
+def gridMap(nodes, spacing=20.0, alias="stand-in"):
+    ''' map data with the nodes on a square grid, spacing apart, with paths between the grid neighbours '''
+    columns = max(1, math.ceil(math.sqrt(len(nodes))))
+    coord = lambda n: [ float(n % columns) * spacing, float(n // columns) * spacing ]
+    symbols = [ { "name": node, "coord": coord(n) } for n, node in enumerate(nodes) ]
+    lines = []
+    for n in range(len(nodes)):
+        for neighbour in ( n + 1 if (n + 1) % columns else None, n + columns ):
+            if neighbour is not None and neighbour < len(nodes):
+                lines.append({ "coord": coord(n) + coord(neighbour) })
+    return { "data": { "alias": alias, "id": 1, "layers": [ { "symbols": symbols }, { "lines": lines } ] } }
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import time
+    import random
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--map', help='Map (getMap() output) in json file; default a grid of --nodes nodes', default=None)
+    parser.add_argument('--nodes', help='Number of nodes of the grid', type=int, default=400)
+    parser.add_argument('--routes', help='Number of random routes to find', type=int, default=10000)
+    args = parser.parse_args()
+
+    mapData = common.readConfigFile(args.map) if args.map is not None else gridMap([ "N%d" % n for n in range(args.nodes) ])
+    layout = Layout(mapData)
+    nodes = layout.getNodes()
+    start = time.perf_counter()
+    lengths = [ layout.distance(random.choice(nodes), random.choice(nodes)) for n in range(args.routes) ]
+    elapsed = time.perf_counter() - start
+    found = [ length for length in lengths if length is not None ]
+    print(f"{len(nodes)} nodes, {args.routes} routes in {elapsed * 1000:.1f} ms, {len(found)} found, mean length {sum(found) / max(1, len(found)):.1f}")
+    route = layout.route(nodes[0], nodes[-1])
+    print(f"route {nodes[0]} -> {nodes[-1]}: length {route.length:.1f} via {len(route.points)} points, half way at {route.position(route.length / 2)}")
@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+# Compile a simulation config (Backlog, Triggers, Global settings) into a mission
+# schedule file without contacting ANT, and replay such a file against ANT.
+# The schedule is JSON lines: a header line, then one line per mission ordered by
+# time (seconds since the start of the simulation), e.g.
+#   {"schedule": {"config": "HSim.json", "seed": 1, "start time": "00:00:00", "days": 1, "backlog": 0}}
+#   {"time": 12.345, "action": "Create ANT Mission", "mission": {"missionType": ..., "fr": ..., "to": ..., ...}}
+# Backlog missions have time 0 and "backlog": true.
+
+import sys
+sys.path.append("../libraries/ANTServerAPI/")
+sys.path.append("../libraries/common/")
+
+import os
+import json
+import time
+import random
+import itertools
+import threading
+import argparse
+import logging
+import common
+import Schedule
+import Timer
+from common import getValueFromListInRandomOrder
+from common import getValueFromDict
+
+log = logging.getLogger("MissionSchedule")
+
+# set when replay() submitted the last mission
+ReplayDone = threading.Event()
+
+
+def ResolveANTMission(mission):
+    """ select origin and destination of a configured mission
+        and fill in the defaults; returns the arguments of Missions.createMission
+    """
+    # for now only support random sequence...
+    fr = getValueFromListInRandomOrder(mission["from"])
+    to = getValueFromListInRandomOrder(mission["to"])
+    return { "missionType": getValueFromDict(mission, "type", "transport from station to station"),
+             "description": getValueFromDict(mission, "description", f"Transport from {fr} to {to}"),
+             "fr": fr,
+             "to": to,
+             "payload": getValueFromDict(mission, 'payload', "Default Payload"),
+             "priority": getValueFromDict(mission, 'priority', "Medium"),
+             "sourceNodeType": getValueFromDict(mission, 'sourceNodeType'),
+             "destNodeType": getValueFromDict(mission, 'destNodeType') }
+
+
+# -----------------------------------
+def compileSchedule(Configuration, days=1, configName=None):
+    """ generator of the schedule lines (dicts) of a simulation config; the same config
+        and seed give the same schedule. Only 'Create ANT Mission' actions are compiled.
+    """
+    settings = getValueFromDict(Configuration, 'Global settings', {})
+    seed = getValueFromDict(settings, "seed")
+    startTime = getValueFromDict(settings, "start time", "00:00:00")
+    if seed is not None:
+        random.seed(seed)
+    backlog = [ entry for entry in getValueFromDict(Configuration, "Backlog", []) if entry["action"] == "Create ANT Mission" ]
+    yield { "schedule": { "config": configName, "seed": seed, "start time": startTime, "days": days,
+                          "backlog": sum( entry["quantity"] for entry in backlog ) } }
+    for entry in backlog:
+        for n in range(entry["quantity"]):
+            yield { "time": 0.0, "backlog": True, "action": entry["action"], "mission": ResolveANTMission(entry["mission"]) }
+
+    skipped = set()
+    for t, trigger in Schedule.arrivals(getValueFromDict(Configuration, "Triggers", []), seed, Schedule.parseTime(startTime), days):
+        if trigger["action"] != "Create ANT Mission":
+            skipped.add(trigger["action"])
+            continue
+        yield { "time": round(t, 3), "action": trigger["action"], "mission": ResolveANTMission(trigger["mission"]) }
+    for action in skipped:
+        log.warning(f"Action '{action}' is not compiled into the schedule")
+
+def writeSchedule(lines, filename):
+    n = 0
+    with open(filename, "w") as scheduleFile:
+        for line in lines:
+            scheduleFile.write(json.dumps(line, sort_keys=True) + "\n")
+            n += 1
+    return n - 1
+
+def readSchedule(filename):
+    """ (header, lazy iterator over the mission lines) """
+    scheduleFile = open(filename)
+    header = json.loads(scheduleFile.readline())["schedule"]
+    def missionLines():
+        with scheduleFile:
+            for line in scheduleFile:
+                if line.strip():
+                    yield json.loads(line)
+    return header, missionLines()
+
+
+# -----------------------------------
+def replayBatch(batch):
+    """ create the missions of lines due at the same time; in bulk when there are more """
+    import Missions
+    if len(batch) == 1:
+        Missions.createMission(**batch[0]["mission"])
+    else:
+        Missions.createMissions([ line["mission"] for line in batch ])
+
+def groupByTime(lines):
+    """ lists of consecutive lines due at the same time """
+    for t, group in itertools.groupby(lines, key=lambda line: line["time"]):
+        yield list(group)
+
+def replay(groups, start, speed=1.0, batch=None):
+    """ submit the missions of groupByTime(lines) at start + time / speed (Timer scheduler time).
+        The lines are read lazily: one delayed timer waits for the next group.
+    """
+    if batch is not None:
+        replayBatch(batch)
+    for group in groups:
+        delay = start + group[0]["time"] / speed - Timer.Scheduler.now()
+        if delay > 0.0:
+            Timer.CreateDelayedTimer(delay, replay, [groups, start, speed, group], name="replay")
+            return
+        replayBatch(group)
+    log.info("All scheduled missions submitted")
+    ReplayDone.set()
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', help='Compile this simulation config', default=None)
+    parser.add_argument('--output', help='Schedule file written by --config', default='schedule.jsonl')
+    parser.add_argument('--days', help='Number of days to compile', type=int, default=1)
+    parser.add_argument('--replay', help='Replay this schedule file against ANT', default=None)
+    parser.add_argument('--host', help='Host address of ANT-Server', default='localhost')
+    parser.add_argument('--port', help='Port of ANT-Server', type=int, default=8081)
+    parser.add_argument('--speed', help='Replay speed', type=float, default=1.0)
+    parser.add_argument('--info', help="Show info", action='store_true')
+    parser.add_argument('--debug', help="Show debug", action='store_true')
+    args = parser.parse_args()
+
+    common.setLogLevel( args.debug, args.info )
+
+    if args.config is not None:
+        started = time.perf_counter()
+        n = writeSchedule(compileSchedule(common.readConfigFile(args.config), args.days, os.path.basename(args.config)), args.output)
+        print(f"{n} missions written to {args.output} in {time.perf_counter() - started:.2f} s")
+
+    if args.replay is not None:
+        import ANTServerRESTClient
+        import Missions
+        restClient = ANTServerRESTClient.ANTServerRestClient(ipAddress=args.host, portNumber=args.port, debug=args.debug)
+        Missions.setRestClient(restClient)
+        header, lines = readSchedule(args.replay)
+        if header["backlog"]:
+            log.info("backlog defined clear all existing missions")
+            Missions.cancelAllMissions()
+        replay(groupByTime(lines), Timer.Scheduler.now(), args.speed)
+        try:
+            while not ReplayDone.wait(1):
+                pass
+        except KeyboardInterrupt:
+            print("Bye bye...")
+        Timer.CancelAllTimers()
@@ -12,6 +12,9 @@ import threading
 import argparse
 import logging
 import os
+import copy
+import itertools
+import DiffEngine
 
 
 # mission data has following structure:
@@ -131,182 +134,387 @@ class Mission:
         6 : "Cancelled"
     }
 
-    def __init__(self, missionData):
-        self._missionData = missionData
+    # hot fields are attributes, the enum names are decoded once per update; the other fields
+    # (dispatchtime, missionrule, deadline, ...) are kept as compact JSON, only parsed when needed.
+    HotFields = ( "fromnode", "tonode", "payload", "priority", "missiontype", "assignedto", "isloaded",
+                  "navigationstate", "transportstate", "schedulerstate", "state", "stateinfo", "timestamp",
+                  "createdat", "timetodestination" )
+    __slots__ = ( "id", ) + HotFields + ( "stateName", "navigationstateName", "transportstateName", "_rare", "_changedFields" )
 
-    def update(self, missionData):
-        self._missionData = missionData
+    def __init__(self, missionData):
+        self._changedFields = None
+        self._load(missionData)
+
+    def _load(self, missionData):
+        get = missionData.get
+        self.id = get("missionid")
+        self.fromnode = get("fromnode")
+        self.tonode = get("tonode")
+        self.payload = get("payload")
+        self.priority = get("priority")
+        self.missiontype = get("missiontype")
+        self.assignedto = get("assignedto")
+        self.isloaded = get("isloaded")
+        self.navigationstate = get("navigationstate")
+        self.transportstate = get("transportstate")
+        self.schedulerstate = get("schedulerstate")
+        self.state = get("state")
+        self.stateinfo = get("stateinfo")
+        self.timestamp = get("timestamp")
+        self.createdat = get("createdat")
+        self.timetodestination = get("timetodestination")
+        self.stateName = Mission._state.get(self.state, self.state)
+        self.navigationstateName = Mission._navigationState.get(self.navigationstate, self.navigationstate)
+        self.transportstateName = Mission._transportState.get(self.transportstate, self.transportstate)
+        self._rare = json.dumps({ key: value for key, value in missionData.items() if key != "missionid" and key not in Mission.HotFields }, separators=(",", ":")).encode()
+
+    def getMissionData(self):
+        ''' all fields of the mission as of the last update '''
+        missionData = json.loads(self._rare)
+        missionData["missionid"] = self.id
+        missionData.update( (field, getattr(self, field)) for field in Mission.HotFields if getattr(self, field) is not None )
+        return missionData
+
+    _missionData = property(getMissionData)
+
+    def update(self, missionData, changedFields=None):
+        self._load(missionData)
+        self._changedFields = changedFields
+
+    def getChangedFields(self):
+        ''' fields changed by the last update (e.g. {"transportstate", "isloaded"}); None for a new mission '''
+        return self._changedFields
 
     def isChanged(self, missionData, stateOnly=False):
         if stateOnly:
-            if ( self._missionData["transportstate"] != missionData["transportstate"] or 
-                 self._missionData["navigationstate"] != missionData["navigationstate"] or
-                 self._missionData["schedulerstate"] != missionData["schedulerstate"] or
-                 self._missionData["state"] != missionData["state"] or
-                 self._missionData["stateinfo"] != missionData["stateinfo"] or
-                 self._missionData["isloaded"] != missionData["isloaded"]
+            if ( self.transportstate != missionData["transportstate"] or 
+                 self.navigationstate != missionData["navigationstate"] or
+                 self.schedulerstate != missionData["schedulerstate"] or
+                 self.state != missionData["state"] or
+                 self.stateinfo != missionData["stateinfo"] or
+                 self.isloaded != missionData["isloaded"]
              ):
                 return True
         else:
-            if self._missionData != missionData:
+            if MissionDiff.changes(self.id, missionData) != set():
                 return True
 
     def getToNode(self):
-        if "tonode" in self._missionData:
-           return self._missionData["tonode"]
-        else:
-            return None
+        return self.tonode
 
     def getFromNode(self):
-        if "fromnode" in self._missionData:
-           return self._missionData["fromnode"]
-        else:
-            return None
+        return self.fromnode
 
     def getIsLoaded(self):
-       return self._missionData["isloaded"]
+       return self.isloaded
 
 
     def show(self, verbose=False, prefix=""):
         if verbose:
+            missionData = self.getMissionData()
             try:
-                print("%20s : %s" % ( "missionid",              self._missionData["missionid"] ) )
-                if "payload" in self._missionData:
-                    print("%20s : %s" % ( "payload",                self._missionData["payload"] ) )
-                if "fromnode" in self._missionData:
-                    print("%20s : %s" % ( "fromnode",               self._missionData["fromnode"] ) )
-                if "tonode" in self._missionData:
-                    print("%20s : %s" % ( "tonode",                 self._missionData["tonode"] ) )
-                if "priority" in self._missionData:
-                    print("%20s : %s" % ( "priority",               Mission._priority[self._missionData["priority"]] ) )
-                if "transportstate" in self._missionData:
-                    if self._missionData["transportstate"] in Mission._transportState.keys():
-                        print("%20s : %s" % ( "transportstate",     Mission._transportState[self._missionData["transportstate"]] ) )
+                print("%20s : %s" % ( "missionid",              missionData["missionid"] ) )
+                if "payload" in missionData:
+                    print("%20s : %s" % ( "payload",                missionData["payload"] ) )
+                if "fromnode" in missionData:
+                    print("%20s : %s" % ( "fromnode",               missionData["fromnode"] ) )
+                if "tonode" in missionData:
+                    print("%20s : %s" % ( "tonode",                 missionData["tonode"] ) )
+                if "priority" in missionData:
+                    print("%20s : %s" % ( "priority",               Mission._priority[missionData["priority"]] ) )
+                if "transportstate" in missionData:
+                    if missionData["transportstate"] in Mission._transportState.keys():
+                        print("%20s : %s" % ( "transportstate",     Mission._transportState[missionData["transportstate"]] ) )
                     else:
-                        print("%20s : %s" % ( "transportstate",     self._missionData["transportstate"] ) )
-                if "dispatchtime" in self._missionData:
-                    print("%20s : %s" % ( "dispatchtime",           self._missionData["dispatchtime"] ) )
-                if "timetodestination" in self._missionData:
-                    print("%20s : %s" % ( "timetodestination",      self._missionData["timetodestination"] ) )
-                if "navigationstate" in self._missionData:
-                    if self._missionData["navigationstate"] in Mission._navigationState.keys():
-                        print("%20s : %s" % ( "navigationstate",    Mission._navigationState[self._missionData["navigationstate"]] ) )
+                        print("%20s : %s" % ( "transportstate",     missionData["transportstate"] ) )
+                if "dispatchtime" in missionData:
+                    print("%20s : %s" % ( "dispatchtime",           missionData["dispatchtime"] ) )
+                if "timetodestination" in missionData:
+                    print("%20s : %s" % ( "timetodestination",      missionData["timetodestination"] ) )
+                if "navigationstate" in missionData:
+                    if missionData["navigationstate"] in Mission._navigationState.keys():
+                        print("%20s : %s" % ( "navigationstate",    Mission._navigationState[missionData["navigationstate"]] ) )
                     else:
-                        print("%20s : %s" % ( "navigationstate",    self._missionData["navigationstate"] ) )
-                if "schedulerstate" in self._missionData:
-                    if self._missionData["schedulerstate"] in Mission._schedulerState.keys():
-                        print("%20s : %s" % ( "schedulerstate",     Mission._schedulerState[self._missionData["schedulerstate"]] ) )
+                        print("%20s : %s" % ( "navigationstate",    missionData["navigationstate"] ) )
+                if "schedulerstate" in missionData:
+                    if missionData["schedulerstate"] in Mission._schedulerState.keys():
+                        print("%20s : %s" % ( "schedulerstate",     Mission._schedulerState[missionData["schedulerstate"]] ) )
                     else:
-                        print("%20s : %s" % ( "schedulerstate",     self._missionData["schedulerstate"] ) )
-                if "totalmissiontime" in self._missionData:
-                    print("%20s : %s" % ( "totalmissiontime",       self._missionData["totalmissiontime"] ) )
-                if "arrivingtime" in self._missionData:
-                    print("%20s : %s" % ( "arrivingtime",           self._missionData["arrivingtime"] ) )
-                if "missiontype" in self._missionData:
-                    if self._missionData["missiontype"] in Mission._missionType.keys():
-                        print("%20s : %s" % ( "missiontype",        Mission._missionType[self._missionData["missiontype"]] ) )
+                        print("%20s : %s" % ( "schedulerstate",     missionData["schedulerstate"] ) )
+                if "totalmissiontime" in missionData:
+                    print("%20s : %s" % ( "totalmissiontime",       missionData["totalmissiontime"] ) )
+                if "arrivingtime" in missionData:
+                    print("%20s : %s" % ( "arrivingtime",           missionData["arrivingtime"] ) )
+                if "missiontype" in missionData:
+                    if missionData["missiontype"] in Mission._missionType.keys():
+                        print("%20s : %s" % ( "missiontype",        Mission._missionType[missionData["missiontype"]] ) )
                     else:
-                        print("%20s : %s" % ( "missiontype",        self._missionData["missiontype"] ) )
-                if "groupid" in self._missionData:
-                    print("%20s : %s" % ( "groupid",                self._missionData["groupid"] ) )
-                if "missionrule" in self._missionData:
-                    print("%20s : %s" % ( "missionrule",            self._missionData["missionrule"] ) )
-                if "stateinfo" in self._missionData:
-                    if self._missionData["stateinfo"] in Mission._stateInfo.keys():
-                        print("%20s : %s" % ( "stateinfo",          Mission._stateInfo[self._missionData["stateinfo"]] ) )
+                        print("%20s : %s" % ( "missiontype",        missionData["missiontype"] ) )
+                if "groupid" in missionData:
+                    print("%20s : %s" % ( "groupid",                missionData["groupid"] ) )
+                if "missionrule" in missionData:
+                    print("%20s : %s" % ( "missionrule",            missionData["missionrule"] ) )
+                if "stateinfo" in missionData:
+                    if missionData["stateinfo"] in Mission._stateInfo.keys():
+                        print("%20s : %s" % ( "stateinfo",          Mission._stateInfo[missionData["stateinfo"]] ) )
                     else:
-                        print("%20s : %s" % ( "stateinfo",          self._missionData["stateinfo"] ) )
-                if "assignedto" in self._missionData:
-                    print("%20s : %s" % ( "assignedto",             self._missionData["assignedto"] ) )
-                if "payloadstatus" in self._missionData:
-                    print("%20s : %s" % ( "payloadstatus",          self._missionData["payloadstatus"] ) )
-                if "isloaded" in self._missionData:
-                    print("%20s : %s" % ( "isloaded",               self._missionData["isloaded"] ) )
-                if "istoday" in self._missionData:
-                    print("%20s : %s" % ( "istoday",                self._missionData["istoday"] ) )
-                if "state" in self._missionData:
-                    if self._missionData["state"] in Mission._state.keys():
-                        print("%20s : %s" % ( "state",              Mission._state[self._missionData["state"]] ) )
+                        print("%20s : %s" % ( "stateinfo",          missionData["stateinfo"] ) )
+                if "assignedto" in missionData:
+                    print("%20s : %s" % ( "assignedto",             missionData["assignedto"] ) )
+                if "payloadstatus" in missionData:
+                    print("%20s : %s" % ( "payloadstatus",          missionData["payloadstatus"] ) )
+                if "isloaded" in missionData:
+                    print("%20s : %s" % ( "isloaded",               missionData["isloaded"] ) )
+                if "istoday" in missionData:
+                    print("%20s : %s" % ( "istoday",                missionData["istoday"] ) )
+                if "state" in missionData:
+                    if missionData["state"] in Mission._state.keys():
+                        print("%20s : %s" % ( "state",              Mission._state[missionData["state"]] ) )
                     else:
-                        print("%20s : %s" % ( "state",              self._missionData["state"] ) )
-                if "deadline" in self._missionData:
-                    print("%20s : %s" % ( "deadline",               self._missionData["deadline"] ) )
+                        print("%20s : %s" % ( "state",              missionData["state"] ) )
+                if "deadline" in missionData:
+                    print("%20s : %s" % ( "deadline",               missionData["deadline"] ) )
             except Exception as e: 
                 print("Exception :", e)
         else:
-            print("mission[%s] from %s -> %s [state=%s,navigationstate=%s,transportstate=%s,isloaded=%s] " % (self._missionData["missionid"], 
-                self._missionData["fromnode"], 
-                self._missionData["tonode"], 
-                Mission._state[self._missionData["state"]],
-                Mission._navigationState[self._missionData["navigationstate"]],
-                Mission._transportState[self._missionData["transportstate"]],
-                self._missionData["isloaded"] ) 
+            print("mission[%s] from %s -> %s [state=%s,navigationstate=%s,transportstate=%s,isloaded=%s] " % (self.id, 
+                self.fromnode, 
+                self.tonode, 
+                self.stateName,
+                self.navigationstateName,
+                self.transportstateName,
+                self.isloaded ) 
             )
 
 
-def monitorMissions(interval, maxMissions, event_handler):
+class MissionIndex():
+    '''
+    Secondary indexes on the cached missions: per field, value -> ids of the missions
+    with that value. The ids are kept in dicts (insertion ordered sets), so lookups
+    are O(1) and the oldest mission comes first.
+    '''
+    Fields = ( "fromnode", "tonode", "assignedto", "payload", "navigationstate", "transportstate", "isloaded" )
+
+    def __init__(self, fields=Fields):
+        self._fields = fields
+        self._indexes = { field: {} for field in fields }
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def add(self, id, missionData):
+        with self._lock:
+            self.remove(id)
+            values = tuple( missionData.get(field) for field in self._fields )
+            self._values[id] = values
+            for field, value in zip(self._fields, values):
+                self._indexes[field].setdefault(value, {})[id] = None
+
+    def update(self, id, missionData):
+        with self._lock:
+            if self._values.get(id) != tuple( missionData.get(field) for field in self._fields ):
+                self.add(id, missionData)
+
+    def remove(self, id):
+        with self._lock:
+            values = self._values.pop(id, None)
+            if values is None:
+                return
+            for field, value in zip(self._fields, values):
+                ids = self._indexes[field][value]
+                del ids[id]
+                if not ids:
+                    del self._indexes[field][value]
+
+    def find(self, limit=None, **criteria):
+        ''' ids of the missions matching all criteria (field=value) on indexed fields; at most limit ids '''
+        with self._lock:
+            buckets = sorted( ( self._indexes[field].get(value, {}) for field, value in criteria.items() ), key=len )
+            if not buckets:
+                return list(itertools.islice(self._values.keys(), limit))
+            return list(itertools.islice(( id for id in buckets[0] if all( id in bucket for bucket in buckets[1:] ) ), limit))
+
+    def clear(self):
+        with self._lock:
+            self._indexes = { field: {} for field in self._fields }
+            self._values = {}
+
+MissionIndexes = MissionIndex()
+
+
+# incremental sync: field used as cursor, and navigation states of active missions.
+MissionTimestampField = "timestamp"
+ActiveNavigationStates = (0, 1, 3)
+SyncState = { "cursor": None, "cycle": 0 }
+# last seen mission data; ANT updates the timestamp on every change of a mission
+MissionDiff = DiffEngine.DiffEngine(ignore=[ MissionTimestampField ], fingerprintField=MissionTimestampField)
+
+def syncMissions(missionList, complete, event_handler, pageSize=None):
+    """ merge missionList into Missions and call event_handler for every change.
+        complete: missionList holds all active missions; missions not in it are deleted, with their final
+        state fetched from ANT.
+        otherwise missionList holds the changed missions only; missions no longer active are deleted.
+        pageSize: missionList is fetched in pages of pageSize missions; when it took more than one
+        page a missing mission may have moved to an earlier page during the fetch, so it is only
+        deleted when it is missing in the next complete missionList too.
+        returns the highest timestamp seen.
+    """
+    if event_handler is None:
+        event_handler = lambda event, mission, prev_mission: None
+    handledMissionIds = set()
+    cursor = None
+    rows = 0
+    for missionData in missionList:
+        rows += 1
+        id = missionData["missionid"]
+        timestamp = missionData.get(MissionTimestampField)
+        if timestamp is not None and ( cursor is None or timestamp > cursor ):
+            cursor = timestamp
+        if not complete and missionData.get("navigationstate") not in ActiveNavigationStates:
+            # mission is finished; handle as deleted, with its final state.
+            if id in Missions:
+                event, changedFields = MissionDiff.update(id, missionData)
+                Missions[id].update(missionData, changedFields)
+                deleteMission(id, event_handler)
+            continue
+        event, changedFields = MissionDiff.update(id, missionData)
+        if id in Missions:
+            if event == "changed":
+                prev_mission = copy.copy(Missions[id])
+                Missions[id].update(missionData, changedFields)
+                MissionIndexes.update(id, missionData)
+                event_handler("changed", Missions[id], prev_mission)
+        else:
+            Missions[id] = Mission(missionData)
+            MissionIndexes.add(id, missionData)
+            event_handler("new", Missions[id], None)
+
+        handledMissionIds.add(id)
+    if complete:
+        # now check if mission is deleted; when mission is not in the list anymore it must be deleted.
+        for id in MissionDiff.deletedIds(handledMissionIds, confirm=pageSize is not None and rows >= pageSize):
+            # a mission leaves the list of active missions when it is finished: handle it as deleted, with its final state.
+            missionData = getFinalMissionData(id)
+            if missionData is not None and id in Missions:
+                event, changedFields = MissionDiff.update(id, missionData)
+                Missions[id].update(missionData, changedFields)
+            deleteMission(id, event_handler)
+    return cursor
+
+def getFinalMissionData(id):
+    """ mission data of a mission no longer in the list of active missions; None when it is gone or not finished """
+    try:
+        missionData = restClient.getMission(id)
+    except Exception as e:
+        log.debug("Could not get the final state of mission %s: %s" % (id, e))
+        return None
+    if missionData is None or missionData.get("navigationstate") in ActiveNavigationStates:
+        return None
+    return missionData
+
+def deleteMission(id, event_handler):
+    if id in Missions:
+        MissionIndexes.remove(id)
+        event_handler("deleted", Missions[id], None)
+        del Missions[id]
+    MissionDiff.remove(id)
+
+
+# maxMissions is the number of missions fetched per request; all active missions are monitored
+# incremental: only fetch the missions changed since the previous cycle (by MissionTimestampField);
+#              every fullSyncEvery cycles all active missions are fetched to detect deleted missions.
+def monitorMissions(interval, maxMissions, event_handler, incremental=False, fullSyncEvery=60):
     while True:
-        handledMissionIds = []
         try: 
             restClient.getSessionToken()
-            for missionData in restClient.getActiveMissions(maxMissions):
-                id = missionData["missionid"]
-                if id in Missions:
-                    if Missions[id].isChanged(missionData):
-                        prev_mission = Missions[id] 
-                        Missions[id].update(missionData)
-                        event_handler("changed", Missions[id], prev_mission)
-                else:
-                    Missions[id] = Mission(missionData)
-                    event_handler("new", Missions[id], None)
-
-                handledMissionIds.append(id)
-            # now check if mission is deleted; when mission is not in the list anymore it must be deleted.
-            deleteMissionIds = []
-            for id in Missions:
-                if id not in handledMissionIds:
-                    event_handler("deleted", Missions[id], None)
-                    deleteMissionIds.append(id)
-            for id in deleteMissionIds:
-                    del Missions[id]
+            cursor = SyncState["cursor"]
+            if incremental and cursor is not None and SyncState["cycle"] % fullSyncEvery != 0:
+                cursor = syncMissions(restClient.iterChangedMissions(cursor, maxMissions, field=MissionTimestampField), False, event_handler) or cursor
+            else:
+                cursor = syncMissions(restClient.iterActiveMissions(maxMissions), True, event_handler, maxMissions)
+            SyncState["cursor"] = cursor
+            SyncState["cycle"] += 1
         except Exception as e: 
-            log.warn("monitorMissions exception :", e)
+            log.warn("monitorMissions exception : %s" % e)
         if interval != 0:
             time.sleep(interval)
         else:
             return
 
+# missions matching all criteria, e.g. findMissions(fromnode="S01", isloaded=False);
+# indexed fields (MissionIndex.Fields) are looked up, other fields are compared
+# (fields other than Mission.HotFields are parsed from the mission record).
+def findMissions( limit=None, **criteria ):
+    indexed = { field: value for field, value in criteria.items() if field in MissionIndex.Fields }
+    other = { field: value for field, value in criteria.items() if field not in MissionIndex.Fields }
+    missions = []
+    for id in MissionIndexes.find(None if other else limit, **indexed):
+        mission = Missions.get(id)
+        if mission is not None and all( missionField(mission, field) == value for field, value in other.items() ):
+            missions.append(mission)
+            if limit is not None and len(missions) >= limit:
+                break
+    return missions
+
+def missionField( mission, field ):
+    return getattr(mission, field) if field in Mission.HotFields else mission.getMissionData().get(field)
+
+def findMission( **criteria ):
+    missions = findMissions(1, **criteria)
+    return missions[0] if missions else None
+
 def retrieveMissionByDestination( dest ):
-    for id in Missions:
-        if Missions[id]._missionData["tonode"] == dest:
-            return Missions[id]
-    return None
+    return findMission(tonode=dest)
 
 def retrieveMissionByOrigin( origin ):
-    for id in Missions:
-        if Missions[id]._missionData["fromnode"] == origin:
-            return Missions[id]
-    return None
+    return findMission(fromnode=origin)
 
 def retrieveMissionAtOrigin( origin ):
-    for id in Missions:
-        if Missions[id]._missionData["fromnode"] == origin and Missions[id]._missionData["isloaded"] == False:
-            return Missions[id]
-    return None
+    return findMission(fromnode=origin, isloaded=False)
 
 
-def createMission( missionType, description, fr, to, payload, priority, sourceNodeType = None, destNodeType = None):
+def createMission( missionType, description, fr, to, payload, priority, sourceNodeType = None, destNodeType = None, fatal = True):
+    """ create a mission; returns its id. When it could not be created the process
+        exits, or with fatal=False None is returned.
+    """
     log.info("###### Generate mission '%s': from=%s to=%s load=%s prio=%s" % (description, fr, to, payload, priority))
     try: 
         restClient.getSessionToken()
         mission = restClient.createMissionData(missionType, fr, to, 1, payload, priority, sourceNodeType=sourceNodeType, destNodeType=destNodeType)
         return restClient.executeCreateMissionRESTRequest(mission)[0]
     except Exception as e:
+        if not fatal:
+            log.error("Could not create mission: '%s': from=%s to=%s load=%s prio=%s (Exception=%s)" % ( description, fr, to, payload, priority, e ) )
+            return None
         log.fatal("Could not create mission: '%s': from=%s to=%s load=%s prio=%s (Exception=%s)" % ( description, fr, to, payload, priority, e ) )
         os._exit(-2)
         
 
 
+def createMissions( missions ):
+    """ create many missions at once; missions is a list of dicts with keys
+        missionType, fr, to, payload, priority and optional sourceNodeType, destNodeType.
+        Returns per distinct mission a dict with "mission", "count", "acceptedmissions",
+        "pendingmissions" and "error" (None when created); a failed request does not stop the others.
+    """
+    log.info("###### Generate %d missions" % len(missions))
+    requests = []
+    for mission in missions:
+        requests.append( { "missionType": mission["missionType"], "source": mission["fr"], "dest": mission["to"], "payload": mission["payload"], "prio": mission["priority"],
+                           "sourceNodeType": mission.get("sourceNodeType"), "destNodeType": mission.get("destNodeType") } )
+    try: 
+        restClient.getSessionToken()
+        results = restClient.executeCreateMissionsBulkRESTRequest(requests)
+    except Exception as e:
+        log.error("Could not create %d missions (Exception=%s)" % ( len(missions), e ) )
+        return [ { "mission": request, "count": 1, "acceptedmissions": [], "pendingmissions": [], "error": str(e) } for request in requests ]
+    for result in results:
+        if result.get("error"):
+            log.error("%d x from=%s to=%s: could not create (Exception=%s)" % ( result["count"], result["mission"]["source"], result["mission"]["dest"], result["error"] ) )
+        else:
+            log.info("%d x from=%s to=%s: accepted=%s pending=%s" % ( result["count"], result["mission"]["source"], result["mission"]["dest"], result["acceptedmissions"], result["pendingmissions"] ) )
+    return results
+
+
 def cancelMission(missionId):
     log.info(f"###### Cancel mission: {missionId}")
     try: 
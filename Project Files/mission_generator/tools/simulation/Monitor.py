@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+# One polling scheduler for all monitors (missions, devices, vehicles, areas, alarms)
+# sharing a single ANT server client.
+
+import sys
+sys.path.append("../libraries/ANTServerAPI/")
+sys.path.append("../libraries/common/")
+
+import ANTServerRESTClient
+import time
+import json
+import heapq
+import random
+import itertools
+import threading
+import argparse
+import logging
+import concurrent.futures
+import common
+
+log = logging.getLogger("Monitor")
+
+
+class PollingScheduler():
+    '''
+    Runs every registered resource (a monitor function doing one cycle) at its own
+    interval on a small pool of worker threads. The next run of a resource is
+    planned on a fixed grid (start + n * interval) plus a random jitter of at most
+    jitter * interval, so resources polled at the same interval do not hit the
+    ANT server at the same moment. When a cycle is still running or the grid
+    point has already passed, the tick is skipped instead of queued.
+    '''
+    def __init__(self, restClient=None, workers=1, jitter=0.1, seed=None):
+        self._restClient = restClient
+        self._workers = workers
+        self._jitter = jitter
+        self._random = random.Random(seed)
+        self._resources = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # -----------------------------------
+    # register function(*args) to run every interval seconds; interval 0 runs it once
+    def add(self, name, function, args=[], interval=1.0, jitter=None, delay=0.0):
+        resource = { "name": name, "function": function, "args": args, "interval": interval,
+                     "jitter": self._jitter if jitter is None else jitter,
+                     "next": time.monotonic() + delay, "busy": False,
+                     "timing": { "interval": interval, "cycles": 0, "skipped": 0, "errors": 0, "lasterror": None,
+                                 "last": None, "mean": None, "max": None, "lateness": None, "total": 0.0 } }
+        with self._condition:
+            self._resources[name] = resource
+            self._push(resource)
+            self._condition.notify()
+
+    def remove(self, name):
+        with self._condition:
+            self._resources.pop(name, None)
+
+    def _push(self, resource):
+        due = resource["next"] + resource["jitter"] * resource["interval"] * self._random.random()
+        heapq.heappush(self._heap, (due, next(self._sequence), resource["name"]))
+
+    # -----------------------------------
+    # per resource cycle timings (seconds)
+    def getTimings(self):
+        with self._condition:
+            return { name: dict(resource["timing"], busy=resource["busy"]) for name, resource in self._resources.items() }
+
+    # -----------------------------------
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def isAlive(self):
+        return self._running
+
+    def run(self):
+        ''' dispatch due resources to the workers until stop() is called '''
+        self._running = True
+        self._dispatch()
+
+    def _dispatch(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._workers) as executor:
+            while True:
+                with self._condition:
+                    while self._running and ( len(self._heap) == 0 or self._heap[0][0] > time.monotonic() ):
+                        self._condition.wait(None if len(self._heap) == 0 else self._heap[0][0] - time.monotonic())
+                    if not self._running:
+                        break
+                    due, sequence, name = heapq.heappop(self._heap)
+                    resource = self._resources.get(name)
+                    if resource is None:
+                        continue
+                    interval = resource["interval"]
+                    if interval > 0:
+                        # next point of the grid; skip the ticks that were missed
+                        now = time.monotonic()
+                        resource["next"] += interval
+                        if resource["next"] <= now:
+                            missed = int((now - resource["next"]) / interval) + 1
+                            resource["next"] += missed * interval
+                            resource["timing"]["skipped"] += missed
+                        self._push(resource)
+                    if resource["busy"]:
+                        # previous cycle still running
+                        resource["timing"]["skipped"] += 1
+                        continue
+                    resource["busy"] = True
+                executor.submit(self._runResource, resource, due)
+
+    def _runResource(self, resource, due):
+        start = time.monotonic()
+        error = None
+        try:
+            if self._restClient is not None:
+                self._restClient.getSessionToken()
+            resource["function"](*resource["args"])
+        except Exception as e:
+            error = e
+            log.warning("%s: exception: %s" % (resource["name"], e))
+        duration = time.monotonic() - start
+        with self._condition:
+            timing = resource["timing"]
+            timing["cycles"] += 1
+            timing["total"] += duration
+            timing["last"] = duration
+            timing["mean"] = timing["total"] / timing["cycles"]
+            timing["max"] = duration if timing["max"] is None else max(timing["max"], duration)
+            timing["lateness"] = start - due
+            if error is not None:
+                timing["errors"] += 1
+                timing["lasterror"] = str(error)
+            resource["busy"] = False
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import Missions
+    import Devices
+    import Vehicles
+    import Areas
+    import Alarms
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='Host address of ANT-Server', default='localhost')
+    parser.add_argument('--max', help='Max number of missions/devices/areas', default='200')
+    parser.add_argument('--missions', help='Mission poll interval in seconds (0: off)', type=float, default=1.0)
+    parser.add_argument('--devices', help='Device poll interval in seconds (0: off)', type=float, default=1.0)
+    parser.add_argument('--vehicles', help='Vehicle poll interval in seconds (0: off)', type=float, default=2.0)
+    parser.add_argument('--areas', help='Area poll interval in seconds (0: off)', type=float, default=5.0)
+    parser.add_argument('--alarms', help='Alarm poll interval in seconds (0: off)', type=float, default=5.0)
+    parser.add_argument('--workers', help='Number of worker threads', type=int, default=2)
+    parser.add_argument('--jitter', help='Random delay as fraction of the interval', type=float, default=0.1)
+    parser.add_argument('--incremental', help="Only fetch missions/devices changed since the previous cycle", action='store_true')
+    parser.add_argument('--info', help="Show info", action='store_true')
+    parser.add_argument('--debug', help="Show debug", action='store_true')
+    args = parser.parse_args()
+
+    common.setLogLevel( args.debug, args.info )
+
+    restClient = ANTServerRESTClient.ANTServerRestClient( ipAddress = args.host, debug=args.debug )
+    Missions.setRestClient(restClient)
+    Devices.setRestClient(restClient)
+    scheduler = PollingScheduler(restClient, args.workers, args.jitter)
+    if args.missions:
+        scheduler.add("missions", Missions.monitorMissions, [0, args.max, None, args.incremental], args.missions)
+    if args.devices:
+        scheduler.add("devices", Devices.monitorDevices, [0, args.max, None, args.incremental], args.devices)
+    if args.vehicles:
+        scheduler.add("vehicles", Vehicles.monitorVehicles, [restClient, 0, None], args.vehicles)
+    if args.areas:
+        scheduler.add("areas", Areas.monitorAreas, [restClient, 0, args.max, None], args.areas)
+    if args.alarms:
+        scheduler.add("alarms", Alarms.monitorAlarms, [restClient, 0, args.max, None], args.alarms)
+    scheduler.add("timings", lambda: print(json.dumps(scheduler.getTimings(), indent=4)), [], 10.0, jitter=0)
+    scheduler.run()
@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+# Find the maximum sustainable flow of a simulation config: the 'flow per hour' of
+# every trigger is scaled by a multiplier, short virtual time simulations are run
+# (ScenarioRunner) and the multiplier is binary searched for the point where the
+# mission backlog stops being stable.
+# A run is unstable when, over the second half of the run, the number of active
+# missions or of missions without a vehicle (schedulerstate) keeps growing faster
+# than tolerance x the offered flow.
+
+import sys
+sys.path.append("../libraries/common/")
+
+import time
+import argparse
+import logging
+import common
+import Schedule
+import ScenarioRunner
+from common import getValueFromDict
+
+log = logging.getLogger("SaturationFinder")
+
+
+def slope(points):
+    ''' least squares slope of (x, y) points '''
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mx = sum( x for x, y in points ) / n
+    my = sum( y for x, y in points ) / n
+    sxx = sum( (x - mx) ** 2 for x, y in points )
+    return 0.0 if sxx == 0.0 else sum( (x - mx) * (y - my) for x, y in points ) / sxx
+
+def backlogGrowth(run, duration):
+    ''' growth of the active and the unassigned missions per hour over the second half of the run '''
+    samples = [ sample for sample in run["backlog"] if sample[0] >= duration / 2.0 ]
+    active = slope([ (t / 3600.0, n) for t, n, unassigned in samples ])
+    unassigned = slope([ (t / 3600.0, unassigned) for t, n, unassigned in samples ])
+    return active, unassigned
+
+def isStable(run, duration, tolerance):
+    flow = run["created/h"]
+    return max(backlogGrowth(run, duration)) <= tolerance * flow
+
+
+# -----------------------------------
+def evaluate(configFile, multiplier, seeds, duration, tolerance, workers=None, **options):
+    ''' run the config at multiplier with every seed; stable when all runs are stable '''
+    runs = list(ScenarioRunner.runScenarios([ configFile ], seeds, duration, workers,
+                                            flowMultiplier=multiplier, sampleInterval=duration / 60.0, **options))
+    if len(runs) < len(seeds):
+        raise RuntimeError(f"{len(seeds) - len(runs)} runs at multiplier {multiplier} failed")
+    growth = [ backlogGrowth(run, duration) for run in runs ]
+    result = { "multiplier": multiplier,
+               "flow/h": sum( run["created/h"] for run in runs ) / len(runs),
+               "completed/h": sum( run["completed/h"] for run in runs ) / len(runs),
+               "active growth/h": max( active for active, unassigned in growth ),
+               "unassigned growth/h": max( unassigned for active, unassigned in growth ),
+               "lead p95": max( run["lead p95"] or 0.0 for run in runs ),
+               "stable": all( isStable(run, duration, tolerance) for run in runs ) }
+    log.info("multiplier %.3f: %s" % (multiplier, "stable" if result["stable"] else "unstable"))
+    return result
+
+def findSaturation(configFile, seeds, duration, tolerance=0.05, precision=0.05, maxMultiplier=64.0, workers=None, **options):
+    ''' (largest stable multiplier found, list of the evaluated multipliers);
+        the multiplier is doubled from 1 until the flow is unstable, then bisected
+        down to a precision relative to the stable multiplier. '''
+    results = []
+    def stable(multiplier):
+        results.append(evaluate(configFile, multiplier, seeds, duration, tolerance, workers, **options))
+        return results[-1]["stable"]
+
+    low, high = 0.0, 1.0
+    while stable(high):
+        low, high = high, high * 2.0
+        if high > maxMultiplier:
+            log.warning(f"Still stable at multiplier {low}")
+            return low, results
+    while high - low > precision * max(low, precision):
+        middle = (low + high) / 2.0
+        if stable(middle):
+            low = middle
+        else:
+            high = middle
+    return low, results
+
+def printResults(results):
+    value = lambda v: "%.1f" % v
+    print("%10s %10s %12s %16s %20s %10s %8s" % ("multiplier", "flow/h", "completed/h", "active growth/h", "unassigned growth/h", "lead p95", "stable"))
+    for result in sorted(results, key=lambda result: result["multiplier"]):
+        print("%10.3f %10s %12s %16s %20s %10s %8s" % (result["multiplier"], value(result["flow/h"]), value(result["completed/h"]),
+              value(result["active growth/h"]), value(result["unassigned growth/h"]), value(result["lead p95"]), result["stable"]))
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', help='Simulation specified in json file', default='config/HSim.json')
+    parser.add_argument('--seeds', help='Number of seeds per multiplier; all runs must be stable', type=int, default=3)
+    parser.add_argument('--duration', help='Simulated time per run, in seconds or HH:MM:SS; keep it within the trigger periods', default='01:00:00')
+    parser.add_argument('--tolerance', help='Allowed backlog growth per hour, as a fraction of the flow per hour', type=float, default=0.05)
+    parser.add_argument('--precision', help='Relative precision of the multiplier', type=float, default=0.05)
+    parser.add_argument('--max', help='Largest multiplier to try', type=float, default=64.0)
+    parser.add_argument('--speed', help='Speed of the stand-in vehicles in map units per second', type=float, default=1.0)
+    parser.add_argument('--map', help='Map (getMap() output) in json file for the stand-in; default a grid of the stations', default=None)
+    parser.add_argument('--workers', help='Number of processes (default: number of cores)', type=int, default=None)
+    parser.add_argument('--info', help="Show info", action='store_true')
+    parser.add_argument('--debug', help="Show debug", action='store_true')
+    args = parser.parse_args()
+
+    common.setLogLevel( args.debug, args.info )
+    duration = Schedule.parseTime(args.duration) if ":" in args.duration else float(args.duration)
+    flow = sum( trigger["flow per hour"] for trigger in getValueFromDict(common.readConfigFile(args.config), "Triggers", []) )
+
+    started = time.perf_counter()
+    multiplier, results = findSaturation(args.config, range(1, args.seeds + 1), duration, args.tolerance, args.precision, args.max,
+                                         args.workers, speed=args.speed, mapFile=args.map)
+    printResults(results)
+    print(f"Maximum sustainable flow multiplier {multiplier:.3f}: {multiplier * flow:.1f} of {flow:.1f} missions per hour configured"
+          f" ({len(results)} steps in {time.perf_counter() - started:.1f} s)")
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+# Run many simulation scenarios (configs x seeds) in parallel and summarize their KPIs.
+# Every scenario runs in its own process, on a virtual clock against its own ANT
+# server stand-in: the config is compiled into a mission schedule (MissionSchedule)
+# and replayed, the stand-in lets the missions progress, and the KPIs are taken
+# from the missions at the end of the simulated duration.
+
+import sys
+sys.path.append("../libraries/ANTServerAPI/")
+sys.path.append("../libraries/common/")
+
+import os
+import csv
+import glob
+import time
+import copy
+import argparse
+import logging
+import concurrent.futures
+import common
+from common import getValueFromDict
+from KPI import parseTimestamp
+
+log = logging.getLogger("ScenarioRunner")
+
+KPIs = [ "created", "completed", "open", "created/h", "completed/h", "lead mean", "lead p50", "lead p95", "lead max", "wall s" ]
+
+
+def percentile(values, p):
+    ''' p-th percentile of the sorted values '''
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+def missionKPIs(missions, duration):
+    ''' created and completed missions (per hour) and the lead times (created to delivered) in seconds '''
+    leadTimes = sorted( parseTimestamp(mission["timestamp"]) - parseTimestamp(mission["createdat"])
+                        for mission in missions if mission["navigationstate"] == 4 )
+    hours = duration / 3600.0
+    return { "created": len(missions), "completed": len(leadTimes),
+             "open": sum( 1 for mission in missions if mission["navigationstate"] in (0, 1, 3) ),
+             "created/h": len(missions) / hours, "completed/h": len(leadTimes) / hours,
+             "lead mean": sum(leadTimes) / len(leadTimes) if leadTimes else None,
+             "lead p50": percentile(leadTimes, 50), "lead p95": percentile(leadTimes, 95),
+             "lead max": leadTimes[-1] if leadTimes else None }
+
+
+# -----------------------------------
+def runScenario(configFile, seed, duration, speed=1.0, mapFile=None, flowMultiplier=1.0, sampleInterval=None):
+    ''' simulate duration seconds of configFile with seed; returns its KPIs.
+        flowMultiplier scales the 'flow per hour' of every trigger. With a sampleInterval
+        the KPIs include "backlog": (time, active missions, unassigned missions) samples.
+        Uses the module globals (Timer, Missions), so run one scenario per process. '''
+    import Clock
+    import Timer
+    import Missions
+    import MissionSchedule
+    import ANTServerRESTClient
+    from ANTServerStandIn import ANTServerStandIn
+
+    started = time.perf_counter()
+    Configuration = copy.deepcopy(common.readConfigFile(configFile))
+    Configuration.setdefault("Global settings", {})["seed"] = seed
+    for trigger in getValueFromDict(Configuration, "Triggers", []):
+        trigger["flow per hour"] *= flowMultiplier
+
+    clock = Clock.VirtualClock()
+    Timer.setClock(clock)
+    standIn = ANTServerStandIn.fromConfiguration(Configuration, clock=clock, missionProgress=True, speed=speed,
+                                                 mapData=None if mapFile is None else common.readConfigFile(mapFile), seed=seed)
+    port = standIn.start()
+    try:
+        Missions.setRestClient(ANTServerRESTClient.ANTServerRestClient(ipAddress="127.0.0.1", portNumber=port))
+        lines = MissionSchedule.compileSchedule(Configuration, days=int(duration // 86400.0) + 1, configName=os.path.basename(configFile))
+        next(lines)
+        start = Timer.Scheduler.now()
+        samples = []
+        if sampleInterval is not None:
+            def sampleBacklog():
+                standIn.advance()
+                samples.append((Timer.Scheduler.now() - start,) + standIn.getBacklog())
+            Timer.CreateIntervalTimer(0, sampleInterval, sampleBacklog, [], name="backlog")
+        MissionSchedule.replay(MissionSchedule.groupByTime( line for line in lines if line["time"] < duration ), start)
+        Timer.RunUntil(Timer.Scheduler.now() + duration)
+        standIn.advance()
+        Timer.CancelAllTimers(summary=False)
+        kpis = missionKPIs(standIn.getMissions(), duration)
+        if sampleInterval is not None:
+            kpis["backlog"] = samples
+    finally:
+        standIn.stop()
+    kpis.update({ "config": os.path.basename(configFile), "seed": seed, "flow multiplier": flowMultiplier, "wall s": time.perf_counter() - started })
+    return kpis
+
+def runScenarios(configFiles, seeds, duration, workers=None, **options):
+    ''' run every config with every seed on a pool of processes; yields the KPIs of
+        every run when it is done. options are passed to runScenario.
+        A failing run is logged and skipped. '''
+    # a fresh process per scenario: the simulation modules keep their state in globals
+    with concurrent.futures.ProcessPoolExecutor(workers, max_tasks_per_child=1) as executor:
+        futures = { executor.submit(runScenario, configFile, seed, duration, **options): (configFile, seed)
+                    for configFile in configFiles for seed in seeds }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                log.error("Scenario %s seed %s failed: %s" % (futures[future] + (e,)))
+
+
+# -----------------------------------
+def summarize(runs):
+    ''' per config: the number of runs and the mean, min and max over the runs of every KPI '''
+    summary = {}
+    for run in runs:
+        summary.setdefault(run["config"], []).append(run)
+    rows = []
+    for config in sorted(summary):
+        row = { "config": config, "runs": len(summary[config]) }
+        for kpi in KPIs:
+            values = [ run[kpi] for run in summary[config] if run[kpi] is not None ]
+            row[kpi] = ( sum(values) / len(values), min(values), max(values) ) if values else None
+        rows.append(row)
+    return rows
+
+def printSummary(rows):
+    value = lambda v: "-" if v is None else "%.1f" % v
+    print("%-36s %5s  %s" % ("config", "runs", " ".join( "%-20s" % kpi for kpi in KPIs )))
+    for row in rows:
+        print("%-36s %5d  %s" % (row["config"][:36], row["runs"],
+              " ".join( "%-20s" % ("-" if row[kpi] is None else "%s [%s..%s]" % tuple( value(v) for v in row[kpi] )) for kpi in KPIs )))
+
+def writeRuns(runs, filename):
+    with open(filename, "w", newline="") as csvFile:
+        writer = csv.DictWriter(csvFile, fieldnames=[ "config", "seed" ] + KPIs, extrasaction="ignore")
+        writer.writeheader()
+        for run in sorted(runs, key=lambda run: (run["config"], run["seed"])):
+            writer.writerow(run)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import Schedule
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--configs', help='Simulation configs to run', nargs='+', default=sorted(glob.glob("config/*.json")))
+    parser.add_argument('--seeds', help='Number of seeds per config (1..n)', type=int, default=10)
+    parser.add_argument('--first_seed', help='First seed', type=int, default=1)
+    parser.add_argument('--duration', help='Simulated time per run, in seconds or HH:MM:SS', default='24:00:00')
+    parser.add_argument('--speed', help='Speed of the stand-in vehicles in map units per second', type=float, default=1.0)
+    parser.add_argument('--map', help='Map (getMap() output) in json file for the stand-in; default a grid of the stations', default=None)
+    parser.add_argument('--workers', help='Number of processes (default: number of cores)', type=int, default=None)
+    parser.add_argument('--output', help='Write the KPIs of every run to this CSV file', default=None)
+    parser.add_argument('--info', help="Show info", action='store_true')
+    parser.add_argument('--debug', help="Show debug", action='store_true')
+    args = parser.parse_args()
+
+    common.setLogLevel( args.debug, args.info )
+    duration = Schedule.parseTime(args.duration) if ":" in args.duration else float(args.duration)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+
+    started = time.perf_counter()
+    runs = []
+    for run in runScenarios(args.configs, seeds, duration, args.workers, speed=args.speed, mapFile=args.map):
+        runs.append(run)
+        log.info("%s seed %d: %d created, %d completed in %.1f s" % (run["config"], run["seed"], run["created"], run["completed"], run["wall s"]))
+    print(f"{len(runs)} of {len(args.configs) * len(seeds)} runs done in {time.perf_counter() - started:.1f} s")
+    printSummary(summarize(runs))
+    if args.output is not None:
+        writeRuns(runs, args.output)
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+# Compile the simulation triggers into one time ordered stream of arrivals.
+# Every trigger only fires in its period window ("HH:MM:SS" from, to) of the
+# simulated day, at 'flow per hour' on average. 'variation %' is the coefficient
+# of variation of the time between two arrivals: 0 gives a fixed interval,
+# 100 a Poisson stream; the inter-arrival times are gamma distributed with
+# shape 1 / cv^2. A day is generated at once from one random.Random(seed), so
+# a seed always gives the same stream, and the days are generated lazily while
+# the stream is consumed.
+
+import sys
+sys.path.append("../libraries/common/")
+
+import math
+import random
+import heapq
+import bisect
+import itertools
+import argparse
+import logging
+import common
+from common import getValueFromDict
+
+log = logging.getLogger("Schedule")
+
+Day = 24 * 3600.0
+
+
+def parseTime(text):
+    ''' "HH:MM:SS" -> seconds since midnight '''
+    hours, minutes, seconds = ( text.split(":") + [ "0", "0" ] )[:3]
+    return int(hours) * 3600.0 + int(minutes) * 60.0 + float(seconds)
+
+def getWindow(trigger):
+    ''' (start, end) in seconds of the day; a window ending at or before its start ends the next day '''
+    period = getValueFromDict(trigger, "period", [ "00:00:00", "24:00:00" ])
+    start, end = parseTime(period[0]), parseTime(period[1])
+    if end <= start:
+        end += Day
+    return start, end
+
+def activeTime(trigger, start, duration):
+    ''' seconds of [start, start + duration) (seconds since the first midnight) in the window of trigger '''
+    windowStart, windowEnd = getWindow(trigger)
+    active = 0.0
+    for day in range(int(start // Day) - 1, int((start + duration) // Day) + 1):
+        active += max(0.0, min(start + duration, day * Day + windowEnd) - max(start, day * Day + windowStart))
+    return active
+
+
+# -----------------------------------
+def _gaps(rng, n, mean, cv):
+    ''' n inter-arrival times with the given mean and coefficient of variation '''
+    if cv <= 0.0:
+        return [ mean ] * n
+    shape = 1.0 / (cv * cv)
+    return [ rng.gammavariate(shape, mean / shape) for i in range(n) ]
+
+def windowArrivals(rng, start, end, flowPerHour, cv):
+    ''' arrival times in [start, end); the first one at a random phase of its gap '''
+    if flowPerHour <= 0 or end <= start:
+        return []
+    mean = 3600.0 / flowPerHour
+    expected = (end - start) / mean
+    n = int(expected + 4 * math.sqrt(expected) * max(cv, 0.1) + 10)
+    while True:
+        gaps = _gaps(rng, n, mean, cv)
+        gaps[0] *= rng.random()
+        times = list(itertools.accumulate(gaps, initial=start))[1:]
+        if times[-1] >= end:
+            return times[:bisect.bisect_left(times, end)]
+        # not enough gaps drawn (very unlikely); draw again with more
+        n *= 2
+
+
+def compileDay(triggers, rng, dayStart=0.0):
+    ''' all arrivals of one day as sorted lists (times, trigger indexes); times relative to dayStart '''
+    arrivals = []
+    for index, trigger in enumerate(triggers):
+        start, end = getWindow(trigger)
+        arrivals += [ (t + dayStart, index) for t in windowArrivals(rng, start, end, trigger["flow per hour"], getValueFromDict(trigger, "variation %", 0.0) / 100.0) ]
+    arrivals.sort()
+    return [ t for t, index in arrivals ], [ index for t, index in arrivals ]
+
+
+def arrivals(triggers, seed=None, startTime=0.0, days=None):
+    ''' lazy stream of (time, trigger) ordered by time, in seconds since the start of the
+        simulation, which starts at startTime seconds into the first day; days None: forever.
+        Windows running past midnight overlap the next day, so the days are merged; the day
+        before the first is compiled as well for its arrivals after midnight. '''
+    rng = random.Random(seed)
+    pending = []
+    sequence = itertools.count()
+    day = -1 if any( getWindow(trigger)[1] > Day for trigger in triggers ) else 0
+    while days is None or day < days:
+        times, indexes = compileDay(triggers, rng, day * Day - startTime)
+        for t, index in zip(times, indexes):
+            if t >= 0.0:
+                heapq.heappush(pending, (t, next(sequence), index))
+        day += 1
+        # the next days start at day * Day: everything before is complete
+        while pending and pending[0][0] < day * Day - startTime:
+            t, n, index = heapq.heappop(pending)
+            yield t, triggers[index]
+    while pending:
+        t, n, index = heapq.heappop(pending)
+        yield t, triggers[index]
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', help='Simulation specified in json file', default='../config/Simulation_SpringHill.json')
+    parser.add_argument('--days', help='Number of days to compile', type=int, default=1)
+    parser.add_argument('--seed', help='Random seed', type=int, default=1)
+    parser.add_argument('--start', help='Time of day the simulation starts (HH:MM:SS)', default="00:00:00")
+    parser.add_argument('--show', help='Show the first n arrivals', type=int, default=10)
+    args = parser.parse_args()
+
+    Configuration = common.readConfigFile(args.config)
+    triggers = getValueFromDict(Configuration, "Triggers", [])
+    begin = time.perf_counter()
+    stream = list(arrivals(triggers, args.seed, parseTime(args.start), args.days))
+    elapsed = time.perf_counter() - begin
+    print(f"{len(stream)} arrivals of {len(triggers)} triggers in {args.days} day(s), compiled in {elapsed * 1000:.1f} ms")
+    for t, trigger in stream[:args.show]:
+        print("%10.1f  %s" % (t, getValueFromDict(trigger.get("mission", {}), "description", trigger["action"])))
+    expected = sum( trigger["flow per hour"] * (getWindow(trigger)[1] - getWindow(trigger)[0]) / 3600.0 for trigger in triggers ) * args.days
+    print(f"expected ~{expected:.0f} arrivals")
@@ -20,26 +20,28 @@ import argparse
 import logging
 import common
 import random
+import collections
 import Timer
+import Schedule
+from MissionSchedule import ResolveANTMission
+import Clock
+from ANTServerStandIn import ANTServerStandIn
 import Missions
+import Vehicles
 from MqttClient import MqttClient
 from common import getValueFromListInRandomOrder
 from common import getValueFromDict
 
 def CreateANTMission(mission):
-    
-    # for now only support random sequence...
-    fr = getValueFromListInRandomOrder(mission["from"])
-    to = getValueFromListInRandomOrder(mission["to"])
-    ty = getValueFromDict(mission, "type", "transport from station to station")
-    descr = getValueFromDict(mission, "description", f"Transport from {fr} to {to}")
-    payload = getValueFromDict(mission, 'payload', "Default Payload")
-    prio = getValueFromDict(mission, 'priority', "Medium")
-    snt = getValueFromDict(mission, 'sourceNodeType')
-    dnt = getValueFromDict(mission, 'destNodeType')
+    m = ResolveANTMission(mission)
+    log.info(f"Create ANT '{m['missionType']}' mission from {m['fr']} to {m['to']}")
+    Missions.createMission(**m)
 
-    log.info(f"Create ANT '{ty}' mission from {fr} to {to}")
-    Missions.createMission(ty, descr, fr, to, payload, prio, sourceNodeType=snt, destNodeType=dnt )
+def CreateANTMissions(missions):
+    """ create ANT missions in bulk; e.g. to fill the backlog. Returns the results of Missions.createMissions """
+    resolved = [ ResolveANTMission(mission) for mission in missions ]
+    log.info(f"Create {len(resolved)} ANT missions in bulk")
+    return Missions.createMissions(resolved)
 
 AutoId = 1
 
@@ -96,6 +98,70 @@ def executeAction(action, data):
         log.fatal(f"Action '{action}' not supported")
         sys.exit(-2)
 
+def triggerName(trigger):
+    return getValueFromDict(getValueFromDict(trigger, "mission", {}), "description", trigger["action"])
+
+# arrivals executed per trigger (by the id of its dict) and when the stream started
+# (scheduler time, speed), for the configured vs achieved flow in the summary
+ArrivalCounts = collections.Counter()
+ArrivalStart = None
+
+def executeArrival(trigger):
+    ArrivalCounts[id(trigger)] += 1
+    # a failing action must not stop the arrival stream
+    try:
+        executeAction(trigger["action"], trigger)
+    except Exception as e:
+        log.error(f"Action '{trigger['action']}' failed: {e}")
+
+def executeArrivals(stream, start, speed, trigger=None):
+    """ execute trigger (when given) and the actions of the arrivals in stream that are due,
+        then wait (delayed timer) for the next arrival. Arrival times are simulation
+        seconds since start (Timer.Scheduler time), scaled by the simulation speed.
+    """
+    if trigger is not None:
+        executeArrival(trigger)
+    for t, trigger in stream:
+        delay = start + t / speed - Timer.Scheduler.now()
+        if delay > 0.0:
+            Timer.CreateDelayedTimer(delay, executeArrivals, [stream, start, speed, trigger], name=triggerName(trigger))
+            return
+        executeArrival(trigger)
+    log.info("All arrivals executed")
+
+def startTriggers(triggers, simulation_speed, seed=None, startTime="00:00:00", legacy=False):
+    """ start generating the actions of the triggers.
+        legacy: a fixed interval timer per trigger, ignoring the 'period' and 'variation %'
+        otherwise: the arrival stream compiled by Schedule, starting startTime into the day.
+    """
+    if legacy:
+        for trigger in triggers:
+            interval = (3600.0 / trigger["flow per hour"]) / simulation_speed
+            start = interval - (interval * random.random())
+            log.info(f"Execute {trigger['action']} with {int(interval)} seconds interval start at {int(start)}")
+            Timer.CreateIntervalTimer(start, interval, executeAction, [trigger["action"], trigger], name=triggerName(trigger))
+    else:
+        global ArrivalStart
+        log.info(f"Execute {len(triggers)} triggers in their period from {startTime} at speed {simulation_speed}")
+        stream = Schedule.arrivals(triggers, seed, Schedule.parseTime(startTime))
+        ArrivalStart = (Timer.Scheduler.now(), simulation_speed)
+        executeArrivals(stream, Timer.Scheduler.now(), simulation_speed)
+
+def printArrivalSummary(triggers, startTime="00:00:00"):
+    """ per trigger the configured flow per hour and the achieved flow: the arrivals
+        executed per hour of its period simulated so far """
+    if ArrivalStart is None:
+        return
+    start, speed = ArrivalStart
+    elapsed = (Timer.Scheduler.now() - start) * speed
+    rate = lambda v: "-" if v is None else "%.1f" % v
+    print("%-40s %9s %9s %9s %8s %8s" % ("trigger", "active h", "expected", "arrivals", "conf/h", "real/h"))
+    for trigger in triggers:
+        hours = Schedule.activeTime(trigger, Schedule.parseTime(startTime), elapsed) / 3600.0
+        arrivals = ArrivalCounts[id(trigger)]
+        print("%-40s %9.2f %9.1f %9d %8s %8s" % (triggerName(trigger)[:40], hours, trigger["flow per hour"] * hours, arrivals,
+              rate(trigger["flow per hour"]), rate(arrivals / hours if hours > 0 else None)))
+
 # just for testing.
 def display(data):
     print("Display: %s" % (data))
@@ -108,6 +174,9 @@ parser.add_argument('--info', help="Show info", action='store_true')
 parser.add_argument('--debug', help="Show debug", action='store_true')
 parser.add_argument('--no_init', help="No backlog or initialize vehicles", action='store_true')
 parser.add_argument('--config', help='Simulation specified in json file', default='HSim.json') 
+parser.add_argument('--legacy_triggers', help="Fire every trigger at a fixed interval, ignoring its period and variation", action='store_true')
+parser.add_argument('--virtual', help="Run on a virtual clock against a local ANT server stand-in, as fast as possible", action='store_true')
+parser.add_argument('--duration', help='Simulated time to run with --virtual, in seconds or HH:MM:SS', default='24:00:00')
 #parser.add_argument('--config', help='Simulation specified in json file', default='SimulationTest.json') 
 args = parser.parse_args()
 
@@ -122,7 +191,17 @@ log.info(" -------------------------------------- ")
 conf = {}
 # open connection to ANT
 conf = getValueFromDict(Configuration, 'ANT Server')
-if conf is not None:
+standIn = None
+if args.virtual:
+    # the stand-in models the mission progress on the same virtual clock as the timers
+    clock = Clock.VirtualClock()
+    Timer.setClock(clock)
+    standIn = ANTServerStandIn.fromConfiguration(Configuration, clock=clock, missionProgress=True,
+                                                 seed=getValueFromDict(getValueFromDict(Configuration, 'Global settings', {}), "seed"))
+    port = standIn.start()
+    log.info(f"Run on a virtual clock against the ANT server stand-in on port {port}")
+    restClient = ANTServerRESTClient.ANTServerRestClient(ipAddress="127.0.0.1", portNumber=port, debug=args.debug )
+elif conf is not None:
     host = getValueFromDict(conf, "host", args.host) 
     port = getValueFromDict(conf, "port", 8081) 
     user = getValueFromDict(conf, "user", "admin") 
@@ -152,12 +231,18 @@ if conf is not None:
 
 # handle global settings.
 simulation_speed = 1.0
+seed = None
+start_time = "00:00:00"
 conf = getValueFromDict(Configuration, 'Global settings')
 if conf is not None:
     seed = getValueFromDict(conf, "seed")
     if seed is not None:
         random.seed(seed)
     simulation_speed = getValueFromDict(conf, "simulation_speed", 1.0)
+    start_time = getValueFromDict(conf, "start time", start_time)
+if args.virtual:
+    # virtual time is simulated time
+    simulation_speed = 1.0
 
 if args.no_init == False:
     # start with mission assignment disabled
@@ -167,33 +252,41 @@ if args.no_init == False:
         # first clear all missions in the system
         log.info(f"backlog defined clear all existing missions")
         Missions.cancelAllMissions()
-        for backlog in Configuration["Backlog"]:
-            for count in range(1,backlog['quantity']+1):
-                executeAction(backlog["action"], backlog)
+        for index, backlog in enumerate(Configuration["Backlog"], 1):
+            if backlog["action"] == "Create ANT Mission":
+                # submit the missions of the entry in bulk
+                results = CreateANTMissions([ backlog['mission'] ] * backlog['quantity'])
+                accepted = [ id for result in results for id in result["acceptedmissions"] ]
+                pending = [ id for result in results for id in result["pendingmissions"] ]
+                failed = sum( result["count"] for result in results if result.get("error") )
+                description = getValueFromDict(backlog['mission'], 'description', f"entry {index}")
+                log.info(f"Backlog '{description}': accepted={accepted} pending={pending} failed={failed}")
+            else:
+                for count in range(1,backlog['quantity']+1):
+                    executeAction(backlog["action"], backlog)
 
     # initialize vehicles at initial positions
     if 'Initial positions'in Configuration.keys():
-        for vehicle in Configuration["Initial positions"]:
-            log.info( f"Extract vehicle {vehicle['id']}" )
-            restClient.getSessionToken()
-            restClient.executeExtractVehicleRESTRequest( vehicle['id'] )
-
-        for vehicle in Configuration["Initial positions"]:
-            if vehicle['location'] != 'extracted':
-                log.info( f"Insert vehicle {vehicle['id']} at {vehicle['location']}" )
-                restClient.getSessionToken()
-                restClient.executeInsertVehicleRESTRequest( vehicle['id'], vehicle['location'] )
+        Vehicles.initializeVehicles(restClient, Configuration["Initial positions"])
     Missions.PauseMissionAssignment(False)
 
 
 
 # now generate triggers:
 if 'Triggers'in Configuration.keys():
-    for trigger in Configuration["Triggers"]:
-        interval = (3600.0 / trigger["flow per hour"]) / simulation_speed
-        start = interval - (interval * random.random())
-        log.info(f"Execute {trigger['action']} with {int(interval)} seconds interval start at {int(start)}")
-        Timer.CreateIntervalTimer(start, interval, executeAction, [trigger["action"], trigger])
+    startTriggers(Configuration["Triggers"], simulation_speed, seed, start_time, args.legacy_triggers)
+
+if args.virtual:
+    duration = Schedule.parseTime(args.duration) if ":" in args.duration else float(args.duration)
+    started = time.perf_counter()
+    Timer.RunUntil(Timer.Scheduler.now() + duration)
+    standIn.advance()
+    log.info(f"Simulated {duration:.0f} seconds in {time.perf_counter() - started:.1f} seconds")
+    Timer.CancelAllTimers()
+    printArrivalSummary(getValueFromDict(Configuration, "Triggers", []), start_time)
+    print(json.dumps(standIn.getStatistics(), indent=4))
+    standIn.stop()
+    sys.exit(0)
 
 while True:
     try: 
@@ -201,5 +294,6 @@ while True:
     except:
         print("Bye bye...")
         Timer.CancelAllTimers()
+        printArrivalSummary(getValueFromDict(Configuration, "Triggers", []), start_time)
         sys.exit(-1)
         
@@ -1,65 +1,277 @@
 #!/usr/bin/python3
+# Delayed and interval timers, run by one scheduler thread from a heap of due times
+# (instead of a sleeping thread per timer).
 
 import sys
 sys.path.append("../libraries/common/")
 import threading
+import itertools
+import heapq
+import argparse
 import time
+import logging
 import common
+import Clock
 
 
 Lock = threading.RLock()
 Timers = []
+# lateness and duration of the delayed (one-shot) timers
+DelayedLateness = common.Histogram()
+DelayedDuration = common.Histogram()
 
-class SynchronizedTimer(threading.Timer):
-    def __init__(self, delay, func, args, debug=False, info=False):
-        self._log = common.initLogger("Timer", debug, info)
-        super().__init__(delay, func, args)
+log = logging.getLogger("Timer")
 
-    def call(self):
-        # TODO: make sure we don't call at the same time. 
-        # the function that is called may not be thread safe.
-        #with Lock:
-        self._log.debug(f"call {self.function.__name__}")
-        self.function(*self.args,**self.kwargs)  
-        self._log.debug(f"returned from call {self.function.__name__}")
 
-    def __del__(self):
-        self._log.debug("interval timer is deleted")
+class ScheduledTimer():
+    '''
+    A delayed (interval None) or interval timer. Interval timers run at a fixed
+    rate: the next call is due interval seconds after the previous due time, not
+    after the previous call returned, so slow calls do not make the rate drift.
+    Every call records its lateness (start - due) and duration; an overlap is a
+    call that started while the previous call was still running or when the
+    next call was already due.
+    '''
+    def __init__(self, function, args, interval=None, name=None):
+        self.function = function
+        self.args = args
+        self.kwargs = {}
+        self.interval = interval
+        self.name = function.__name__ if name is None else name
+        self.due = None
+        self.cancelled = False
+        self.calls = 0
+        self.overlaps = 0
+        self.running = 0
+        self.firstStart = None
+        self.lastStart = None
+        self.lateness = common.Histogram() if interval is not None else DelayedLateness
+        self.duration = common.Histogram() if interval is not None else DelayedDuration
 
+    def call(self, due=None):
+        start = Scheduler.now()
+        with Lock:
+            lateness = 0.0 if due is None else start - due
+            if self.running > 0 or ( self.interval is not None and lateness >= self.interval ):
+                self.overlaps += 1
+            self.running += 1
+            self.calls += 1
+            if self.firstStart is None:
+                self.firstStart = start
+            self.lastStart = start
+            self.lateness.add(lateness)
+        log.debug(f"call {self.name}")
+        try:
+            self.function(*self.args, **self.kwargs)
+        finally:
+            with Lock:
+                self.running -= 1
+                self.duration.add(Scheduler.now() - start)
+        log.debug(f"returned from call {self.name}")
 
+    def getStatistics(self):
+        ''' calls, overlaps, lateness and duration histograms; for interval timers also the
+            configured and achieved calls per hour and the drift: how much later the last call
+            started than planned relative to the first call. '''
+        with Lock:
+            statistics = { "name": self.name, "interval": self.interval, "calls": self.calls, "overlaps": self.overlaps,
+                           "lateness": self.lateness.snapshot(), "duration": self.duration.snapshot() }
+            if self.interval is not None:
+                elapsed = None if self.calls < 2 else self.lastStart - self.firstStart
+                statistics["configured per hour"] = 3600.0 / self.interval
+                statistics["achieved per hour"] = None if not elapsed else 3600.0 * (self.calls - 1) / elapsed
+                statistics["drift"] = None if elapsed is None else elapsed - (self.calls - 1) * self.interval
+            return statistics
 
-class IntervalTimer(SynchronizedTimer):  
-    def run(self):  
-        while not self.finished.wait(self.interval):  
-            self.call()
+    def cancel(self):
+        self.cancelled = True
 
-def CreateDelayedTimer(delay, func, args, debug=False, info=False):
-    t = SynchronizedTimer(delay, func, args, debug, info)
-    t.start()
+    def isCancelled(self):
+        return self.cancelled
+
+
+class TimerScheduler():
+    '''
+    Runs the due timers on a single thread, in order of due time (timers due at
+    the same time in order of creation). The calls are serialized, unless an
+    executor is set: executor(timer, due) is then called instead and is
+    responsible for calling timer.call(due), e.g. on a thread pool.
+    Cancelled timers are dropped when they come due.
+    With a virtual clock there is no scheduler thread: runUntil() runs the
+    timers in the calling thread and advances the clock to each due time.
+    '''
+    def __init__(self, executor=None, clock=Clock.Real):
+        self._executor = executor
+        self._clock = clock
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition(Lock)
+        self._thread = None
+
+    def setExecutor(self, executor):
+        self._executor = executor
+
+    def setClock(self, clock):
+        with self._condition:
+            self._clock = clock
+            self._condition.notify()
+
+    def getClock(self):
+        return self._clock
+
+    def now(self):
+        return self._clock.now()
+
+    def schedule(self, timer, delay):
+        with self._condition:
+            timer.due = self.now() + delay
+            heapq.heappush(self._heap, (timer.due, next(self._sequence), timer))
+            if self._clock.virtual:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="TimerScheduler", daemon=True)
+                self._thread.start()
+            elif self._heap[0][2] is timer:
+                self._condition.notify()
+
+    def cancelAll(self):
+        with self._condition:
+            for due, sequence, timer in self._heap:
+                timer.cancel()
+            self._heap = []
+            self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return sum( 1 for due, sequence, timer in self._heap if not timer.cancelled )
+
+    def _pop(self):
+        ''' next timer to run and its due time; an interval timer is rescheduled '''
+        due, sequence, timer = heapq.heappop(self._heap)
+        timer.due = due
+        if timer.interval is not None and not timer.cancelled:
+            heapq.heappush(self._heap, (due + timer.interval, next(self._sequence), timer))
+        return due, timer
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while len(self._heap) == 0 or self._clock.virtual or self._heap[0][0] > self.now():
+                    self._condition.wait(None if len(self._heap) == 0 or self._clock.virtual else self._heap[0][0] - self.now())
+                due, timer = self._pop()
+            if not timer.cancelled:
+                self._execute(timer, due)
+
+    def runUntil(self, end):
+        ''' run the timers due up to clock time end; with the real clock this just waits '''
+        if not self._clock.virtual:
+            self._clock.sleep(max(0.0, end - self.now()))
+            return
+        while True:
+            with self._condition:
+                if len(self._heap) == 0 or self._heap[0][0] > end:
+                    break
+                due, timer = self._pop()
+                self._clock.advance(due)
+            if not timer.cancelled:
+                self._execute(timer, due)
+        self._clock.advance(end)
+
+    def _execute(self, timer, due):
+        try:
+            if self._executor is None:
+                timer.call(due)
+            else:
+                self._executor(timer, due)
+        except Exception as e:
+            log.warning(f"timer {timer.name}: exception: {e}")
+
+
+Scheduler = TimerScheduler()
+
+def setExecutor(executor):
+    Scheduler.setExecutor(executor)
+
+def setClock(clock):
+    Scheduler.setClock(clock)
+
+def RunUntil(end):
+    ''' run the timers up to clock time end (see TimerScheduler.runUntil) '''
+    Scheduler.runUntil(end)
+
+
+def CreateDelayedTimer(delay, func, args, debug=False, info=False, name=None):
+    common.initLogger("Timer", debug, info)
+    t = ScheduledTimer(func, args, None, name)
+    Scheduler.schedule(t, delay)
+    return t
 
 def StartIntervalTimer(t):
     # when we start, call function for the first time
     t.call()
-    t.start()
+    Scheduler.schedule(t, t.interval)
 
-def CreateIntervalTimer(delay, interval, func, args, debug=False, info=False):
-    intervalTimer = IntervalTimer(interval, func, args, debug, info)
+def CreateIntervalTimer(delay, interval, func, args, debug=False, info=False, name=None):
+    common.initLogger("Timer", debug, info)
+    intervalTimer = ScheduledTimer(func, args, interval, name)
     Timers.append(intervalTimer)
-    if delay > 0.0: 
-        # start interval timer with a delay. 
-        CreateDelayedTimer(delay, StartIntervalTimer, [ intervalTimer ] )
-    else:
-        intervalTimer.start()
+    # first call after delay; without delay after one interval
+    Scheduler.schedule(intervalTimer, delay if delay > 0.0 else interval)
+    return intervalTimer
+
+
+def getTimerStatistics():
+    ''' statistics of every interval timer and of all delayed timers together '''
+    with Lock:
+        delayed = { "name": "delayed timers", "interval": None, "calls": DelayedLateness.count, "overlaps": 0,
+                    "lateness": DelayedLateness.snapshot(), "duration": DelayedDuration.snapshot() }
+    return [ timer.getStatistics() for timer in Timers ] + [ delayed ]
 
+def printTimerSummary():
+    ms = lambda v: "-" if v is None else "%.1f" % (v * 1000)
+    rate = lambda v: "-" if v is None else "%.1f" % v
+    print("%-40s %7s %8s %8s %9s %9s %9s %9s %9s" % ("timer", "calls", "conf/h", "real/h", "drift ms", "late p50", "late p99", "dur p99", "overlaps"))
+    for statistics in getTimerStatistics():
+        if statistics["calls"] == 0:
+            continue
+        print("%-40s %7d %8s %8s %9s %9s %9s %9s %9d" % (statistics["name"][:40], statistics["calls"],
+              rate(statistics.get("configured per hour")), rate(statistics.get("achieved per hour")), ms(statistics.get("drift")),
+              ms(statistics["lateness"]["p50"]), ms(statistics["lateness"]["p99"]), ms(statistics["duration"]["p99"]), statistics["overlaps"]))
 
-def CancelAllTimers():
+def CancelAllTimers(summary=True):
     for timer in Timers:
         timer.cancel()
-        timer.join()
+    Scheduler.cancelAll()
+    if summary and any( statistics["calls"] > 0 for statistics in getTimerStatistics() ):
+        printTimerSummary()
 
 
 # Tests--------------------------------------------------------------
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bench', help='Schedule this many interval timers and report the lateness', type=int, default=0)
+    parser.add_argument('--interval', help='Interval of the bench timers in seconds', type=float, default=1.0)
+    parser.add_argument('--duration', help='Duration of the bench in seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.bench > 0:
+        lateness = []
+        def tick(timer):
+            lateness.append(Scheduler.now() - timer.due)
+
+        start = time.perf_counter()
+        for n in range(args.bench):
+            timer = CreateIntervalTimer(args.interval * n / args.bench, args.interval, tick, [])
+            timer.args = [ timer ]
+        created = time.perf_counter() - start
+        time.sleep(args.duration)
+        CancelAllTimers(summary=False)
+        lateness.sort()
+        print(f"{args.bench} timers created in {created * 1000:.1f} ms, threads: {threading.active_count()}")
+        print(f"{len(lateness)} calls in {args.duration} s (expected ~{int(args.bench * args.duration / args.interval)}), "
+              f"lateness p50 {lateness[len(lateness) // 2] * 1000:.2f} ms, p99 {lateness[int(len(lateness) * 0.99)] * 1000:.2f} ms, max {lateness[-1] * 1000:.2f} ms")
+        sys.exit(0)
+
     def display_delayed(data):
         print(f"Display_delayed: {data}")
         j = 0
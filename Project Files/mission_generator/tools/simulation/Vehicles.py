@@ -11,6 +11,8 @@ import re
 import threading
 import argparse
 import logging
+import copy
+import DiffEngine
 
 
 # vehicleData has following structure:
@@ -43,6 +45,7 @@ def setLoggingLevel( level ):
     logging.basicConfig(level=level)
 
 Vehicles = {}
+VehicleDiff = DiffEngine.DiffEngine()
 
 class Vehicle:
     _operatingState = {
@@ -55,102 +58,166 @@ class Vehicle:
         6 : "In error",
     }
 
+    # hot fields are attributes, the operating state name is decoded once per update; the other
+    # fields (the state: shapes, shared memory, messages, ...) are kept as compact JSON, only
+    # parsed for verbose output and rare fields.
+    HotFields = ( "name", "isloaded", "payload", "operatingstate" )
+    __slots__ = HotFields + ( "operatingstateName", "_rare", "_changedFields" )
+
     def __init__(self, vehicleData):
-        self._vehicleData = vehicleData
+        self._changedFields = None
+        self._load(vehicleData)
+
+    def _load(self, vehicleData):
+        self.name = vehicleData.get("name")
+        self.isloaded = vehicleData.get("isloaded")
+        self.payload = vehicleData.get("payload")
+        self.operatingstate = vehicleData.get("operatingstate")
+        self.operatingstateName = Vehicle._operatingState.get(self.operatingstate, self.operatingstate)
+        self._rare = json.dumps({ key: value for key, value in vehicleData.items() if key not in Vehicle.HotFields }, separators=(",", ":")).encode()
+
+    def getVehicleData(self):
+        ''' all fields of the vehicle '''
+        vehicleData = json.loads(self._rare)
+        vehicleData.update( (field, getattr(self, field)) for field in Vehicle.HotFields )
+        return vehicleData
+
+    _vehicleData = property(getVehicleData)
 
-    def update(self, vehicleData):
-        self._vehicleData = vehicleData
+    def update(self, vehicleData, changedFields=None):
+        self._load(vehicleData)
+        self._changedFields = changedFields
+
+    def getChangedFields(self):
+        ''' fields changed by the last update (e.g. {"operatingstate", "state.traffic.info"}); None for a new vehicle '''
+        return self._changedFields
 
     def isChanged(self, vehicleData, stateOnly=False):
         if stateOnly:
-            if ( self._vehicleData["isloaded"] != vehicleData["isloaded"] or 
-                 self._vehicleData["operatiingstate"] != vehicleData["operatiingstate"] or
-                 self._vehicleData["action"] != vehicleData["action"] or
-                 self._vehicleData["state"] != vehicleData["state"] or
-                 self._vehicleData["stateinfo"] != vehicleData["stateinfo"] or
-                 self._vehicleData["isloaded"] != vehicleData["isloaded"]
+            current = self._vehicleData
+            if ( current.get("isloaded") != vehicleData.get("isloaded") or 
+                 current.get("operatingstate") != vehicleData.get("operatingstate") or
+                 current.get("action") != vehicleData.get("action") or
+                 current.get("state") != vehicleData.get("state") or
+                 current.get("stateinfo") != vehicleData.get("stateinfo")
              ):
                 return True
         else:
-            if self._vehicleData != vehicleData:
+            if VehicleDiff.changes(self.name, vehicleData) != set():
                 return True
 
 
 
     def show(self, verbose=False):
         if verbose:
+            vehicleData = self.getVehicleData()
             try:
-                if "name" in self._vehicleData:
-                    print("%20s : %s" % ( "name",                           self._vehicleData["name"] ) )
-                if "isloaded" in self._vehicleData:
-                    print("%20s : %s" % ( "isloaded",                       self._vehicleData["isloaded"] ) )
-                if "payload" in self._vehicleData:
-                    print("%20s : %s" % ( "payload",                        self._vehicleData["payload"] ) )
-                if "operatingstate" in self._vehicleData:
-                    print("%20s : %s" % ( "operatingstate",                 Vehicle._operatingState[self._vehicleData["operatingstate"]] ) )
-                if "state" in self._vehicleData:
-                    if 'body.shape' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "body.shape",                 self._vehicleData["state"]['body.shape'] ) )
-                    if 'traffic.info' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "traffic.info",               self._vehicleData["state"]['traffic.info'] ) )
-                    if 'mission.progress' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "mission.progress",           self._vehicleData["state"]['mission.progress'] ) )
-                    if 'connection.ok' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "connection.ok",              self._vehicleData["state"]['connection.ok'] ) )
-                    if 'battery.info.maxtemperature' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "battery.info.maxtemperature",                 self._vehicleData["state"]['battery.info.maxtemperature'] ) )
-                    if 'error.bits' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "error.bits",                 self._vehicleData["state"]['error.bits'] ) )
-                    if 'sharedMemory.out' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "sharedMemory.out",           self._vehicleData["state"]['sharedMemory.out'] ) )
-                    if 'battery.info' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "battery.info",               self._vehicleData["state"]['battery.info'] ) )
-                    if 'vehicle.type' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "vehicle.type",               self._vehicleData["state"]['vehicle.type'] ) )
-                    if 'vehicle.shape' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "vehicle.shape",              self._vehicleData["state"]['vehicle.shape'] ) )
-                    if 'lock.UUID' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "lock.UUID",                  self._vehicleData["state"]['lock.UUID'] ) )
-                    if 'vehicle.state' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "vehicle.state",              self._vehicleData["state"]['vehicle.state'] ) )
-                    if 'lock.owner' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "lock.owner",                 self._vehicleData["state"]['lock.owner'] ) )
-                    if 'messages' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "messages",                   self._vehicleData["state"]['messages'] ) )
-                    if 'mission.info' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "mission.info",               self._vehicleData["state"]['mission.info'] ) )
-                    if 'sharedMemory.in' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "sharedMemory.in",            self._vehicleData["state"]['sharedMemory.in'] ) )
-                    if 'errors' in self._vehicleData['state']:
-                        print("%20s : %s" % ( "errors",                     self._vehicleData["state"]['errors'] ) )
+                if "name" in vehicleData:
+                    print("%20s : %s" % ( "name",                           vehicleData["name"] ) )
+                if "isloaded" in vehicleData:
+                    print("%20s : %s" % ( "isloaded",                       vehicleData["isloaded"] ) )
+                if "payload" in vehicleData:
+                    print("%20s : %s" % ( "payload",                        vehicleData["payload"] ) )
+                if "operatingstate" in vehicleData:
+                    print("%20s : %s" % ( "operatingstate",                 self.operatingstateName ) )
+                if "state" in vehicleData:
+                    if 'body.shape' in vehicleData['state']:
+                        print("%20s : %s" % ( "body.shape",                 vehicleData["state"]['body.shape'] ) )
+                    if 'traffic.info' in vehicleData['state']:
+                        print("%20s : %s" % ( "traffic.info",               vehicleData["state"]['traffic.info'] ) )
+                    if 'mission.progress' in vehicleData['state']:
+                        print("%20s : %s" % ( "mission.progress",           vehicleData["state"]['mission.progress'] ) )
+                    if 'connection.ok' in vehicleData['state']:
+                        print("%20s : %s" % ( "connection.ok",              vehicleData["state"]['connection.ok'] ) )
+                    if 'battery.info.maxtemperature' in vehicleData['state']:
+                        print("%20s : %s" % ( "battery.info.maxtemperature",                 vehicleData["state"]['battery.info.maxtemperature'] ) )
+                    if 'error.bits' in vehicleData['state']:
+                        print("%20s : %s" % ( "error.bits",                 vehicleData["state"]['error.bits'] ) )
+                    if 'sharedMemory.out' in vehicleData['state']:
+                        print("%20s : %s" % ( "sharedMemory.out",           vehicleData["state"]['sharedMemory.out'] ) )
+                    if 'battery.info' in vehicleData['state']:
+                        print("%20s : %s" % ( "battery.info",               vehicleData["state"]['battery.info'] ) )
+                    if 'vehicle.type' in vehicleData['state']:
+                        print("%20s : %s" % ( "vehicle.type",               vehicleData["state"]['vehicle.type'] ) )
+                    if 'vehicle.shape' in vehicleData['state']:
+                        print("%20s : %s" % ( "vehicle.shape",              vehicleData["state"]['vehicle.shape'] ) )
+                    if 'lock.UUID' in vehicleData['state']:
+                        print("%20s : %s" % ( "lock.UUID",                  vehicleData["state"]['lock.UUID'] ) )
+                    if 'vehicle.state' in vehicleData['state']:
+                        print("%20s : %s" % ( "vehicle.state",              vehicleData["state"]['vehicle.state'] ) )
+                    if 'lock.owner' in vehicleData['state']:
+                        print("%20s : %s" % ( "lock.owner",                 vehicleData["state"]['lock.owner'] ) )
+                    if 'messages' in vehicleData['state']:
+                        print("%20s : %s" % ( "messages",                   vehicleData["state"]['messages'] ) )
+                    if 'mission.info' in vehicleData['state']:
+                        print("%20s : %s" % ( "mission.info",               vehicleData["state"]['mission.info'] ) )
+                    if 'sharedMemory.in' in vehicleData['state']:
+                        print("%20s : %s" % ( "sharedMemory.in",            vehicleData["state"]['sharedMemory.in'] ) )
+                    if 'errors' in vehicleData['state']:
+                        print("%20s : %s" % ( "errors",                     vehicleData["state"]['errors'] ) )
             except Exception as e: 
                 print("Exception :", e)
         else:
-            print("vehicle[%s] [operationalstate=%s,isloaded=%s] " % (self._vehicleData["name"], Vehicle._operatingState[self._vehicleData["operatingstate"]], self._vehicleData["isloaded"] ) )
+            print("vehicle[%s] [operationalstate=%s,isloaded=%s] " % (self.name, self.operatingstateName, self.isloaded ) )
 
 
 def monitorVehicles(restClient, interval, event_handler):
     while True:
         restClient.getSessionToken()
-        handledVehicleIds = []
         try: 
             jsonVehicles = restClient.getVehiclesInfo()
             vehicles = jsonVehicles["payload"]["vehicles"]
-            for vehicleData in vehicles:
-                id = vehicleData["name"]
-                if id in Vehicles:
-                    if Vehicles[id].isChanged(vehicleData):
-                        prev_vehicle = Vehicles[id] 
-                        Vehicles[id].update(vehicleData)
-                        event_handler("changed", Vehicles[id], prev_vehicle)
+            for event, id, vehicleData, changedFields in VehicleDiff.diff(vehicles, lambda vehicleData: vehicleData["name"]):
+                prev_vehicle = None
+                if event == "deleted":
+                    vehicle = Vehicles.pop(id)
+                elif id in Vehicles:
+                    prev_vehicle = copy.copy(Vehicles[id])
+                    vehicle = Vehicles[id]
+                    vehicle.update(vehicleData, changedFields)
                 else:
-                    Vehicles[id] = Vehicle(vehicleData)
-                    event_handler("new", Vehicles[id], None)
-
-                handledVehicleIds.append(id)
+                    vehicle = Vehicles[id] = Vehicle(vehicleData)
+                if event_handler is not None:
+                    event_handler(event, vehicle, prev_vehicle)
         except Exception as e: 
             print("monitorVehicles exception :", e)
-        time.sleep(interval)
+        if interval == 0:
+            return
+        else:
+            time.sleep(interval)
+
+
+# -----------------------------------
+# Put the fleet at its initial positions: first extract all vehicles, then
+# (when all extracts are done) insert them at their location. Both stages run
+# concurrently with at most maxParallel requests in flight.
+# positions: [ { "id": vehicle name, "location": node or 'extracted' }, ... ]
+# returns { vehicle name: { "extracted": bool, "inserted": bool or None, "error": str or None } }
+def initializeVehicles(restClient, positions, maxParallel=None):
+    restClient.getSessionToken()
+    results = { vehicle['id']: { "extracted": False, "inserted": None, "error": None } for vehicle in positions }
+
+    log.info( f"Extract {len(positions)} vehicles" )
+    extracts = restClient.executeConcurrently(restClient.executeExtractVehicleRESTRequest, [ (vehicle['id'],) for vehicle in positions ], maxParallel)
+    for vehicle, (response, error) in zip(positions, extracts):
+        if error is None:
+            results[vehicle['id']]["extracted"] = True
+        else:
+            results[vehicle['id']]["error"] = "extract failed: %s" % error
+
+    inserts = [ vehicle for vehicle in positions if vehicle['location'] != 'extracted' and results[vehicle['id']]["extracted"] ]
+    log.info( f"Insert {len(inserts)} vehicles" )
+    for vehicle, (response, error) in zip(inserts, restClient.executeConcurrently(restClient.executeInsertVehicleRESTRequest, [ (vehicle['id'], vehicle['location']) for vehicle in inserts ], maxParallel)):
+        results[vehicle['id']]["inserted"] = error is None
+        if error is not None:
+            results[vehicle['id']]["error"] = "insert at %s failed: %s" % (vehicle['location'], error)
+
+    for name, result in results.items():
+        if result["error"] is not None:
+            log.warning( f"Vehicle {name}: {result['error']}" )
+        else:
+            log.info( f"Vehicle {name}: {'inserted' if result['inserted'] else 'extracted'}" )
+    return results
 
 
 # dummy event handler for testing; just show event.
@@ -200,11 +267,7 @@ if __name__ == '__main__':
 
     if args.insert_vehicles != "":
         Configuration = readConfigFile(args.insert_vehicles)
-        for vehicle in Configuration["Initial positions"]:
-            log.info( f"Insert vehicle {vehicle['id']} at {vehicle['location']}" )
-            restClient.getSessionToken()
-            restClient.executeExtractVehicleRESTRequest( vehicle['id'] )
-            restClient.executeInsertVehicleRESTRequest( vehicle['id'], vehicle['location'] )
+        initializeVehicles(restClient, Configuration["Initial positions"])
     else:
         x = threading.Thread(target=monitorVehicles, args=(restClient, float(args.interval), dummyVehicleEventHandler), daemon=True )
         x.start()
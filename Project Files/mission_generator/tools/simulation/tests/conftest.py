@@ -0,0 +1,24 @@
+import sys
+from os import path
+
+# the simulation modules are scripts importing each other by name
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), ".."))
+
+import pytest
+import ANTServerStandIn
+
+Stations = [ "S01", "S02", "S03", "S04" ]
+
+
+# an ANT server stand-in on a free port, stopped after the test
+@pytest.fixture
+def standIn():
+    server = ANTServerStandIn.ANTServerStandIn(stations=Stations, seed=1)
+    server.start()
+    yield server
+    server.stop()
+
+
+def missionRequests(n, source="S01", dest="S02"):
+    ''' n identical requests for executeCreateMissionsBulkRESTRequest '''
+    return [ { "missionType": "transport from station to station", "source": source, "dest": dest, "payload": "Default Payload", "prio": "Medium" } ] * n
@@ -0,0 +1,34 @@
+import DiffEngine
+
+
+def test_new_changed_unchanged():
+    engine = DiffEngine.DiffEngine(ignore=[ "timestamp" ])
+    assert engine.update("1", { "state": 0, "meta": { "value": 1 }, "timestamp": 1 }) == ("new", None)
+    assert engine.update("1", { "state": 0, "meta": { "value": 1 }, "timestamp": 2 }) == (None, None)
+    assert engine.update("1", { "state": 1, "meta": { "value": 2 }, "timestamp": 3 }) == ("changed", { "state", "meta.value" })
+    assert engine.changes("1", { "state": 1, "meta": { "value": 2 } }) == set()
+    assert engine.changes("2", {}) is None
+
+def test_fingerprint_field():
+    engine = DiffEngine.DiffEngine(fingerprintField="timestamp")
+    engine.update("1", { "state": 0, "timestamp": 1 })
+    # same timestamp: not compared
+    assert engine.update("1", { "state": 1, "timestamp": 1 }) == (None, None)
+    assert engine.update("1", { "state": 1, "timestamp": 2 }) == ("changed", { "state", "timestamp" })
+
+def test_deleted_ids_confirmed():
+    engine = DiffEngine.DiffEngine()
+    for id in "123":
+        engine.update(id, { "id": id })
+    assert engine.deletedIds({ "1", "2", "3" }) == set()
+    # only deleted when missing from two lists in a row
+    assert engine.deletedIds({ "1", "2" }, confirm=True) == set()
+    assert engine.deletedIds({ "1" }, confirm=True) == { "3" }
+
+def test_diff():
+    engine = DiffEngine.DiffEngine()
+    records = [ { "id": "1", "v": 1 }, { "id": "2", "v": 1 } ]
+    assert [ (event, id) for event, id, record, fields in engine.diff(records, lambda r: r["id"]) ] == [ ("new", "1"), ("new", "2") ]
+    records = [ { "id": "2", "v": 2 } ]
+    assert [ (event, id, fields) for event, id, record, fields in engine.diff(records, lambda r: r["id"]) ] == [ ("changed", "2", { "v" }), ("deleted", "1", None) ]
+    assert "1" not in engine
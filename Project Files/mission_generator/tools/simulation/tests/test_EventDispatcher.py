@@ -0,0 +1,38 @@
+import random
+import time
+
+import EventDispatcher
+
+
+def test_per_key_ordering():
+    handled = {}
+    def handleEvent(key, n):
+        time.sleep(random.random() * 0.001)
+        handled.setdefault(key, []).append(n)
+
+    dispatcher = EventDispatcher.EventDispatcher(workers=4, maxQueue=10)
+    dispatcher.start()
+    events = [ (random.randrange(20), n) for n in range(500) ]
+    for key, n in events:
+        dispatcher.dispatch(key, handleEvent, key, n)
+    dispatcher.stop()
+
+    for key, numbers in handled.items():
+        assert numbers == [ n for k, n in events if k == key ]
+    metrics = dispatcher.getMetrics()
+    assert metrics["dispatched"] == metrics["handled"] == 500
+    assert metrics["errors"] == 0
+
+def test_inline_and_errors():
+    handled = []
+    def handleEvent(n):
+        if n == 1:
+            raise ValueError("bad event")
+        handled.append(n)
+
+    dispatcher = EventDispatcher.EventDispatcher(workers=0)
+    for n in range(3):
+        dispatcher.dispatch(n, handleEvent, n)
+    assert handled == [ 0, 2 ]
+    assert dispatcher.getMetrics()["errors"] == 1
+    assert dispatcher.getMetrics()["lasterror"] == "bad event"
@@ -0,0 +1,97 @@
+import asyncio
+import http.client
+import pytest
+
+import ANTServerRESTClient
+import AsyncANTServerRESTClient
+from conftest import missionRequests
+
+
+@pytest.fixture
+def client(standIn):
+    restClient = ANTServerRESTClient.ANTServerRestClient("127.0.0.1", standIn.getPort(), poolSize=2)
+    yield restClient
+    restClient.close()
+
+
+# -----------------------------------
+# sync client
+def test_login(client):
+    token = client.getSessionToken()
+    assert token.startswith("standin-")
+    assert client.getSessionToken() == token
+
+def test_create_and_list_missions(client, standIn):
+    client.getSessionToken()
+    groups = client.executeCreateMissionsBulkRESTRequest(missionRequests(5) + missionRequests(2, "S03", "S04"))
+    assert [ (group["count"], len(group["acceptedmissions"]), group["error"]) for group in groups ] == [ (5, 5, None), (2, 2, None) ]
+    # one POST per distinct mission, using cardinality
+    assert standIn.getStatistics()["requests"]["POST /wms/rest/missions"] == 2
+
+    missions = list(client.iterMissions(pageSize=3))
+    assert sorted( int(mission["missionid"]) for mission in missions ) == list(range(1, 8))
+    # windows [0,3], [3,6], [6,9]
+    assert standIn.getStatistics()["requests"]["GET /wms/rest/missions"] == 3
+    assert len(list(client.iterActiveMissions(pageSize=3))) == 7
+
+def test_relogin_on_401(client, standIn):
+    client.getSessionToken()
+    missionId = client.executeCreateMissionsBulkRESTRequest(missionRequests(1))[0]["acceptedmissions"][0]
+    standIn.invalidateSessions()
+    assert client.getMission(missionId)["missionid"] == missionId
+    assert standIn.getStatistics()["requests"]["GET /wms/monitor/session/login"] == 2
+
+
+# -----------------------------------
+# async client
+def test_async_client(standIn):
+    async def run():
+        restClient = AsyncANTServerRESTClient.AsyncANTServerRestClient("127.0.0.1", standIn.getPort(), poolSize=2)
+        try:
+            await restClient.getSessionToken()
+            groups = await restClient.executeCreateMissionsBulkRESTRequest(missionRequests(4) + missionRequests(3, "S02", "S01"))
+            assert [ len(group["acceptedmissions"]) for group in groups ] == [ 4, 3 ]
+            missions = [ mission async for mission in restClient.iterMissions(pageSize=3) ]
+            assert len({ mission["missionid"] for mission in missions }) == 7
+
+            standIn.invalidateSessions()
+            assert len(await restClient.executeGetMissionListRESTRequest(10)) == 7
+            assert standIn.getStatistics()["requests"]["GET /wms/monitor/session/login"] == 2
+        finally:
+            restClient.close()
+
+    asyncio.run(run())
+
+
+# -----------------------------------
+# connection pool
+class StaleConnection():
+    ''' idle connection the server has closed; fails when used '''
+    def __init__(self, error, sent=False):
+        self._error = error
+        self._sent = sent
+
+    def request(self, method, path, body=None, headers=None):
+        if not self._sent:
+            raise self._error
+
+    def getresponse(self):
+        raise self._error
+
+    def close(self):
+        pass
+
+def test_pool_retries_on_stale_connection(standIn):
+    pool = ANTServerRESTClient.ConnectionPool("127.0.0.1", standIn.getPort(), poolSize=1)
+    pool._idle.put(StaleConnection(BrokenPipeError()))
+    status, reason, headers, body = pool.request("GET", "/wms/monitor/session/login?username=admin&pwd=123456")
+    assert status == 200
+    assert pool.getStats()["created"] == 1
+    pool.close()
+
+def test_pool_does_not_resend_post(standIn):
+    pool = ANTServerRESTClient.ConnectionPool("127.0.0.1", standIn.getPort(), poolSize=1)
+    pool._idle.put(StaleConnection(http.client.RemoteDisconnected(), sent=True))
+    with pytest.raises(http.client.RemoteDisconnected):
+        pool.request("POST", "/wms/rest/missions", b"{}")
+    assert pool.getStats()["created"] == 0